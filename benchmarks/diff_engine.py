@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Compare the git and in-process diff engines for get_diff_ops.
+
+Usage:
+
+    poetry run python benchmarks/diff_engine.py [left_dir right_dir] [git diff flags]
+
+With no directories, this diffs every pair in testdata.
+"""
+
+import os
+import sys
+import time
+
+from webdiff import diff, dirdiff, options
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+
+
+def config_for_engine(engine):
+    return {
+        **options.DEFAULTS,
+        'webdiff': {**options.DEFAULTS['webdiff'], 'diffEngine': engine},
+    }
+
+
+def file_pairs(dir_pairs):
+    pairs = []
+    for left, right in dir_pairs:
+        for d in dirdiff.gitdiff(left, right, options.DEFAULTS['webdiff']):
+            if d.a_path and d.b_path:
+                pairs.append(d)
+    return pairs
+
+
+def time_engine(pairs, flags, engine, repeats=3):
+    config = config_for_engine(engine)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for d in pairs:
+            diff.get_diff_ops(d, [*flags], config=config)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    dirs = [arg for arg in argv if not arg.startswith('-')]
+    flags = [arg for arg in argv if arg.startswith('-')]
+    if dirs:
+        dir_pairs = [(dirs[0], dirs[1])]
+    else:
+        dir_pairs = [
+            (
+                os.path.join(TESTDATA, name, 'left'),
+                os.path.join(TESTDATA, name, 'right'),
+            )
+            for name in sorted(os.listdir(TESTDATA))
+            if os.path.isdir(os.path.join(TESTDATA, name, 'left'))
+        ]
+
+    pairs = file_pairs(dir_pairs)
+    print(f'{len(pairs)} file pairs, flags={flags}')
+    git_secs = time_engine(pairs, flags, 'git')
+    python_secs = time_engine(pairs, flags, 'python')
+    for name, secs in (('git', git_secs), ('python', python_secs)):
+        per_file = secs * 1000 / len(pairs)
+        print(f'{name:>8}: {secs * 1000:8.1f} ms total, {per_file:6.2f} ms/file')
+    print(f' speedup: {git_secs / python_secs:.1f}x')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
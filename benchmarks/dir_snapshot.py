@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Time re-running a directory diff with and without webdiff's snapshot.
+
+Usage:
+
+    poetry run python benchmarks/dir_snapshot.py [num_files]
+
+This builds a tree of num_files (default 20,000) files. The left side is a plain
+copy. The right side is symlinks into a "working tree" with 1% of the files
+modified, like git difftool makes. Then it times:
+
+  - gitdiff:   dirdiff.gitdiff, which resolves symlinks by copying the tree.
+  - cold:      dirsnapshot.gitdiff with an empty cache.
+  - unchanged: dirsnapshot.gitdiff again, with nothing changed.
+  - one edit:  dirsnapshot.gitdiff after editing one more file.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from webdiff import dirdiff, dirsnapshot, options
+from webdiff.diskcache import DiskCache
+
+CONFIG = options.DEFAULTS['webdiff']
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def make_trees(root, num_files):
+    rng = random.Random(0)
+    a = os.path.join(root, 'a')
+    b = os.path.join(root, 'b')
+    work = os.path.join(root, 'work')
+    for i in range(num_files):
+        rel = os.path.join(f'dir{i % 100}', f'file{i}.txt')
+        text = ''.join(f'{i} line {j}\n' for j in range(rng.randint(10, 200)))
+        write(os.path.join(a, rel), text)
+        if rng.random() < 0.01:
+            text = text.replace('line 5\n', 'line five\n')
+        write(os.path.join(work, rel), text)
+        os.makedirs(os.path.dirname(os.path.join(b, rel)), exist_ok=True)
+        os.symlink(os.path.join(work, rel), os.path.join(b, rel))
+    return a, b, work
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(argv):
+    num_files = int(argv[0]) if argv else 20_000
+    # Don't wait for the files to be old enough to trust their mtimes.
+    dirsnapshot.RACY_SECS = -60
+    with tempfile.TemporaryDirectory() as root:
+        a, b, work = make_trees(root, num_files)
+        cache = DiskCache(os.path.join(root, 'cache'), 1 << 30)
+
+        secs, expected = timed(lambda: dirdiff.gitdiff(a, b, CONFIG))
+        print(f'{num_files} files, {len(expected)} diffs')
+        print(f'  gitdiff:   {secs * 1000:10.1f} ms')
+        secs, _ = timed(lambda: dirsnapshot.gitdiff(a, b, CONFIG, cache))
+        print(f'  cold:      {secs * 1000:10.1f} ms')
+        secs, diffs = timed(lambda: dirsnapshot.gitdiff(a, b, CONFIG, cache))
+        print(f'  unchanged: {secs * 1000:10.1f} ms')
+        assert [(d.a, d.b, d.num_add) for d in diffs] == [
+            (d.a, d.b, d.num_add) for d in expected
+        ]
+
+        with open(os.path.join(work, 'dir0', 'file0.txt'), 'a') as f:
+            f.write('one more line\n')
+        secs, diffs = timed(lambda: dirsnapshot.gitdiff(a, b, CONFIG, cache))
+        print(f'  one edit:  {secs * 1000:10.1f} ms')
+        assert len(diffs) == len(expected) + 1
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
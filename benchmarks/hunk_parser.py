@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Throughput of turning a unified diff into diff codes.
+
+Usage:
+
+    poetry run python benchmarks/hunk_parser.py [num_lines ...]
+
+For each size (10k and 100k lines by default), this builds a synthetic
+single-file diff with a mix of context, deleted and added lines, then times
+unified_diff.diff_to_codes and, if it's installed, the unidiff-based parser it
+replaced.
+"""
+
+import functools
+import sys
+import time
+from itertools import groupby
+
+from webdiff.unified_diff import Hunk, diff_to_codes, finish_codes, hunks_to_codes
+
+try:
+    from unidiff import PatchSet
+except ImportError:
+    PatchSet = None
+
+
+def make_patch(num_lines):
+    out = ['diff --git a/x.py b/x.py', '--- a/x.py', '+++ b/x.py']
+    a = b = 1
+    while num_lines > 0:
+        body = []
+        for i in range(20):
+            body.append(f' context line {a + i}')
+        body += [f'-old line {a + 20 + i}' for i in range(5)]
+        body += [f'+new line {b + 20 + i}' for i in range(7)]
+        body += [f' context line {a + 25 + i}' for i in range(20)]
+        out.append(f'@@ -{a},45 +{b},47 @@ def f{a}():')
+        out += body
+        a += 100
+        b += 102
+        num_lines -= len(body)
+    return '\n'.join(out) + '\n'
+
+
+def unidiff_codes(diff):
+    pf = PatchSet.from_string(diff)[0]
+    hunks = []
+    for hunk in pf:
+        runs = [
+            (type, len([*chunk]))
+            for type, chunk in groupby(hunk, lambda line: line.line_type)
+        ]
+        hunks.append(
+            Hunk(hunk.source_start, hunk.target_start, hunk.section_header, runs)
+        )
+    return finish_codes(hunks_to_codes(hunks), None)
+
+
+def best_of(fn, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [10_000, 100_000]
+    for n in sizes:
+        patch = make_patch(n)
+        mb = len(patch) / 1e6
+        print(f'{n:>8} lines, {mb:.1f} MB')
+        secs, codes = best_of(functools.partial(diff_to_codes, patch))
+        print(f'  parse_patch: {secs * 1000:8.1f} ms, {mb / secs:6.1f} MB/s')
+        if PatchSet:
+            secs, old_codes = best_of(functools.partial(unidiff_codes, patch))
+            assert old_codes == codes
+            print(f'  unidiff:     {secs * 1000:8.1f} ms, {mb / secs:6.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
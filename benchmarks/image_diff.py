@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Compare the ImageMagick and Pillow engines for perceptual image diffs.
+
+Usage:
+
+    poetry run python benchmarks/image_diff.py [left_dir right_dir]
+
+With no directories, this diffs the images in testdata/images. Each engine
+computes the pdiff (with its bounding box) and the dilated pdiff for every pair
+of same-sized images.
+"""
+
+import os
+import sys
+import time
+
+from PIL import Image
+
+from webdiff import util
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+
+def image_pairs(left_dir, right_dir):
+    pairs = []
+    for name in sorted(os.listdir(left_dir)):
+        a = os.path.join(left_dir, name)
+        b = os.path.join(right_dir, name)
+        if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.exists(b):
+            continue
+        if Image.open(a).size == Image.open(b).size:
+            pairs.append((a, b))
+    return pairs
+
+
+def pdiff_uncached(a, b):
+    # Call the underlying functions to bypass their caches.
+    pdiff = util.generate_pdiff_image.__wrapped__(a, b)
+    util.generate_dilated_pdiff_image.__wrapped__(pdiff.diff_path)
+
+
+def time_engine(pairs, engine, repeats=3):
+    util.set_image_diff_engine(engine)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for a, b in pairs:
+            pdiff_uncached(a, b)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    if argv:
+        left_dir, right_dir = argv
+    else:
+        left_dir = os.path.join(TESTDATA, 'images', 'left')
+        right_dir = os.path.join(TESTDATA, 'images', 'right')
+    pairs = image_pairs(left_dir, right_dir)
+    pixels = sum(Image.open(a).width * Image.open(a).height for a, _ in pairs)
+    print(f'{len(pairs)} image pairs, {pixels / 1e6:.1f} megapixels')
+
+    engines = ['pillow']
+    if util.is_imagemagick_available():
+        engines.append('imagemagick')
+    else:
+        print('(ImageMagick is not installed; only timing Pillow)')
+    results = {engine: time_engine(pairs, engine) for engine in engines}
+    for engine, secs in results.items():
+        per_pair = secs * 1000 / len(pairs)
+        print(f'{engine:>12}: {secs * 1000:8.1f} ms total, {per_pair:6.2f} ms/pair')
+    if len(results) == 2:
+        print(f'     speedup: {results["imagemagick"] / results["pillow"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
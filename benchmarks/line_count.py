@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Time counting lines with `grep -c ''` vs. webdiff's cached line index.
+
+Usage:
+
+    poetry run python benchmarks/line_count.py [size_mb ...]
+
+For each size (10 KB and 100 MB by default; try 4096 for a multi-GB file), this
+writes a file of random-length lines to a temp directory, then times:
+
+  - grep:   forking `grep -c ''`, which is what diff.fast_num_lines used to do.
+  - build:  building a LineIndex by scanning a memory map of the file.
+  - cached: lineindex.count_lines once the index is cached (e.g. when the user
+            toggles a diff option and the diff is recomputed).
+  - window: reading 1,000 lines from the middle of the file, as get_lines does.
+"""
+
+import functools
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from webdiff import lineindex
+
+
+def write_file(path, size):
+    rng = random.Random(0)
+    words = [f'word{i}' for i in range(1000)]
+    lines = [' '.join(rng.choices(words, k=rng.randint(0, 20))) for _ in range(10_000)]
+    block = ('\n'.join(lines) + '\n').encode('utf8')
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            chunk = block[: size - written]
+            f.write(chunk)
+            written += len(chunk)
+
+
+def grep_count(path):
+    try:
+        return int(subprocess.check_output(['grep', '-c', '', path]))
+    except subprocess.CalledProcessError as e:
+        if e.returncode == 1:
+            return 0
+        raise
+
+
+def best_of(fn, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv):
+    sizes_mb = [float(arg) for arg in argv] or [0.01, 100]
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes_mb:
+            path = os.path.join(tmp, 'file.txt')
+            write_file(path, int(size_mb * 1024 * 1024))
+            repeats = 20 if size_mb < 1 else 3
+
+            grep_secs, expected = best_of(functools.partial(grep_count, path), repeats)
+            build_secs, index = best_of(
+                functools.partial(lineindex.build_line_index, path), repeats
+            )
+            assert index.num_lines == expected
+            lineindex.count_lines(path)  # warm the cache
+            cached_secs, _ = best_of(
+                functools.partial(lineindex.count_lines, path), repeats
+            )
+            middle = expected // 2
+            window_secs, _ = best_of(
+                functools.partial(lineindex.read_lines, path, middle, middle + 1000),
+                repeats,
+            )
+
+            print(f'{size_mb:>10g} MB, {expected} lines')
+            print(f'  grep -c:  {grep_secs * 1000:10.3f} ms')
+            print(f'  build:    {build_secs * 1000:10.3f} ms')
+            print(f'  cached:   {cached_secs * 1000:10.3f} ms')
+            print(f'  window:   {window_secs * 1000:10.3f} ms')
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Compare peak memory and time for normalizing JSON and text in memory vs. streaming.
+
+Usage:
+
+    poetry run python benchmarks/normalize_json.py [size_mb]
+
+This writes a JSON file of roughly size_mb (default 100) megabytes, shaped like
+a dump of records, and a text file of its lines. Each normalizer runs in its own
+subprocess so that its peak RSS can be measured:
+
+  - json.load:    json.load + json.dump(indent=2, sort_keys=True), as before.
+  - streaming:    normalize.normalize_json_file.
+  - sort:         sorting every line in memory, as before.
+  - merge sort:   normalize.sort_lines.
+"""
+
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from webdiff import normalize
+
+
+def write_json(path, size):
+    rng = random.Random(0)
+    with open(path, 'w') as f:
+        f.write('{"version": 1, "records": [')
+        n = 0
+        while f.tell() < size:
+            record = {
+                'id': n,
+                'name': f'record {rng.randint(0, 1 << 30)}',
+                'tags': rng.sample(['a', 'b', 'c', 'd', 'e'], 3),
+                'score': rng.random(),
+                'meta': {'z': rng.randint(0, 9), 'y': None, 'x': True},
+            }
+            f.write((', ' if n else '') + json.dumps(record))
+            n += 1
+        f.write(f'], "count": {n}}}')
+
+
+def run(mode, in_path, out_path):
+    if mode == 'json.load':
+        with open(in_path) as f:
+            data = json.load(f)
+        with open(out_path, 'w') as out:
+            json.dump(data, out, indent=2, sort_keys=True)
+    elif mode == 'streaming':
+        normalize.normalize_json_file(in_path, out_path)
+    elif mode == 'sort':
+        with open(in_path) as f:
+            data = sorted(f)
+        with open(out_path, 'w') as out:
+            out.writelines(data)
+    elif mode == 'merge sort':
+        normalize.sort_lines(in_path, out_path)
+
+
+def measure(mode, in_path, out_path):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, __file__, '--run', mode, in_path, out_path])
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return elapsed, peak_mb
+
+
+def main(argv):
+    if argv[:1] == ['--run']:
+        return run(*argv[1:])
+    size_mb = float(argv[0]) if argv else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'in.json')
+        text_path = os.path.join(tmp, 'in.txt')
+        write_json(json_path, int(size_mb * 1024 * 1024))
+        normalize.normalize_json_file(json_path, text_path)
+        print(f'{os.path.getsize(json_path) / 1e6:.0f} MB of JSON')
+        outputs = {}
+        # ru_maxrss for children is the maximum over all of them, so run the
+        # (presumably) smaller ones first.
+        for mode, in_path in (
+            ('streaming', json_path),
+            ('merge sort', text_path),
+            ('json.load', json_path),
+            ('sort', text_path),
+        ):
+            out_path = os.path.join(tmp, mode.replace(' ', '-') + '.out')
+            elapsed, peak_mb = measure(mode, in_path, out_path)
+            print(f'  {mode:12} {elapsed:8.2f} s   peak RSS <= {peak_mb:8.0f} MB')
+            with open(out_path, 'rb') as f:
+                outputs[mode] = hash(f.read())
+        assert outputs['streaming'] == outputs['json.load']
+        assert outputs['merge sort'] == outputs['sort']
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
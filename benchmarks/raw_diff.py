@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Time and memory for parsing `git diff --raw -z --numstat` output.
+
+Usage:
+
+    poetry run python benchmarks/raw_diff.py [num_files]
+
+This generates a synthetic raw diff for 200k files by default (mostly
+modifications, plus adds, deletes, renames and binary files) and parses it
+both from a string and incrementally from a byte stream, as dirdiff does with
+git's stdout. Memory is the peak traced by tracemalloc during the parse.
+"""
+
+import io
+import sys
+import time
+import tracemalloc
+
+from webdiff import unified_diff
+
+SHA = '0' * 7
+
+
+def synthetic_raw_diff(n) -> bytes:
+    raw = []
+    numstat = []
+    for i in range(n):
+        path = f'left/pkg{i // 1000}/sub{i % 7}/file{i}.py'
+        kind = i % 10
+        if kind == 7:
+            raw += [f':000000 100644 {SHA} {SHA} A', f'right/new{i}.py']
+            numstat.append(f'{i % 50}\t0\tright/new{i}.py')
+        elif kind == 8:
+            dst = f'right/pkg{i // 1000}/moved{i}.py'
+            raw += [f':100644 100644 {SHA} {SHA} R087', path, dst]
+            numstat += [f'{i % 3}\t{i % 4}\t', path, dst]
+        elif kind == 9:
+            raw += [f':100644 100644 {SHA} {SHA} M', path]
+            numstat.append(f'-\t-\t{path}')
+        else:
+            raw += [f':100644 100644 {SHA} {SHA} M', path]
+            numstat.append(f'{i % 13}\t{i % 5}\t{path}')
+    return ('\0'.join(raw + numstat) + '\0').encode('utf8')
+
+
+def parse_string(data: bytes):
+    return unified_diff.parse_raw_diff(data.decode('utf8'))
+
+
+def parse_stream(data: bytes):
+    stream = io.BufferedReader(io.BytesIO(data))
+    parts = unified_diff.iter_nul_separated(stream)
+    return list(unified_diff.iter_raw_diff(parts))
+
+
+def measure(fn, data, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv):
+    n = int(argv[0]) if argv else 200_000
+    data = synthetic_raw_diff(n)
+    print(f'{n} files, {len(data) / 1e6:.1f} MB of raw diff')
+    parsers = {'string': parse_string}
+    if hasattr(unified_diff, 'iter_raw_diff'):
+        parsers['stream'] = parse_stream
+    for name, fn in parsers.items():
+        secs, peak = measure(fn, data)
+        print(f'{name:>8}: {secs * 1000:8.1f} ms, peak {peak / 1e6:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""Time and memory for building diffs and serializing the file list.
+
+Usage:
+
+    poetry run python benchmarks/thin_list.py [num_files ...]
+
+For each size (10k and 100k files by default), this builds LocalFileDiffs from
+synthetic RawDiffLines, as dirdiff.gitdiff does, then builds the thin list and
+serializes it to JSON, as the index page and /pairs do. Memory is the peak
+traced by tracemalloc while building the diffs.
+"""
+
+import functools
+import json
+import sys
+import time
+import tracemalloc
+
+from webdiff import diff
+from webdiff.localfilediff import LocalFileDiff
+from webdiff.unified_diff import RawDiffLine
+
+A_DIR = '/tmp/webdiff-bench/left'
+B_DIR = '/tmp/webdiff-bench/right'
+STATUSES = 'MMMMMMMADR'
+
+
+def raw_lines(n):
+    lines = []
+    for i in range(n):
+        status = STATUSES[i % len(STATUSES)]
+        # git reports added files under the right directory.
+        root = B_DIR if status == 'A' else A_DIR
+        path = f'{root}/pkg{i // 1000}/sub{i % 7}/file{i}.py'
+        dst_path = f'{B_DIR}/pkg{i // 1000}/moved/file{i}.py' if status == 'R' else None
+        lines.append(
+            RawDiffLine(
+                '100644',
+                '100644',
+                '0' * 40,
+                '0' * 40,
+                status,
+                path,
+                score=90 if status == 'R' else None,
+                dst_path=dst_path,
+                num_add=i % 13,
+                num_delete=i % 5,
+            )
+        )
+    return lines
+
+
+def build_diffs(lines):
+    return [LocalFileDiff.from_diff_raw_line(line, A_DIR, B_DIR) for line in lines]
+
+
+def best_of(fn, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [10_000, 100_000]
+    for n in sizes:
+        lines = raw_lines(n)
+
+        tracemalloc.start()
+        diffs = build_diffs(lines)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del diffs
+
+        build_secs, diffs = best_of(functools.partial(build_diffs, lines))
+        thin_secs, pairs = best_of(functools.partial(diff.get_thin_list, diffs))
+        json_secs, data = best_of(
+            functools.partial(json.dumps, pairs, separators=(',', ':'))
+        )
+        lookup_secs, _ = best_of(functools.partial(diff.make_path_index, diffs))
+
+        print(f'{n:>8} files')
+        print(f'  build diffs: {build_secs * 1000:8.1f} ms, {peak / n:6.0f} bytes/diff')
+        print(f'  thin list:   {thin_secs * 1000:8.1f} ms')
+        print(f'  to JSON:     {json_secs * 1000:8.1f} ms, {len(data) / 1e6:.1f} MB')
+        print(f'  path index:  {lookup_secs * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,390 @@
+import asyncio
+import os
+import time
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from webdiff import app, diff, dirdiff, options, util
+from webdiff.diskcache import DiskCache
+from webdiff.localfilediff import LocalFileDiff
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+
+# An aiohttp Application can only ever be used with one event loop.
+LOOP = asyncio.new_event_loop()
+
+
+def with_client(config, diffs, test):
+    """Run test(client) against the webdiff server."""
+
+    async def run():
+        app.GIT_CONFIG = config
+        app.DIFF = diffs
+        async with TestClient(TestServer(app.app)) as client:
+            await test(client)
+
+    LOOP.run_until_complete(run())
+
+
+def make_config(**webdiff_options):
+    return {
+        **options.DEFAULTS,
+        'webdiff': {**options.DEFAULTS['webdiff'], **webdiff_options},
+    }
+
+
+def test_slow_requests_do_not_block_others(tmp_path, monkeypatch):
+    diffs = []
+    for name in ('slow', 'fast'):
+        path = tmp_path / f'{name}.txt'
+        path.write_text(name)
+        diffs.append(LocalFileDiff(str(tmp_path), str(path), str(tmp_path), '', False))
+
+    def get_thick_dict(d):
+        if d.a == 'slow.txt':
+            time.sleep(0.5)
+        return {'a': d.a}
+
+    monkeypatch.setattr(diff, 'get_thick_dict', get_thick_dict)
+
+    async def fetch(client, idx):
+        response = await client.get(f'/thick/{idx}')
+        return (await response.json())['a'], time.perf_counter()
+
+    async def test(client):
+        slow = asyncio.create_task(fetch(client, 0))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        fast_name, fast_done = await fetch(client, 1)
+        slow_name, slow_done = await slow
+        assert (fast_name, slow_name) == ('fast.txt', 'slow.txt')
+        assert fast_done - start < 0.25
+        assert fast_done < slow_done
+
+    with_client(make_config(maxConcurrency=2), diffs, test)
+
+    async def test_serialized(client):
+        slow = asyncio.create_task(fetch(client, 0))
+        await asyncio.sleep(0.05)
+        _, fast_done = await fetch(client, 1)
+        _, slow_done = await slow
+        assert fast_done > slow_done
+
+    # With a concurrency limit of 1, the fast request has to wait.
+    with_client(make_config(maxConcurrency=1), diffs, test_serialized)
+
+
+def test_pdiff_info(monkeypatch):
+    monkeypatch.setattr(util, '_image_diff_engine', 'pillow')
+    left = os.path.join(TESTDATA, 'images/left')
+    right = os.path.join(TESTDATA, 'images/right')
+    diffs = [
+        LocalFileDiff(
+            left,
+            os.path.join(left, 'smiley.png'),
+            right,
+            os.path.join(right, 'smiley.png'),
+            False,
+        )
+    ]
+
+    async def test(client):
+        response = await client.get('/pdiffinfo/0')
+        assert response.status == 200
+        info = await response.json()
+        assert info['are_same_pixels'] is False
+        assert 0 < info['num_diff_pixels'] < info['num_pixels']
+        assert info['bbox']['width'] > 0
+
+        response = await client.get('/pdiff/0')
+        assert response.status == 200
+        assert response.content_type == 'image/png'
+
+    with_client(make_config(), diffs, test)
+
+
+def test_batch_diff_ops(tmp_path, monkeypatch):
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    a.mkdir()
+    b.mkdir()
+    (a / 'file.txt').write_text('a\nb\nc\n')
+    (b / 'file.txt').write_text('a\nB\nc\n')
+    config = make_config(batchDiffOps=True)
+    diffs = dirdiff.gitdiff(str(a), str(b), config['webdiff'])
+    monkeypatch.setattr(app, 'GIT_CONFIG', config)
+    monkeypatch.setattr(app, 'DIFF', diffs)
+    monkeypatch.setattr(app, 'BATCH_OPS', {})
+
+    app.compute_batch_diff_ops()
+    assert app.batch_diff_ops(0) == diff.get_diff_ops(diffs[0])
+
+    # Batched ops are ignored once a file changes.
+    (b / 'file.txt').write_text('a\nB\nc\nd\n')
+    assert app.batch_diff_ops(0) is None
+
+
+def test_pairs_pagination_and_filters(tmp_path):
+    names = ['src/a.py', 'src/b.txt', 'src/sub/c.py', 'docs/d.md', 'e.py']
+    diffs = []
+    for name in names:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+        diffs.append(LocalFileDiff(str(tmp_path), '', str(tmp_path), str(path), False))
+
+    async def get_pairs(client, **params):
+        response = await client.get('/pairs', params=params)
+        assert response.status == 200
+        return await response.json()
+
+    async def test(client):
+        page = await get_pairs(client, offset=2)
+        assert page['total'] == 5
+        assert [p['idx'] for p in page['pairs']] == [2, 3]
+
+        page = await get_pairs(client, prefix='src/', glob='*.py')
+        assert page['total'] == 2
+        assert [p['b'] for p in page['pairs']] == ['src/a.py', 'src/sub/c.py']
+        assert [p['idx'] for p in page['pairs']] == [0, 2]
+
+        response = await client.get('/pairs', params={'offset': 'x'})
+        assert response.status == 400
+
+        # The index page only includes the first page, plus the selected file.
+        response = await client.get('/4')
+        html = await response.text()
+        assert '"num_pairs":5' in html
+        assert '"a":"","b":"src/b.txt"' in html
+        assert 'src/sub/c.py' not in html
+        assert 'e.py' in html
+
+    with_client(make_config(filesPerPage=2), diffs, test)
+
+
+def test_contents_etags_and_compression(tmp_path):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('hello\n' * 1000)
+    b.write_text('hello\n' * 1001)
+    diffs = [LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)]
+
+    async def test(client):
+        params = {'path': 'b.txt'}
+        response = await client.get(
+            '/b/get_contents', params=params, headers={'Accept-Encoding': 'gzip'}
+        )
+        assert response.status == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert await response.text() == 'hello\n' * 1001
+        etag = response.headers['ETag']
+
+        headers = {'If-None-Match': etag}
+        response = await client.get('/b/get_contents', params=params, headers=headers)
+        assert response.status == 304
+
+        # The old POST API still works.
+        response = await client.post('/b/get_contents', data=params)
+        assert response.status == 200
+
+        b.write_text('goodbye\n')
+        response = await client.get('/b/get_contents', params=params, headers=headers)
+        assert response.status == 200
+        assert response.headers['ETag'] != etag
+        assert await response.text() == 'goodbye\n'
+
+    with_client(make_config(), diffs, test)
+
+
+def test_char_diffs(tmp_path, monkeypatch):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('same\nx = 1\n')
+    b.write_text('same\nx = 10\n')
+    diffs = [LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)]
+    monkeypatch.setattr(app, 'OPS_CACHE', DiskCache(str(tmp_path / 'cache'), 1 << 20))
+
+    async def test(client):
+        response = await client.post('/chardiffs/0', json={'options': []})
+        assert response.status == 200
+        assert await response.json() == [
+            [1, 1, [[None, 0, 4], ['delete', 4, 5]], [[None, 0, 4], ['insert', 4, 6]]]
+        ]
+
+        # The second request is served from the cache.
+        monkeypatch.setattr(diff.chardiff, 'char_diffs_for_codes', None)
+        response = await client.post('/chardiffs/0', json={'options': []})
+        assert (await response.json())[0][:2] == [1, 1]
+
+    with_client(make_config(charDiffEngine='server'), diffs, test)
+
+
+def test_highlight(tmp_path):
+    pytest.importorskip('pygments')
+    a = tmp_path / 'a.py'
+    b = tmp_path / 'b.py'
+    a.write_text('x = 1\n')
+    b.write_text('x = 1\n# comment\n')
+    diffs = [LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)]
+
+    async def test(client):
+        response = await client.get('/highlight/b/0', params={'start': 1, 'end': 2})
+        assert response.status == 200
+        assert await response.json() == {
+            'language': 'Python',
+            'start': 1,
+            'lines': [[[0, 9, 'hljs-comment']]],
+        }
+
+        response = await client.get('/highlight/a/0', params={'start': -1})
+        assert response.status == 400
+
+    with_client(make_config(highlightLargeFiles=True), diffs, test)
+
+
+def test_highlight_normalized_json(tmp_path):
+    pytest.importorskip('pygments')
+    a = tmp_path / 'a.json'
+    a.write_text('{"b": 1, "a": 2}')
+    diffs = [LocalFileDiff(str(tmp_path), str(a), str(tmp_path), '', False)]
+
+    async def test(client):
+        params = {'start': 0, 'end': 10}
+        response = await client.get('/highlight/a/0', params=params)
+        assert len((await response.json())['lines']) == 1
+
+        # The runs line up with the normalized file, which the UI shows.
+        params['normalize_json'] = '1'
+        response = await client.get('/highlight/a/0', params=params)
+        assert (await response.json())['lines'] == [
+            [],
+            [[2, 5, 'hljs-name'], [7, 8, 'hljs-number']],
+            [[2, 5, 'hljs-name'], [7, 8, 'hljs-number']],
+            [],
+        ]
+
+    try:
+        with_client(make_config(highlightLargeFiles=True), diffs, test)
+    finally:
+        util.remove_temp_files()
+
+
+def test_get_lines_for_large_files(tmp_path):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('')
+    b.write_text(''.join(f'line {i}\n' for i in range(5000)))
+    diffs = [LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)]
+
+    async def test(client):
+        params = {'path': 'b.txt', 'max_bytes': 1000}
+        response = await client.get('/b/get_contents', params=params)
+        assert response.status == 413
+
+        params = {'path': 'b.txt', 'start': 2000, 'end': 2003}
+        response = await client.get('/b/get_lines', params=params)
+        assert response.status == 200
+        assert await response.json() == {
+            'num_lines': 5001,
+            'start': 2000,
+            'lines': ['line 2000', 'line 2001', 'line 2002'],
+        }
+        etag = response.headers['ETag']
+        headers = {'If-None-Match': etag}
+        response = await client.get('/b/get_lines', params=params, headers=headers)
+        assert response.status == 304
+
+        params = {'path': 'b.txt', 'start': 2000, 'end': 2001}
+        response = await client.get('/b/get_lines', params=params, headers=headers)
+        assert response.status == 200
+
+    with_client(make_config(), diffs, test)
+
+
+def test_static_cache_control():
+    async def test(client):
+        response = await client.get('/static/css/style.css?v=123')
+        assert response.status == 200
+        assert 'immutable' in response.headers['Cache-Control']
+
+        response = await client.get('/static/css/style.css')
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    with_client(make_config(), [], test)
+
+
+def test_image_etag():
+    left = os.path.join(TESTDATA, 'images/left')
+    right = os.path.join(TESTDATA, 'images/right')
+    diffs = [
+        LocalFileDiff(
+            left,
+            os.path.join(left, 'smiley.png'),
+            right,
+            os.path.join(right, 'smiley.png'),
+            False,
+        )
+    ]
+    with open(os.path.join(left, 'smiley.png'), 'rb') as f:
+        expected = f.read()
+
+    async def test(client):
+        response = await client.get('/a/image/smiley.png')
+        assert response.status == 200
+        assert response.content_type == 'image/png'
+        assert await response.read() == expected
+        etag = response.headers['ETag']
+
+        response = await client.get(
+            '/a/image/smiley.png', headers={'If-None-Match': etag}
+        )
+        assert response.status == 304
+
+    with_client(make_config(), diffs, test)
+
+
+def test_index_is_rendered_once_per_diff(tmp_path, monkeypatch):
+    path = tmp_path / 'a.txt'
+    path.write_text('a')
+    diffs = [LocalFileDiff(str(tmp_path), '', str(tmp_path), str(path), False)] * 3
+    reads = []
+
+    real_thin_list = diff.get_thin_list
+
+    def get_thin_list(diffs):
+        reads.append(len(diffs))
+        return real_thin_list(diffs)
+
+    monkeypatch.setattr(diff, 'get_thin_list', get_thin_list)
+
+    async def test(client):
+        for idx in (0, 2, 0):
+            response = await client.get(f'/{idx}')
+            assert f'var initialIdx = {idx};' in await response.text()
+        assert app.INDEX_PAGES.hits >= 1
+
+    with_client(make_config(), diffs, test)
+    assert reads == [3]
+
+    # A new diff is rendered again.
+    with_client(make_config(), diffs[:2], test)
+    assert reads == [3, 2]
+
+
+def test_index_with_placeholders_in_file_names(tmp_path):
+    diffs = []
+    for name in ('{{idx}}.txt', '{{extra_pairs}}.txt'):
+        path = tmp_path / name
+        path.write_text('a')
+        diffs.append(LocalFileDiff(str(tmp_path), '', str(tmp_path), str(path), False))
+
+    async def test(client):
+        response = await client.get('/1')
+        assert response.status == 200
+        html = await response.text()
+        assert 'var initialIdx = 1;' in html
+        assert '{{idx}}.txt' in html and '{{extra_pairs}}.txt' in html
+
+    with_client(make_config(), diffs, test)
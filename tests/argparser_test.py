@@ -38,3 +38,13 @@ def test_github_pull_request():
     assert {
         'github': {'owner': 'danvk', 'repo': 'dygraphs', 'num': 292}
     } == argparser.parse(['https://github.com/danvk/dygraphs/pull/292/commits'])
+
+
+def test_clear_cache():
+    assert {'clear_cache': True} == argparser.parse(['--clear-cache'])
+    assert {'clear_cache': True, 'files': (file1, file2)} == argparser.parse(
+        ['--clear-cache', file1, file2]
+    )
+
+    with pytest.raises(argparser.UsageError):
+        argparser.parse([])
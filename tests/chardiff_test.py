@@ -0,0 +1,124 @@
+from webdiff.chardiff import (
+    char_diffs_for_codes,
+    compute_character_diffs,
+    diff_arrays,
+    split_display_lines,
+    split_into_words,
+)
+from webdiff.unified_diff import Code
+
+
+def test_split_into_words():
+    assert split_into_words('<DiffView filePair={filePair}') == [
+        *('<', 'Diff', 'View', ' ', 'file', 'Pair', '='),
+        *('{', 'file', 'Pair', '}'),
+    ]
+    assert split_into_words('Test1TEST23testAbc{}') == [
+        *('Test', '1', 'TEST', '23', 'test', 'Abc', '{', '}'),
+    ]
+    assert split_into_words('   FooBar') == [' ', ' ', ' ', 'Foo', 'Bar']
+
+
+def mark(text, spans):
+    """Render spans like 'abc[def]' to make expectations easier to read."""
+    return ''.join(
+        text[start:limit] if cls is None else f'[{text[start:limit]}]'
+        for cls, start, limit in spans
+    )
+
+
+def assert_char_diff(before, before_expected, after, after_expected):
+    before_spans, after_spans = compute_character_diffs(before, after)
+    assert mark(before, before_spans) == before_expected
+    assert mark(after, after_spans) == after_expected
+
+
+def test_char_diffs():
+    # These match ts/codediff/__tests__/addcharacterdiffs_test.ts
+    assert_char_diff(
+        'output.writeBytes(obj.sequence)',
+        'output.writeBytes(obj.sequence)',
+        'output.writeBytes(obj.sequence.toArray)',
+        'output.writeBytes(obj.sequence[.toArray])',
+    )
+    assert_char_diff(
+        '<ImageDiffModeSelector filePair={filePair}',
+        '<[Image]Diff[ModeSelector] filePair={filePair}',
+        '<DiffView filePair={filePair}',
+        '<Diff[View] filePair={filePair}',
+    )
+    assert_char_diff(
+        'changeHandler={this.changeImageDiffModeHandler}/>',
+        'changeHandler={this.changeImageDiffModeHandler}/>',
+        'changeImageDiffModeHandler={this.changeImageDiffModeHandler} />',
+        'change[ImageDiffMode]Handler={this.changeImageDiffModeHandler}[ ]/>',
+    )
+    assert_char_diff('  foo: "bar"', '  foo: "bar"', '  foo: "bar",', '  foo: "bar"[,]')
+
+
+def test_diff_arrays_matches_jsdiff():
+    # Expected outputs are from jsdiff's diffArrays, which the client uses.
+    # It prefers deletions before insertions (unlike git's xdiff heuristics).
+    assert diff_arrays('abcd', 'acbd') == [
+        *(('equal', 1), ('delete', 1), ('equal', 1), ('insert', 1), ('equal', 1)),
+    ]
+    assert diff_arrays('ababbbbaa', 'abbabba') == [
+        *(('equal', 2), ('insert', 1), ('equal', 3), ('delete', 2)),
+        *(('equal', 1), ('delete', 1)),
+    ]
+    assert diff_arrays('cabab', 'bcab') == [('insert', 1), ('equal', 3), ('delete', 2)]
+    assert diff_arrays('', 'ab') == [('insert', 2)]
+    assert diff_arrays('ab', '') == [('delete', 2)]
+    assert diff_arrays('abc', 'abc') == [('equal', 3)]
+
+
+def test_char_diffs_span_classes():
+    assert compute_character_diffs('a = 1', 'a = 2') == (
+        [[None, 0, 4], ['delete', 4, 5]],
+        [[None, 0, 4], ['insert', 4, 5]],
+    )
+
+
+def test_char_diffs_suppressed_for_unrelated_lines():
+    assert compute_character_diffs('abc def', 'uvw xyz') is None
+    # ... unless the only difference is whitespace.
+    assert compute_character_diffs('  ', '   ') == (
+        [[None, 0, 2]],
+        [[None, 0, 2], ['insert', 2, 3]],
+    )
+
+
+def test_char_diffs_use_utf16_offsets():
+    # '😀' is two UTF-16 code units, so 'x' starts at offset 3 in JavaScript.
+    assert compute_character_diffs('😀 x', '😀 y') == (
+        [[None, 0, 3], ['delete', 3, 4]],
+        [[None, 0, 3], ['insert', 3, 4]],
+    )
+
+
+def test_split_display_lines():
+    assert split_display_lines('a\nb\n') == ['a', 'b', '']
+    assert split_display_lines('a\r\nb') == ['a', 'b']
+    assert split_display_lines('a\rb') == ['a', 'b']
+
+
+def test_char_diffs_for_codes():
+    before = ['same', 'x = 1', 'y = 2', 'q' * 100]
+    after = ['same', 'x = 10', 'y = 20', 'r' * 100, 'extra']
+    codes = [
+        Code('equal', (0, 1), (0, 1)),
+        Code('replace', (1, 4), (1, 5)),
+    ]
+    char_diffs = char_diffs_for_codes(before, after, codes, max_line_length=50)
+    assert char_diffs == [
+        [1, 1, [[None, 0, 4], ['delete', 4, 5]], [[None, 0, 4], ['insert', 4, 6]]],
+        [2, 2, [[None, 0, 4], ['delete', 4, 5]], [[None, 0, 4], ['insert', 4, 6]]],
+        # line 3 is too long; 'extra' has nothing in common with ''.
+    ]
+
+
+def test_char_diffs_expand_tabs():
+    codes = [Code('replace', (0, 1), (0, 1))]
+    assert char_diffs_for_codes(['\ta'], ['\tb'], codes, 100) == [
+        [0, 0, [[None, 0, 4], ['delete', 4, 5]], [[None, 0, 4], ['insert', 4, 5]]],
+    ]
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from webdiff import diff, dirdiff, options
+from webdiff.unified_diff import Code
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+CONFIG = options.DEFAULTS['webdiff']
+
+
+def assert_batch_matches_per_file(a_dir, b_dir, flags, expect_all=True):
+    diffs = dirdiff.gitdiff(a_dir, b_dir, CONFIG)
+    ops = dirdiff.batch_diff_ops(diffs, CONFIG, flags)
+    for idx, d in enumerate(diffs):
+        if idx in ops:
+            assert ops[idx] == diff.get_diff_ops(d, [*flags]), d
+        else:
+            assert not (expect_all and d.a_path and d.b_path), d
+    return ops
+
+
+@pytest.mark.parametrize('flags', [[], ['-w'], ['-U8', '--diff-algorithm=patience']])
+def test_batch_matches_per_file_diffs(flags):
+    for name in sorted(os.listdir(TESTDATA)):
+        left = os.path.join(TESTDATA, name, 'left')
+        right = os.path.join(TESTDATA, name, 'right')
+        if os.path.isdir(left):
+            assert_batch_matches_per_file(left, right, flags)
+
+
+def test_batch_unusual_files(tmp_path, monkeypatch):
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    (a / 'sub').mkdir(parents=True)
+    (b / 'sub').mkdir(parents=True)
+    files = {
+        'text.txt': ('a\nb\nc\n', 'a\nB\nc'),
+        'sub/with space.txt': ('x\n', 'y\n'),
+        'üml.txt': ('1\n', '2\n'),
+        'q"uote.txt': ('1\n', '2\n'),
+        'same.txt': ('same\n', 'same\n'),
+        'deleted.txt': ('gone\n', None),
+        'added.txt': (None, 'new\n'),
+    }
+    for name, (before, after) in files.items():
+        if before is not None:
+            (a / name).write_text(before)
+        if after is not None:
+            (b / name).write_text(after)
+    (a / 'binary').write_bytes(b'\0\1')
+    (b / 'binary').write_bytes(b'\0\2')
+
+    (a / 'old name.txt').write_text('1\n2\n3\n')
+    (b / 'new name.txt').write_text('1\n2\n3\n')
+
+    ops = assert_batch_matches_per_file(str(a), str(b), [], expect_all=False)
+    # The quoted file name can't be matched, so it's left for get_diff_ops.
+    assert len(ops) == 5
+    diffs = dirdiff.gitdiff(str(a), str(b), CONFIG)
+    ops_by_name = {diffs[idx].b: codes for idx, codes in ops.items()}
+    assert ops_by_name['text.txt'] == [
+        Code('equal', (0, 1), (0, 1)),
+        Code('replace', (1, 3), (1, 3)),
+    ]
+    assert ops_by_name['binary'] == [Code('replace', (0, 1), (0, 1))]
+    assert ops_by_name['new name.txt'] == [Code('equal', (0, 3), (0, 3))]
+
+    # Relative paths work, too.
+    monkeypatch.chdir(tmp_path)
+    assert len(assert_batch_matches_per_file('a', 'b', [], expect_all=False)) == 5
+
+    # As do directories with symlinks (like git difftool produces).
+    c = tmp_path / 'c'
+    (c / 'sub').mkdir(parents=True)
+    for name in ('text.txt', 'sub/with space.txt', 'binary'):
+        (c / name).symlink_to(b / name)
+    ops = assert_batch_matches_per_file(str(a), str(c), [], expect_all=False)
+    assert len(ops) == 3
+
+
+def test_batch_mode_changes(tmp_path):
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    a.mkdir()
+    b.mkdir()
+    for name, before, after in (
+        ('chmod.txt', 'x\ny\n', 'x\ny\n'),
+        ('both.txt', '1\n2\n', '1\n3\n'),
+    ):
+        (a / name).write_text(before)
+        (b / name).write_text(after)
+        os.chmod(b / name, 0o755)
+    (a / 'old.txt').write_text('1\n2\n3\n')
+    (b / 'new.txt').write_text('1\n2\n3\n')
+    os.chmod(b / 'new.txt', 0o755)
+
+    ops = assert_batch_matches_per_file(str(a), str(b), [], expect_all=False)
+    # A change in mode alone has no hunks, so it's left for get_diff_ops.
+    diffs = dirdiff.gitdiff(str(a), str(b), CONFIG)
+    assert [diffs[idx].b for idx in ops] == ['both.txt']
+
+
+def test_iter_gitdiff_can_stop_early():
+    left = os.path.join(TESTDATA, 'manyfiles', 'left')
+    right = os.path.join(TESTDATA, 'manyfiles', 'right')
+    diffs = dirdiff.iter_gitdiff(left, right, CONFIG)
+    first = next(diffs)
+    diffs.close()  # kills git
+    assert first == dirdiff.gitdiff(left, right, CONFIG)[0]
@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+from webdiff import diff, dirdiff, dirsnapshot, options, util
+from webdiff.diskcache import DiskCache
+from webdiff.unified_diff import Code
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+CONFIG = options.DEFAULTS['webdiff']
+
+
+def summary(diffs):
+    return [(d.a, d.b, d.type, d.num_add, d.num_delete) for d in diffs]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Remember the hashes of files written by the test, too.
+    monkeypatch.setattr(dirsnapshot, 'RACY_SECS', -10)
+    return DiskCache(str(tmp_path / 'cache'), 100 * 1024 * 1024)
+
+
+def test_matches_gitdiff_on_testdata(cache):
+    for name in sorted(os.listdir(TESTDATA)):
+        left = os.path.join(TESTDATA, name, 'left')
+        right = os.path.join(TESTDATA, name, 'right')
+        if os.path.isdir(left):
+            expected = summary(dirdiff.gitdiff(left, right, CONFIG))
+            # The first run fills the cache, the second reuses it.
+            for _ in range(2):
+                diffs = dirsnapshot.gitdiff(left, right, CONFIG, cache)
+                assert summary(diffs) == expected, name
+
+
+def write_files(root, files):
+    for name, text in files.items():
+        path = root / name
+        if text is None:
+            if path.exists():
+                path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+
+
+def test_reuses_unchanged_files(tmp_path, cache, monkeypatch):
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    lines = ''.join(f'line {i}\n' for i in range(100))
+    write_files(a, {f'dir/f{i}.txt': f'{i}\n' for i in range(20)})
+    write_files(b, {f'dir/f{i}.txt': f'{i}\n' for i in range(20)})
+    write_files(a, {'changed.txt': 'a\nb\n', 'old.txt': lines, 'gone.txt': 'x\n'})
+    write_files(b, {'changed.txt': 'a\nB\n', 'new.txt': lines, 'added.txt': 'y\n'})
+
+    real_gitdiff = dirdiff.gitdiff
+    real_blob_sha = util.git_blob_sha
+
+    def check():
+        expected = summary(real_gitdiff(str(a), str(b), CONFIG))
+        assert summary(dirsnapshot.gitdiff(str(a), str(b), CONFIG, cache)) == expected
+
+    gitdiff_dirs = []
+    hashed = []
+    monkeypatch.setattr(
+        dirdiff,
+        'gitdiff',
+        lambda a_dir, b_dir, config: (
+            gitdiff_dirs.append(sorted(os.listdir(a_dir)) + sorted(os.listdir(b_dir)))
+            or real_gitdiff(a_dir, b_dir, config)
+        ),
+    )
+    monkeypatch.setattr(
+        util, 'git_blob_sha', lambda path: hashed.append(path) or real_blob_sha(path)
+    )
+
+    check()
+    assert len(hashed) == 46
+
+    # Nothing changed: nothing is hashed or diffed.
+    gitdiff_dirs.clear()
+    hashed.clear()
+    check()
+    assert hashed == []
+    assert gitdiff_dirs == []
+
+    # A modified file is diffed by itself.
+    write_files(b, {'dir/f3.txt': 'three\n'})
+    gitdiff_dirs.clear()
+    hashed.clear()
+    check()
+    assert hashed == [os.path.realpath(b / 'dir/f3.txt')]
+    assert gitdiff_dirs == [['dir', 'dir']]
+
+    # New adds and deletes are diffed together, in case they're renames.
+    write_files(a, {'old2.txt': lines + 'more\n'})
+    write_files(b, {'new2.txt': lines + 'more\n', 'added.txt': None})
+    gitdiff_dirs.clear()
+    check()
+    assert gitdiff_dirs == [['gone.txt', 'old.txt', 'old2.txt', 'new.txt', 'new2.txt']]
+
+    # Mode changes are picked up, too.
+    os.chmod(b / 'dir/f5.txt', 0o755)
+    check()
+
+
+def test_symlinks(tmp_path, cache):
+    # git difftool fills one side with symlinks to the working tree.
+    work = tmp_path / 'work'
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    write_files(work, {'x.txt': 'new\n', 'sub/y.txt': 'same\n'})
+    write_files(a, {'x.txt': 'old\n', 'sub/y.txt': 'same\n'})
+    (b / 'sub').mkdir(parents=True)
+    os.symlink(work / 'x.txt', b / 'x.txt')
+    os.symlink(work / 'sub/y.txt', b / 'sub/y.txt')
+
+    expected = summary(dirdiff.gitdiff(str(a), str(b), CONFIG))
+    assert expected == [('x.txt', 'x.txt', 'change', 1, 1)]
+    for _ in range(2):
+        diffs = dirsnapshot.gitdiff(str(a), str(b), CONFIG, cache)
+        assert summary(diffs) == expected
+    assert diffs[0].b_path == os.path.join(str(b), 'x.txt')
+
+
+def test_matches_gitdiff_order(tmp_path, cache):
+    # git lists each directory's entries by name, so 'a/b' comes before 'a-c'.
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    names = ['a0', 'a.txt', 'a-c', 'a/b', 'a/b.txt']
+    write_files(a, {name: 'old\n' for name in names})
+    write_files(b, {name: 'new\n' for name in names})
+    write_files(a, {'z_old.txt': 'moved\n' * 10, 'a-gone': 'x\n'})
+    write_files(b, {'a/new.txt': 'moved\n' * 10, 'a/added': 'y\n'})
+
+    expected = summary(dirdiff.gitdiff(str(a), str(b), CONFIG))
+    assert [x[1] or x[0] for x in expected][:4] == [
+        'a/added',
+        'a/b',
+        'a/b.txt',
+        'a/new.txt',
+    ]
+    for _ in range(2):
+        diffs = dirsnapshot.gitdiff(str(a), str(b), CONFIG, cache)
+        assert summary(diffs) == expected
+
+
+def test_snapshots_are_per_directory(tmp_path, cache):
+    for name in ('one', 'two'):
+        write_files(tmp_path / name / 'a', {'x.txt': 'a\n', 'y.txt': 'same\n'})
+        write_files(tmp_path / name / 'b', {'x.txt': 'b\n', 'y.txt': 'same\n'})
+    write_files(tmp_path / 'two' / 'b', {'y.txt': 'different\n'})
+
+    for name in ('one', 'two', 'one', 'two'):
+        a, b = str(tmp_path / name / 'a'), str(tmp_path / name / 'b')
+        expected = summary(dirdiff.gitdiff(a, b, CONFIG))
+        diffs = dirsnapshot.gitdiff(a, b, CONFIG, cache)
+        assert summary(diffs) == expected
+        assert all(d.a_path.startswith(a) for d in diffs)
+
+
+def test_edits_after_the_diff_are_seen(tmp_path, cache):
+    a = tmp_path / 'a'
+    b = tmp_path / 'b'
+    write_files(a, {'x.txt': 'one\ntwo\n'})
+    write_files(b, {'x.txt': 'one\nthree\n'})
+    for _ in range(2):
+        (d,) = dirsnapshot.gitdiff(str(a), str(b), CONFIG, cache)
+    assert not diff.no_changes(d)
+
+    # The reported object ids are stale once the file is edited.
+    write_files(b, {'x.txt': 'one\ntwo\n'})
+    assert diff.no_changes(d)
+    assert diff.get_diff_ops(d) == [Code('equal', before=(0, 2), after=(0, 2))]
@@ -0,0 +1,63 @@
+import os
+
+from webdiff import diff
+from webdiff.diskcache import DiskCache, make_key
+from webdiff.localfilediff import LocalFileDiff
+
+
+def test_roundtrip(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'), 1024)
+    key = make_key('a', 1)
+    assert cache.get(key) is None
+    cache.put(key, {'x': [1, 2]})
+    assert cache.get(key) == {'x': [1, 2]}
+    assert make_key('a', 1) == key
+    assert make_key('a', 2) != key
+
+    cache.clear()
+    assert cache.get(key) is None
+
+
+def test_disabled(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'), 0)
+    cache.put('k', 'v')
+    assert cache.get('k') is None
+    assert not os.path.exists(tmp_path / 'cache')
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), 100)
+    for i in range(4):
+        cache.put(f'k{i}', 'x' * 20)
+        # ensure distinct mtimes
+        os.utime(cache._entry_path(f'k{i}'), (i, i))
+    cache.get('k0')  # k1 is now the least-recently used entry
+    cache.put('k4', 'x' * 20)
+
+    assert cache.get('k1') is None
+    for key in ('k0', 'k2', 'k3', 'k4'):
+        assert cache.get(key) == 'x' * 20
+
+
+def test_get_diff_ops_cache(tmp_path, monkeypatch):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('a\nb\nc\n')
+    b.write_text('a\nB\nc\n')
+    d = LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)
+    cache = DiskCache(str(tmp_path / 'cache'), 1024 * 1024)
+
+    expected = diff.get_diff_ops(d)
+    assert diff.get_diff_ops(d, cache=cache) == expected
+
+    def fail(*args, **kwargs):
+        raise AssertionError('diff should have come from the cache')
+
+    monkeypatch.setattr(diff, 'run_git_diff', fail)
+    assert diff.get_diff_ops(d, cache=cache) == expected
+
+    # Different flags or file contents are cache misses.
+    monkeypatch.undo()
+    assert diff.get_diff_ops(d, ['-U0'], cache=cache) != expected
+    b.write_text('a\nb\nc\nd\n')
+    assert diff.get_diff_ops(d, cache=cache) == diff.get_diff_ops(d)
@@ -0,0 +1,54 @@
+import pytest
+
+from webdiff import highlight
+
+pytest.importorskip('pygments')
+
+
+def test_tokenize_text():
+    lexer = highlight.get_lexer('x.py')
+    text = 'def f():\n    return """a\nb"""  # 😀 x\n'
+    # Runs are split across lines, and offsets are in UTF-16 code units.
+    assert highlight.tokenize_text(text, lexer) == [
+        [[0, 3, 'hljs-keyword'], [4, 5, 'hljs-title function_']],
+        [[4, 10, 'hljs-keyword'], [11, 15, 'hljs-string']],
+        [[0, 4, 'hljs-string'], [6, 12, 'hljs-comment']],
+        [],
+    ]
+
+
+def test_css_class_inherits_from_parent_types():
+    from pygments.token import Token
+
+    assert highlight.css_class(Token.Keyword.Namespace) == 'hljs-keyword'
+    assert highlight.css_class(Token.Literal.String.Double) == 'hljs-string'
+    assert highlight.css_class(Token.Text) is None
+
+
+def test_highlight_lines_caches_by_contents(tmp_path, monkeypatch):
+    path = tmp_path / 'big.py'
+    path.write_text('x = 1\n' * 10)
+    highlight.tokenize_file.cache.clear()
+
+    data = highlight.highlight_lines(str(path), 'big.py', 2, 4)
+    assert data == {
+        'language': 'Python',
+        'start': 2,
+        'lines': [[[4, 5, 'hljs-number']], [[4, 5, 'hljs-number']]],
+    }
+
+    # The same contents at another path aren't tokenized again.
+    copy = tmp_path / 'copy.py'
+    copy.write_text(path.read_text())
+    monkeypatch.setattr(highlight, 'tokenize_text', None)
+    assert highlight.highlight_lines(str(copy), 'big.py', 2, 4) == data
+
+
+def test_highlight_unknown_language(tmp_path):
+    path = tmp_path / 'notes.unknown-extension'
+    path.write_text('hello\n')
+    assert highlight.highlight_lines(str(path), path.name, 0, 10) == {
+        'language': None,
+        'start': 0,
+        'lines': [],
+    }
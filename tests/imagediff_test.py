@@ -0,0 +1,87 @@
+import os
+
+import pytest
+from PIL import Image
+
+from webdiff import imagediff, util
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+
+
+def make_image(path, size, pixels=None, mode='RGB'):
+    im = Image.new(mode, size, 'white')
+    for xy, color in (pixels or {}).items():
+        im.putpixel(xy, color)
+    im.save(path)
+    return str(path)
+
+
+def test_diff_images(tmp_path):
+    a = make_image(tmp_path / 'a.png', (20, 10))
+    b = make_image(
+        tmp_path / 'b.png', (20, 10), {(3, 2): (0, 0, 0), (7, 5): (255, 0, 255)}
+    )
+    pdiff = imagediff.diff_images(a, b)
+    assert not pdiff.same_pixels
+    assert pdiff.num_diff_pixels == 2
+    assert pdiff.num_pixels == 200
+    assert pdiff.bbox == {
+        'width': 5,
+        'height': 4,
+        'left': 3,
+        'top': 2,
+        'bottom': 6,
+        'right': 8,
+    }
+    # Four channels (incl. alpha) per pixel; three channels of one pixel are 255
+    # off and one channel of the other is.
+    assert pdiff.rmse == pytest.approx(((4 * 255**2) / 800) ** 0.5 / 255)
+
+    same = imagediff.diff_images(a, a)
+    assert same.same_pixels
+    assert same.num_diff_pixels == 0
+    assert same.rmse == 0
+    assert same.bbox is None
+
+
+def test_diff_images_mixed_modes(tmp_path):
+    a = make_image(tmp_path / 'a.png', (4, 4))
+    b = make_image(tmp_path / 'b.png', (4, 4), mode='RGBA')
+    assert imagediff.diff_images(a, b).same_pixels
+
+    c = make_image(tmp_path / 'c.png', (5, 4))
+    with pytest.raises(imagediff.ImageSizeMismatch):
+        imagediff.diff_images(a, c)
+
+
+def test_dilate_and_highlight(tmp_path):
+    a = make_image(tmp_path / 'a.png', (30, 30))
+    b = make_image(tmp_path / 'b.png', (30, 30), {(15, 15): (0, 0, 0)})
+    mask = imagediff.dilate(imagediff.diff_images(a, b).mask)
+    assert mask.getbbox() == (10, 10, 21, 21)
+
+    path = str(tmp_path / 'highlight.png')
+    imagediff.highlight_image(mask).save(path)
+    assert imagediff.mask_from_highlight(path).getbbox() == (10, 10, 21, 21)
+
+
+def test_pillow_engine(monkeypatch):
+    monkeypatch.setattr(util, '_image_diff_engine', 'pillow')
+    left = os.path.join(TESTDATA, 'images/left/smiley.png')
+    right = os.path.join(TESTDATA, 'images/right/smiley.png')
+    pdiff = util.generate_pdiff_image(left, right)
+    expected = imagediff.diff_images(left, right)
+    assert not pdiff.same_pixels
+    assert pdiff.bbox == expected.bbox
+    assert pdiff.num_diff_pixels == expected.num_diff_pixels
+    # The bbox can also be recovered from the pdiff image.
+    mask = imagediff.mask_from_highlight(pdiff.diff_path)
+    assert imagediff.mask_stats(mask) == (expected.num_diff_pixels, expected.bbox)
+    dilated = util.generate_dilated_pdiff_image(pdiff.diff_path)
+    assert Image.open(dilated).size == Image.open(left).size
+
+    with pytest.raises(util.ImageDiffError):
+        util.generate_pdiff_image(
+            os.path.join(TESTDATA, 'images/left/4_differentSize.jpg'),
+            os.path.join(TESTDATA, 'images/right/4_differentSize.jpg'),
+        )
@@ -0,0 +1,136 @@
+import os
+import random
+
+import pytest
+
+from webdiff import diff, dirdiff, linediff, options
+from webdiff.localfilediff import LocalFileDiff
+from webdiff.unified_diff import Code
+
+TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+
+FLAG_SETS = [
+    [],
+    ['-w'],
+    ['-b'],
+    ['-U0'],
+    ['-U8'],
+    ['--diff-algorithm=minimal'],
+    ['--diff-algorithm=patience'],
+    ['--diff-algorithm=histogram'],
+    ['-w', '-U8', '--diff-algorithm=patience'],
+    ['-b', '-U1', '--diff-algorithm=histogram'],
+    ['--no-indent-heuristic'],
+]
+
+PYTHON_CONFIG = {
+    **options.DEFAULTS,
+    'webdiff': {**options.DEFAULTS['webdiff'], 'diffEngine': 'python'},
+}
+
+
+@pytest.fixture(autouse=True)
+def isolated_git_config(monkeypatch):
+    # The in-process engine should match git with its default configuration.
+    monkeypatch.setenv('GIT_CONFIG_GLOBAL', os.devnull)
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', '1')
+
+
+def file_pairs():
+    for name in sorted(os.listdir(TESTDATA)):
+        left = os.path.join(TESTDATA, name, 'left')
+        right = os.path.join(TESTDATA, name, 'right')
+        if not os.path.isdir(left):
+            continue
+        for d in dirdiff.gitdiff(left, right, options.DEFAULTS['webdiff']):
+            if d.a_path and d.b_path:
+                yield d
+
+
+def assert_engines_agree(d, flags):
+    expected = diff.get_diff_ops(d, [*flags])
+    actual = diff.get_diff_ops(d, [*flags], config=PYTHON_CONFIG)
+    assert actual == expected, (d, flags)
+
+
+@pytest.mark.parametrize('flags', FLAG_SETS, ids=' '.join)
+def test_testdata_matches_git(flags):
+    for d in file_pairs():
+        assert_engines_agree(d, flags)
+
+
+def random_file(rng: random.Random, num_lines: int):
+    # A small vocabulary produces lots of repeated lines, which exercises the
+    # heuristics that make git's diffs differ from a minimal edit script.
+    vocab = ['', '}', 'return x;', '    foo();', '\tbar()', 'if (x) {', 'a  b']
+    vocab += [f'line {i}' for i in range(num_lines // 4)]
+    return [rng.choice(vocab) for _ in range(num_lines)]
+
+
+def mutate(rng: random.Random, lines):
+    lines = [*lines]
+    for _ in range(rng.randint(1, 8)):
+        i = rng.randint(0, len(lines))
+        op = rng.random()
+        if op < 0.3:
+            del lines[i : i + rng.randint(1, 5)]
+        elif op < 0.6:
+            lines[i:i] = random_file(rng, rng.randint(1, 5))
+        elif op < 0.8 and i < len(lines):
+            lines[i] = lines[i].replace(' ', '   ')
+        else:
+            lines[i : i + 2] = random_file(rng, 2)
+    return lines
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_files_match_git(tmp_path, seed):
+    rng = random.Random(seed)
+    before = random_file(rng, rng.randint(0, 120))
+    after = mutate(rng, before)
+    a_path = tmp_path / 'a.txt'
+    b_path = tmp_path / 'b.txt'
+    a_path.write_text('\n'.join(before) + rng.choice(['', '\n']))
+    b_path.write_text('\n'.join(after) + rng.choice(['', '\n']))
+    d = LocalFileDiff(str(tmp_path), str(a_path), str(tmp_path), str(b_path), False)
+    for flags in FLAG_SETS:
+        assert_engines_agree(d, flags)
+
+
+def test_binary_identical_and_mode_changes(tmp_path):
+    a_path = tmp_path / 'a.bin'
+    b_path = tmp_path / 'b.bin'
+    a_path.write_bytes(b'\0\1\2\n')
+    b_path.write_bytes(b'\0\1\3\n')
+    d = LocalFileDiff(str(tmp_path), str(a_path), str(tmp_path), str(b_path), False)
+    assert_engines_agree(d, [])
+    assert diff.get_diff_ops(d, config=PYTHON_CONFIG) == [
+        Code('replace', before=(0, 1), after=(0, 1))
+    ]
+
+    a_path.write_bytes(b'a\nb')
+    b_path.write_bytes(b'a\nb')
+    assert_engines_agree(d, [])
+
+    b_path.write_bytes(b'a\nb   ')
+    assert_engines_agree(d, ['-w'])
+    b_path.chmod(0o755)
+    assert_engines_agree(d, ['-w'])
+
+
+def test_parse_diff_args():
+    settings = linediff.parse_diff_args(
+        ['-w', '-U5', '--diff-algorithm=Patience', '--find-renames=50%'],
+        {'algorithm': 'histogram', 'context': 3},
+    )
+    assert settings == linediff.DiffSettings(
+        algorithm='patience', context=5, ignore_all_space=True
+    )
+    assert linediff.parse_diff_args([], {'algorithm': 'histogram'}).algorithm == (
+        'histogram'
+    )
+
+    with pytest.raises(linediff.UnsupportedDiffArgs):
+        linediff.parse_diff_args(['-W'])
+    with pytest.raises(linediff.UnsupportedDiffArgs):
+        linediff.parse_diff_args(['--diff-algorithm=fancy'])
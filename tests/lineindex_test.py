@@ -0,0 +1,53 @@
+import pytest
+
+from webdiff import lineindex
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(lineindex, 'BLOCK_SIZE', 3)  # lines span blocks
+    lineindex.line_index.cache.clear()
+    yield
+    lineindex.line_index.cache.clear()
+
+
+@pytest.mark.parametrize(
+    'data',
+    [
+        b'',
+        b'abc',
+        b'abc\n',
+        b'\n\n',
+        b'a\nbcdef\r\n\nxyz',
+        b'1\n22\n333\n4444\n',
+        b'a\r\r\n\rb\n',
+    ],
+)
+def test_line_index(tmp_path, small_blocks, data):
+    path = tmp_path / 'file.txt'
+    path.write_bytes(data)
+    p = str(path)
+    grep_count = data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+    assert lineindex.count_lines(p) == grep_count
+
+    # Lines are split the same way as in the UI (see stringAsLines).
+    expected = [line.strip('\r') for line in data.decode('utf8').split('\n')]
+    n = len(expected)
+    assert lineindex.read_lines(p, 0, 100) == (n, expected)
+    for start in range(n):
+        for end in range(start, n + 1):
+            assert lineindex.read_lines(p, start, end) == (n, expected[start:end])
+
+
+def test_read_lines(tmp_path):
+    path = tmp_path / 'file.txt'
+    path.write_bytes(b'one\r\ntwo\nthree\n\nfive')
+    p = str(path)
+    assert lineindex.read_lines(p, 0, 100) == (5, ['one', 'two', 'three', '', 'five'])
+    assert lineindex.read_lines(p, 1, 3) == (5, ['two', 'three'])
+    assert lineindex.read_lines(p, 5, 10) == (5, [])
+
+    # The index is rebuilt when the file changes.
+    path.write_bytes(b'x\ny\n')
+    assert lineindex.read_lines(p, 0, 100) == (3, ['x', 'y', ''])
+    assert lineindex.count_lines(p) == 2
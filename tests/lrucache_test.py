@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from webdiff import lrucache
+from webdiff.lrucache import LRUCache, lru_cache
+
+
+def test_lru_eviction():
+    cache = LRUCache('test', maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)  # evicts b, the least-recently used entry
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats() == {
+        'size': 2,
+        'maxsize': 2,
+        'bytes': None,
+        'max_bytes': None,
+        'hits': 3,
+        'misses': 1,
+        'evictions': 1,
+        'invalidations': 0,
+    }
+
+
+def test_byte_limit():
+    cache = LRUCache('test', maxsize=100, max_bytes=10, sizeof=len)
+    cache.put('a', 'x' * 4)
+    cache.put('b', 'x' * 4)
+    cache.put('c', 'x' * 4)
+    assert len(cache) == 2
+    assert cache.get('a') is None
+    assert cache.num_bytes == 8
+
+    # A single oversized entry is still kept.
+    cache.put('d', 'x' * 20)
+    assert len(cache) == 1
+    assert cache.num_bytes == 20
+
+
+def test_decorator_invalidates_on_file_change(tmp_path):
+    calls = []
+
+    @lru_cache(maxsize=10, file_args=(0,), name='test_decorator')
+    def read(path, upper=False):
+        calls.append(path)
+        with open(path) as f:
+            text = f.read()
+        return text.upper() if upper else text
+
+    path = str(tmp_path / 'file.txt')
+    with open(path, 'w') as f:
+        f.write('hello')
+    assert read(path) == 'hello'
+    assert read(path) == 'hello'
+    assert read(path, upper=True) == 'HELLO'
+    assert len(calls) == 2
+
+    with open(path, 'w') as f:
+        f.write('goodbye!')
+    assert read(path) == 'goodbye!'
+    assert len(calls) == 3
+
+    stats = lrucache.all_stats()['test_decorator']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 3
+    assert stats['invalidations'] == 1
+    del lrucache.CACHES['test_decorator']
+
+
+def test_decorator_custom_key():
+    @lru_cache(key=lambda obj: obj['id'], name='test_custom_key')
+    def fn(obj):
+        return obj['id'] * 2
+
+    assert fn({'id': 1, 'unhashable': []}) == 2
+    assert fn({'id': 1, 'unhashable': [1]}) == 2
+    assert fn.cache.hits == 1
+    del lrucache.CACHES['test_custom_key']
+
+
+def test_util_caches_are_registered():
+    from webdiff import util  # noqa: F401
+
+    assert 'webdiff.util.contentHash' in lrucache.all_stats()
+
+
+def test_decorator_single_flight():
+    calls = []
+    release = threading.Event()
+
+    @lru_cache(name='test_single_flight')
+    def slow(x):
+        calls.append(x)
+        release.wait(timeout=5)
+        return x * 2
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(slow, 1) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        assert [f.result() for f in futures] == [2, 2, 2, 2]
+    assert calls == [1]
+    del lrucache.CACHES['test_single_flight']
+
+
+def test_decorator_single_flight_errors():
+    @lru_cache(name='test_single_flight_errors')
+    def fail(x):
+        raise ValueError(x)
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            fail(1)
+    assert len(fail.cache) == 0
+    del lrucache.CACHES['test_single_flight_errors']
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from webdiff import normalize
+
+DOCS = [
+    '{"b": 1, "a": [1, 2.5, -3e10, null, true, false], "c": {}}',
+    '[{"z": "\\u00e9\\n", "y": []}, "x", 12345678901234567890, {"k": {"j": [[]]}}]',
+    '  {"dup": 1, "other": [1], "dup": {"x": 2}}\n',
+    '"just a string"',
+    '12345',
+    '[]',
+    '{"é": "ünïcode", "\\"": "quote", "big": ['
+    + ', '.join(map(str, range(200)))
+    + ']}',
+]
+
+
+@pytest.fixture
+def small_values(monkeypatch):
+    """Stream anything larger than a few characters."""
+    monkeypatch.setattr(normalize, 'CHUNK_SIZE', 3)
+    monkeypatch.setattr(normalize, 'MAX_VALUE_SIZE', 8)
+
+
+def normalized(tmp_path, text):
+    in_path = tmp_path / 'in.json'
+    in_path.write_text(text, encoding='utf8')
+    out_path = tmp_path / 'out.json'
+    normalize.normalize_json_file(str(in_path), str(out_path))
+    return out_path.read_text()
+
+
+@pytest.mark.parametrize('doc', DOCS)
+def test_normalize_json_file(tmp_path, doc):
+    expected = json.dumps(json.loads(doc), indent=2, sort_keys=True)
+    assert normalized(tmp_path, doc) == expected
+
+
+@pytest.mark.parametrize('doc', DOCS)
+def test_normalize_json_file_streaming(tmp_path, small_values, doc):
+    expected = json.dumps(json.loads(doc), indent=2, sort_keys=True)
+    assert normalized(tmp_path, doc) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7])
+def test_normalize_numbers_across_chunks(tmp_path, monkeypatch, chunk_size):
+    # Each number gets cut off at every position by some chunk boundary.
+    monkeypatch.setattr(normalize, 'CHUNK_SIZE', chunk_size)
+    monkeypatch.setattr(normalize, 'MAX_VALUE_SIZE', 8)
+    numbers = [3.25e20, -3e-7, 12345, -1.5, 0, 1e100, 10.0]
+    for padding in range(chunk_size + 1):
+        doc = json.dumps(['x' * padding, *numbers, {'n': -2.5e-10}, 123456789])
+        expected = json.dumps(json.loads(doc), indent=2, sort_keys=True)
+        assert normalized(tmp_path, doc) == expected
+        # Top-level numbers, too.
+        assert normalized(tmp_path, ' ' * padding + '-12.5e+3') == '-12500.0'
+
+
+@pytest.mark.parametrize(
+    'doc',
+    ['', '{"a": 1', '[1, 2,]', '{"a": 1} {}', '{1: 2}', '[1 2]', '[tru]'],
+)
+def test_normalize_invalid_json(tmp_path, small_values, doc):
+    with pytest.raises(ValueError):
+        normalized(tmp_path, doc)
+
+
+@pytest.mark.parametrize('text', ['', 'c\nb\na\n', 'c\nb\nb\na', 'x\n\ny\r\n'])
+def test_sort_lines(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(normalize, 'SORT_RUN_SIZE', 2)
+    in_path = tmp_path / 'in.txt'
+    in_path.write_bytes(text.encode('utf8'))
+    out_path = tmp_path / 'out.txt'
+    normalize.sort_lines(str(in_path), str(out_path))
+    with open(in_path) as f:
+        expected = ''.join(sorted(f))
+    assert out_path.read_text() == expected
+
+
+def test_normalize_yaml_file(tmp_path):
+    pytest.importorskip('yaml')
+    in_path = tmp_path / 'in.yaml'
+    in_path.write_text('b: [1, two]\na:\n  2020-01-01: yes\n  3: null\n')
+    out_path = tmp_path / 'out.json'
+    normalize.normalize_yaml_file(str(in_path), str(out_path))
+    assert json.loads(out_path.read_text()) == {
+        'a': {'2020-01-01': True, '3': None},
+        'b': [1, 'two'],
+    }
+
+    in_path.write_text('a: [1\n')
+    with pytest.raises(ValueError):
+        normalize.normalize_yaml_file(str(in_path), str(out_path))
@@ -1,4 +1,12 @@
+import dataclasses
+import os
+
+import pytest
+
 from webdiff import diff
+from webdiff.diskcache import DiskCache
+from webdiff.localfilediff import LocalFileDiff
+from webdiff.unified_diff import Code, RawDiffLine
 
 
 class TinyDiff(object):
@@ -15,3 +23,147 @@ def test_is_image_diff():
     assert not diff.is_image_diff(TinyDiff('foo.txt', ''))
     assert diff.is_image_diff(TinyDiff('', 'foo.png'))
     assert not diff.is_image_diff(TinyDiff('', 'foo.txt'))
+
+
+def test_object_ids_from_raw_diff():
+    line = RawDiffLine(
+        src_mode='100644',
+        dst_mode='100644',
+        src_sha='a' * 40,
+        dst_sha='0' * 40,
+        status='M',
+        path='/left/foo.txt',
+    )
+    d = LocalFileDiff.from_diff_raw_line(line, '/left', '/right')
+    assert d.b_path == '/right/foo.txt'
+    assert d.a_sha == 'a' * 40
+    assert d.b_sha is None
+
+
+def test_matching_object_ids_skip_disk_reads(tmp_path):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('one\ntwo\n')
+    b.write_text('one\nthree\nfour\n')
+    # The object ids say these are the same, so the files aren't compared.
+    d = LocalFileDiff(
+        str(tmp_path), str(a), str(tmp_path), str(b), False, a_sha='a' * 40
+    )
+    d = dataclasses.replace(d, b_sha='a' * 40)
+    assert diff.no_changes(d)
+    assert diff.get_diff_ops(d) == [Code('equal', before=(0, 3), after=(0, 3))]
+
+    d = dataclasses.replace(d, b_sha='b' * 40)
+    assert not diff.no_changes(d)
+
+
+def test_object_ids_of_edited_files_are_ignored(tmp_path):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('one\ntwo\n')
+    b.write_text('one\ntwo\n')
+    sha = diff.blob_shas(
+        LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)
+    )[0]
+    d = LocalFileDiff(
+        str(tmp_path), str(a), str(tmp_path), str(b), False, a_sha=sha, b_sha=sha
+    )
+    assert diff.no_changes(d)
+
+    # The file is edited after git reported its object id.
+    b.write_text('one\ntwo\nthree\n')
+    assert diff.reported_shas(d) == (sha, None)
+    assert not diff.no_changes(d)
+    assert diff.blob_shas(d)[1] != sha
+    assert diff.get_diff_ops(d) == [
+        Code('equal', before=(0, 2), after=(0, 2)),
+        Code('insert', before=(2, 2), after=(2, 3)),
+    ]
+
+
+def test_identical_files_are_equal(tmp_path):
+    # A pure rename: git reports the same (abbreviated) id on both sides.
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a' / 'x.txt').write_text('a\nb\nc\n')
+    (tmp_path / 'b' / 'y.txt').write_text('a\nb\nc\n')
+    line = RawDiffLine(
+        '100644',
+        '100644',
+        'de98044',
+        'de98044',
+        'R',
+        str(tmp_path / 'a/x.txt'),
+        score=100,
+        dst_path=str(tmp_path / 'b/y.txt'),
+    )
+    d = LocalFileDiff.from_diff_raw_line(line, str(tmp_path / 'a'), str(tmp_path / 'b'))
+    assert d.a_sha is None and d.b_sha is None
+    expected = [Code('equal', before=(0, 3), after=(0, 3))]
+    assert diff.get_diff_ops(d) == expected
+    assert (
+        diff.get_diff_ops(d, cache=DiskCache(str(tmp_path / 'cache'), 1 << 20))
+        == expected
+    )
+
+
+def test_blob_shas(tmp_path):
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('hello\n')
+    b.write_text('hello\n')
+    d = LocalFileDiff(str(tmp_path), str(a), str(tmp_path), str(b), False)
+    # This is what `git hash-object` reports.
+    sha = 'ce013625030ba8dba906f756967f9e9ca394464a'
+    assert diff.blob_shas(d) == (sha, sha)
+    d = dataclasses.replace(d, b_sha='b' * 40)
+    assert diff.blob_shas(d) == (sha, 'b' * 40)
+
+
+def test_find_diff_index():
+    diffs = [
+        LocalFileDiff('/left', '/left/a.txt', '/right', '/right/a.txt', False),
+        LocalFileDiff('/left', '', '/right', '/right/sub/new.txt', False),
+        LocalFileDiff('/left', '/left/old.txt', '/right', '', False),
+        LocalFileDiff('/left', '/left/x.txt', '/right', '/right/y.txt', True),
+    ]
+    for path_index in (None, diff.make_path_index(diffs)):
+
+        def find(side, path, path_index=path_index):
+            return diff.find_diff_index(diffs, side, path, path_index)
+
+        assert find('a', 'a.txt') == 0
+        assert find('b', './sub//new.txt') == 1
+        assert find('a', 'old.txt') == 2
+        assert find('b', 'old.txt') is None
+        assert find('a', 'x.txt') == 3
+        assert find('b', 'y.txt') == 3
+        assert find('a', '') == 1  # the first add
+
+
+def test_file_names_are_computed_once(monkeypatch):
+    d = LocalFileDiff('/left', '/left/sub/a.txt', '/right', '/right/sub/a.txt', False)
+    assert (d.a, d.b, d.type) == ('sub/a.txt', 'sub/a.txt', 'change')
+    monkeypatch.setattr(os.path, 'relpath', None)
+    assert (d.a, d.b) == ('sub/a.txt', 'sub/a.txt')
+    assert not hasattr(d, '__dict__')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        d.a_sha = 'a' * 40
+
+
+@pytest.mark.parametrize(
+    'path,root',
+    [
+        ('/left/a.txt', '/left/'),
+        ('/left/./a.txt', '/left'),
+        ('/left/x/../a.txt', '/left'),
+        ('left/a.txt', 'left'),
+        ('a.txt', ''),
+        ('/a.txt', '/'),
+        ('/other/a.txt', '/left'),
+    ],
+)
+def test_relative_file_names(path, root):
+    d = LocalFileDiff(root, path, root, '', False)
+    assert d.a == os.path.relpath(path, root or '.')
+    assert d.type == 'delete'
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from webdiff.localfilediff import LocalFileDiff
+from webdiff.prefetch import Prefetcher
+
+
+def make_diffs(tmp_path, n):
+    diffs = []
+    for i in range(n):
+        path = tmp_path / f'{i}.txt'
+        path.write_text(f'{i}\n')
+        diffs.append(LocalFileDiff(str(tmp_path), str(path), str(tmp_path), '', False))
+    return diffs
+
+
+def test_prefetches_nearest_first(tmp_path):
+    diffs = make_diffs(tmp_path, 10)
+    order = []
+    release = threading.Event()
+
+    def task(d):
+        release.wait()
+        order.append(int(d.a[0]))
+        return d.a
+
+    p = Prefetcher(diffs, {'name': task}, max_workers=1)
+    p.start()
+    # The worker is now blocked on file 0; prioritize the others around 5.
+    time.sleep(0.05)
+    p.focus(5)
+    release.set()
+    for t in p._threads:
+        t.join(timeout=5)
+    assert p.get('name', 9).result() == '9.txt'
+
+    assert order[:6] == [0, 5, 6, 4, 7, 3]
+    assert sorted(order) == list(range(10))
+
+
+def test_get_claims_pending_jobs_and_detects_changes(tmp_path):
+    diffs = make_diffs(tmp_path, 4)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def task(d):
+        calls.append(d.a)
+        started.set()
+        release.wait()
+        return open(d.a_path).read()
+
+    p = Prefetcher(diffs, {'contents': task}, max_workers=1)
+    p.start()
+    started.wait(timeout=5)
+    # Jobs which haven't started are left to the caller.
+    assert p.get('contents', 2) is None
+    future = p.get('contents', 0)
+    release.set()
+    assert future.result(timeout=5) == '0\n'
+    assert p.get('contents', 1).result(timeout=5) == '1\n'
+    # Each result is only handed out once.
+    assert p.get('contents', 1) is None
+    for t in p._threads:
+        t.join(timeout=5)
+    assert calls == ['0.txt', '1.txt', '3.txt']
+
+    # Results for files which have changed are discarded.
+    with open(diffs[3].a_path, 'w') as f:
+        f.write('changed\n')
+    assert p.get('contents', 3) is None
+    p.shutdown()
+
+
+def test_failed_jobs_are_left_to_the_caller(tmp_path):
+    diffs = make_diffs(tmp_path, 1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def task(d):
+        started.set()
+        release.wait()
+        raise ValueError('oops')
+
+    p = Prefetcher(diffs, {'task': task}, max_workers=1)
+    p.start()
+    started.wait(timeout=5)
+    # A caller which is already waiting gets None, rather than the exception.
+    future = p.get('task', 0)
+    release.set()
+    assert future.result(timeout=5) is None
+    # Later callers compute it themselves.
+    assert p.get('task', 0) is None
+    p.shutdown()
+
+
+def test_keeps_the_nearest_results(tmp_path):
+    diffs = make_diffs(tmp_path, 6)
+    p = Prefetcher(diffs, {'name': lambda d: d.a}, max_workers=1, max_results=2)
+    p.focus(2)
+    p.start()
+    for t in p._threads:
+        t.join(timeout=5)
+    assert len(p._finished) == 2
+    assert p.get('name', 2).result() == '2.txt'
+    assert p.get('name', 3).result() == '3.txt'
+    for idx in (0, 1, 4, 5):
+        assert p.get('name', idx) is None
+    assert p._finished == set()
+
+
+def test_shutdown_stops_scheduling(tmp_path):
+    diffs = make_diffs(tmp_path, 5)
+    release = threading.Event()
+    calls = []
+
+    def task(d):
+        calls.append(d.a)
+        release.wait()
+
+    p = Prefetcher(diffs, {'task': task}, max_workers=1)
+    p.start()
+    time.sleep(0.05)
+    p.shutdown()
+    release.set()
+    time.sleep(0.05)
+    assert calls == ['0.txt']
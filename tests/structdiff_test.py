@@ -0,0 +1,174 @@
+import json
+import random
+
+import pytest
+
+from webdiff import diff, linediff, structdiff, util
+from webdiff.localfilediff import LocalFileDiff
+from webdiff.unified_diff import Code
+
+
+def changed_lines(a, b):
+    """The changed lines on each side, as text."""
+    rchg1, rchg2 = structdiff.diff_values(a, b)
+    lines1 = json.dumps(a, indent=2, sort_keys=True).split('\n')
+    lines2 = json.dumps(b, indent=2, sort_keys=True).split('\n')
+    assert len(rchg1) == len(lines1) and len(rchg2) == len(lines2)
+    return (
+        [line.strip() for line, c in zip(lines1, rchg1) if c],
+        [line.strip() for line, c in zip(lines2, rchg2) if c],
+    )
+
+
+def test_diff_values_objects():
+    a = {'a': 1, 'b': {'c': [1, 2], 'd': 'x'}, 'e': True}
+    b = {'a': 1, 'b': {'c': [1, 3], 'd': 'x', 'f': None}, 'e': True}
+    assert changed_lines(a, b) == (['2'], ['3', '"f": null'])
+    assert changed_lines(a, a) == ([], [])
+    assert changed_lines({'a': 1}, {'a': 1.0}) == (['"a": 1'], ['"a": 1.0'])
+    assert changed_lines({'a': []}, {'a': [1]}) == (['"a": []'], ['"a": [', '1', ']'])
+
+
+def test_diff_values_arrays():
+    a = [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'b'}, {'id': 3, 'v': 'c'}]
+    # Changing a value inside an element only changes that line.
+    b = [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'B'}, {'id': 3, 'v': 'c'}]
+    assert changed_lines(a, b) == (['"v": "b"'], ['"v": "B"'])
+    # A moved element is deleted and inserted as a whole, rather than being
+    # diffed against the element which took its place.
+    b = [{'id': 3, 'v': 'c'}, {'id': 1, 'v': 'a'}, {'id': 2, 'v': 'b'}]
+    moved = ['{', '"id": 3,', '"v": "c"', '}']
+    assert changed_lines(a, b) == ([*moved[:-1], '}'], [*moved[:-1], '},'])
+
+
+def random_value(rng, depth=0):
+    r = rng.random()
+    if depth < 4 and r < 0.3:
+        return {rng.choice('abcdef'): random_value(rng, depth + 1) for _ in range(4)}
+    elif depth < 4 and r < 0.6:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return rng.choice([0, 1, 'x', 'y', None, True])
+
+
+def mutate(rng, value):
+    if isinstance(value, dict) and value:
+        value = dict(value)
+        key = rng.choice(list(value))
+        if rng.random() < 0.2:
+            del value[key]
+        else:
+            value[key] = mutate(rng, value[key])
+    elif isinstance(value, list) and value:
+        value = list(value)
+        i = rng.randrange(len(value))
+        r = rng.random()
+        if r < 0.2:
+            value.insert(0, value.pop(i))
+        elif r < 0.4:
+            del value[i]
+        else:
+            value[i] = mutate(rng, value[i])
+    else:
+        value = random_value(rng)
+    return value
+
+
+def test_diff_values_unchanged_lines_match():
+    rng = random.Random(0)
+    for _ in range(300):
+        a = random_value(rng)
+        b = mutate(rng, a)
+        rchg1, rchg2 = structdiff.diff_values(a, b)
+        lines1 = json.dumps(a, indent=2, sort_keys=True).split('\n')
+        lines2 = json.dumps(b, indent=2, sort_keys=True).split('\n')
+        same1 = [line.rstrip(',') for line, c in zip(lines1, rchg1) if not c]
+        same2 = [line.rstrip(',') for line, c in zip(lines2, rchg2) if not c]
+        assert same1 == same2
+
+
+def write_normalized(tmp_path, name, value):
+    path = tmp_path / name
+    path.write_text(json.dumps(value, indent=2, sort_keys=True))
+    return str(path)
+
+
+def test_diff_files(tmp_path):
+    a = {'items': [{'id': i, 'tags': ['x'] * 3} for i in range(10)]}
+    b = json.loads(json.dumps(a))
+    b['items'][5]['tags'][1] = 'y'
+    a_path = write_normalized(tmp_path, 'a.json', a)
+    b_path = write_normalized(tmp_path, 'b.json', b)
+    with open(a_path) as f:
+        lines = f.read().split('\n')
+    n = len(lines)
+    i = lines.index('        "x",', lines.index('      "id": 5,')) + 1
+    with open(b_path) as f:
+        assert f.read().split('\n')[i] == '        "y",'
+
+    settings = linediff.DiffSettings(context=1)
+    assert structdiff.diff_files(a_path, b_path, settings) == [
+        Code('skip', (0, i - 1), (0, i - 1)),
+        Code('equal', (i - 1, i), (i - 1, i)),
+        Code('replace', (i, i + 1), (i, i + 1)),
+        Code('equal', (i + 1, i + 2), (i + 1, i + 2)),
+        Code('skip', (i + 2, n), (i + 2, n)),
+    ]
+    assert structdiff.diff_files(a_path, a_path, settings) == [
+        Code('equal', (0, n), (0, n))
+    ]
+
+    not_normalized = tmp_path / 'c.json'
+    not_normalized.write_text(json.dumps(a))
+    with pytest.raises(ValueError):
+        structdiff.diff_files(a_path, str(not_normalized), settings)
+
+
+def test_get_diff_ops_structural(tmp_path):
+    a = [{'id': i, 'name': f'item {i}'} for i in range(20)]
+    b = [a[5], *a[:5], *a[6:]]
+    b[10] = {**b[10], 'name': 'renamed'}
+    (tmp_path / 'a.json').write_text(json.dumps(a))
+    (tmp_path / 'b.json').write_text(json.dumps(b))
+    (tmp_path / 'c.txt').write_text('b\na\n')
+    root = str(tmp_path)
+    d = LocalFileDiff(root, f'{root}/a.json', root, f'{root}/b.json', False)
+    config = {
+        **diff.options.DEFAULTS,
+        'webdiff': {**diff.options.DEFAULTS['webdiff'], 'jsonDiff': 'structural'},
+    }
+    try:
+        codes = diff.get_diff_ops(d, normalize_json=True, config=config)
+        assert [c.type for c in codes] == [
+            'equal',
+            'insert',
+            'equal',
+            'skip',
+            'equal',
+            'delete',
+            'equal',
+            'skip',
+            'equal',
+            'replace',
+            'equal',
+            'skip',
+        ]
+        # Files which can't be diffed structurally get a line diff.
+        d = LocalFileDiff(root, f'{root}/c.txt', root, f'{root}/b.json', False)
+        assert diff.get_diff_ops(d, normalize_json=True, config=config) == (
+            diff.get_diff_ops(d, normalize_json=True)
+        )
+    finally:
+        structdiff.shutdown()
+        util.remove_temp_files()
+
+
+def test_diff_files_in_worker_errors(tmp_path):
+    a_path = write_normalized(tmp_path, 'a.json', {'x': 1})
+    settings = linediff.DiffSettings()
+    try:
+        # A file that's gone raises an OSError in the worker, not a ValueError.
+        missing = str(tmp_path / 'missing.json')
+        assert structdiff.diff_files_in_worker(a_path, missing, settings) is None
+        assert structdiff.diff_files_in_worker(a_path, a_path, settings) is not None
+    finally:
+        structdiff.shutdown()
@@ -1,10 +1,23 @@
+import io
+import os
+import subprocess
+from itertools import groupby
+
+import pytest
 from unidiff import PatchSet
 
+from webdiff import dirdiff, options
 from webdiff.unified_diff import (
     Code,
+    Hunk,
     RawDiffLine,
     add_replaces,
     diff_to_codes,
+    finish_codes,
+    hunks_to_codes,
+    iter_nul_separated,
+    iter_raw_diff,
+    parse_patch,
     parse_raw_diff,
     read_codes,
 )
@@ -79,7 +92,7 @@ index 63a4828..cea3ddd 100644
 
 
 def test_read_codes_delete():
-    codes = read_codes(PatchSet.from_string(delete_hunk))
+    codes = read_codes(parse_patch(delete_hunk))
     assert codes == [
         Code(type='equal', before=(0, 2), after=(0, 2)),
         Code(type='delete', before=(2, 3), after=(2, 2)),
@@ -100,7 +113,7 @@ index 041d7f0..507435c 100644
 
 
 def test_read_codes_skip():
-    codes = read_codes(PatchSet.from_string(skip_insert_hunk))
+    codes = read_codes(parse_patch(skip_insert_hunk))
     assert codes == [
         Code(type='skip', before=(0, 2), after=(0, 2), header='pytest==7.1.3'),
         Code(type='equal', before=(2, 5), after=(2, 5)),
@@ -124,7 +137,7 @@ index 4be90b9..507435c 100644
 
 
 def test_read_codes_replace():
-    codes = read_codes(PatchSet.from_string(replace_hunk))
+    codes = read_codes(parse_patch(replace_hunk))
     assert codes == [
         Code('equal', before=(0, 2), after=(0, 2)),
         Code('delete', before=(2, 3), after=(2, 2)),
@@ -164,14 +177,30 @@ def test_parse_raw_diff_many():
             num_add=0,
             num_delete=0,
         ),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/b.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/c.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/e.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/f.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/g.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/h.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/i.txt', num_add=0, num_delete=1),
-        RawDiffLine(*mod644, 'M', 'testdata/manyfiles/left/j.txt', num_add=0, num_delete=1),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/b.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/c.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/e.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/f.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/g.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/h.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/i.txt', num_add=0, num_delete=1
+        ),
+        RawDiffLine(
+            *mod644, 'M', 'testdata/manyfiles/left/j.txt', num_add=0, num_delete=1
+        ),
     ]
 
 
@@ -194,6 +223,65 @@ def test_parse_raw_diff_rename():
     ]
 
 
+def test_parse_raw_diff_stream():
+    with open('testdata/unified/manyfiles.txt', 'rb') as f:
+        diff = f.read()
+    expected = parse_raw_diff(diff.decode('utf8'))
+    # Parts are split across chunks.
+    stream = io.BufferedReader(io.BytesIO(diff), buffer_size=7)
+    parts = iter_nul_separated(stream, chunk_size=7)
+    assert list(iter_raw_diff(parts)) == expected
+
+
+def test_parse_raw_diff_copy_and_binary():
+    parts = [
+        ':100644 100644 abc1234 abc1234 C075',
+        'left/ümlaut.txt',
+        'right/copy.txt',
+        ':100644 100644 0000000 0000000 M',
+        'left/img.png',
+        ':000000 100644 0000000 0000000 A',
+        'right/new.txt',
+        '1\t2\t',
+        'left/ümlaut.txt',
+        'right/copy.txt',
+        '-\t-\tleft/img.png',
+        '3\t0\tright/new.txt',
+        '',
+    ]
+    diff = '\0'.join(parts)
+    lines = parse_raw_diff(diff)
+    assert lines == [
+        RawDiffLine(
+            '100644',
+            '100644',
+            'abc1234',
+            'abc1234',
+            'C',
+            'left/ümlaut.txt',
+            score=75,
+            dst_path='right/copy.txt',
+            num_add=1,
+            num_delete=2,
+        ),
+        RawDiffLine('100644', '100644', '0000000', '0000000', 'M', 'left/img.png'),
+        RawDiffLine(
+            '000000',
+            '100644',
+            '0000000',
+            '0000000',
+            'A',
+            'right/new.txt',
+            num_add=3,
+            num_delete=0,
+        ),
+    ]
+    # Multi-byte characters can be split across chunks, too.
+    stream = io.BytesIO(diff.encode('utf8'))
+    assert list(iter_raw_diff(iter_nul_separated(stream, chunk_size=3))) == lines
+    assert parse_raw_diff('') == []
+
+
 binary_diff = """diff --git a/left/smiley.png.gz b/right/smiley.png.gz
 index 0bcfe40..6fbd5fd 100644
 Binary files a/left/smiley.png.gz and b/right/smiley.png.gz differ
@@ -201,4 +289,93 @@ Binary files a/left/smiley.png.gz and b/right/smiley.png.gz differ
 
 
 def test_parse_binary_diff():
-    assert read_codes(PatchSet.from_string(binary_diff)) is None
+    assert read_codes(parse_patch(binary_diff)) is None
+
+
+def unidiff_codes(diff: str, after_num_lines=None):
+    """The previous implementation of diff_to_codes, which used unidiff."""
+    p = PatchSet.from_string(diff)
+    if len(p) == 0:
+        if after_num_lines is None:
+            return None
+        return [Code('equal', (0, after_num_lines), (0, after_num_lines))]
+    pf = p[0]
+    if pf.is_binary_file:
+        return None
+    hunks = []
+    for hunk in pf:
+        runs = [
+            (type, len([*chunk]))
+            for type, chunk in groupby(hunk, lambda line: line.line_type)
+        ]
+        runs = [run for run in runs if run[0] in (' ', '-', '+')]
+        hunks.append(
+            Hunk(hunk.source_start, hunk.target_start, hunk.section_header, runs)
+        )
+    codes = hunks_to_codes(hunks)
+    if not codes:
+        return None
+    return finish_codes(codes, after_num_lines)
+
+
+def git_patches(flags):
+    testdata = os.path.join(os.path.dirname(__file__), '..', 'testdata')
+    for name in sorted(os.listdir(testdata)):
+        left = os.path.join(testdata, name, 'left')
+        right = os.path.join(testdata, name, 'right')
+        if not os.path.isdir(left):
+            continue
+        for d in dirdiff.gitdiff(left, right, options.DEFAULTS['webdiff']):
+            if d.a_path and d.b_path:
+                args = ['git', 'diff', '--no-index', *flags, d.a_path, d.b_path]
+                result = subprocess.run(args, capture_output=True, check=False)
+                yield result.stdout.decode('utf8')
+
+
+@pytest.mark.parametrize('flags', [[], ['-U0'], ['-U8', '-w'], ['--function-context']])
+def test_matches_unidiff_on_testdata(flags):
+    for patch in git_patches(flags):
+        for num_lines in (None, 10_000):
+            assert diff_to_codes(patch, num_lines) == unidiff_codes(patch, num_lines)
+
+
+@pytest.mark.parametrize(
+    'patch',
+    [
+        '',
+        # No newline at the end of either side.
+        (
+            'diff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -1,2 +1,2 @@\n a\n-b\n'
+            '\\ No newline at end of file\n+c\n\\ No newline at end of file\n'
+        ),
+        # Empty context lines (e.g. after trailing whitespace was stripped).
+        'diff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -1,3 +1,3 @@\n\n-b\n+c\n\n',
+        # CRLF line endings.
+        (
+            'diff --git a/x b/x\n--- a/x\n+++ b/x\n'
+            '@@ -1,2 +1,2 @@ fn()\n a\r\n-b\r\n+c\r\n'
+        ),
+        # Hunks with omitted lengths, and a second file which should be ignored.
+        (
+            'diff --git a/x b/x\n--- a/x\n+++ b/x\n'
+            '@@ -3 +3 @@\n-b\n+c\n@@ -9,0 +10 @@\n+d\n'
+            'diff --git a/y b/y\n--- a/y\n+++ b/y\n@@ -1 +1 @@\n-y\n+z\n'
+        ),
+        # Without a diff --git header.
+        (
+            '--- a/x\n+++ b/x\n@@ -1,2 +1,3 @@\n a\n+b\n c\n'
+            '--- a/y\n+++ b/y\n@@ -1 +1 @@\n-y\n+z\n'
+        ),
+        # Lines which look like headers inside a hunk.
+        (
+            'diff --git a/x b/x\n--- a/x\n+++ b/x\n'
+            '@@ -1,2 +1,2 @@\n--- a\n+++ b\n @@ -1 +1 @@\n'
+        ),
+        # Binary files and mode changes have no codes.
+        'diff --git a/x b/x\nindex 1..2 100644\nBinary files a/x and b/x differ\n',
+        'diff --git a/x b/x\nold mode 100644\nnew mode 100755\n',
+    ],
+)
+def test_matches_unidiff_edge_cases(patch):
+    for num_lines in (None, 20):
+        assert diff_to_codes(patch, num_lines) == unidiff_codes(patch, num_lines)
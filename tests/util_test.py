@@ -1,6 +1,11 @@
+import hashlib
 import os
+import time
 
-from webdiff.util import image_metadata
+import pytest
+
+from webdiff import util
+from webdiff.util import are_files_identical, image_metadata
 
 TESTDATA = os.path.join(os.path.dirname(__file__), '..', 'testdata')
 
@@ -19,3 +24,74 @@ def test_image_metadata_svg():
     assert md['num_bytes'] == 1689203
     assert md['width'] == 2029.0425
     assert md['height'] == 2296.0974
+
+
+def test_are_files_identical(tmp_path, monkeypatch):
+    a = tmp_path / 'a.bin'
+    b = tmp_path / 'b.bin'
+    a.write_bytes(b'hello')
+    b.write_bytes(b'hello')
+    assert are_files_identical(str(a), str(b))
+    assert are_files_identical(str(a), str(a))
+    b.write_bytes(b'jello')
+    assert not are_files_identical(str(a), str(b))
+    b.write_bytes(b'hello!')
+    assert not are_files_identical(str(a), str(b))
+
+    # Large files which differ only in the middle need a full comparison.
+    data = bytes(range(256)) * 4096
+    middle = len(data) // 2
+    a.write_bytes(data)
+    b.write_bytes(data[:middle] + b'!' + data[middle + 1 :])
+    assert not are_files_identical(str(a), str(b))
+    b.write_bytes(data)
+    assert are_files_identical(str(a), str(b))
+
+    # Files which differ in their first or last blocks are never hashed.
+    def fail(path):
+        raise AssertionError('should not hash')
+
+    monkeypatch.setattr(util, 'contentHash', fail)
+    b.write_bytes(data[:-1] + b'!')
+    assert not are_files_identical(str(a), str(b))
+    b.write_bytes(b'!' + data[1:])
+    assert not are_files_identical(str(a), str(b))
+
+
+def test_content_hash(tmp_path):
+    a = tmp_path / 'a.txt'
+    a.write_bytes(b'hello')
+    h = util.contentHash(str(a))
+    assert h == hashlib.blake2b(b'hello').digest()
+    a.write_bytes(b'goodbye')
+    assert util.contentHash(str(a)) != h
+
+
+def test_imagemagick_timeout(monkeypatch):
+    monkeypatch.setattr(util, '_magick_timeout_secs', 0.1)
+    start = time.perf_counter()
+    with pytest.raises(util.ImageMagickError, match='timed out'):
+        util._run_imagemagick(['sleep', '5'])
+    assert time.perf_counter() - start < 2
+
+
+def test_normalize_json(tmp_path):
+    a = tmp_path / 'a.json'
+    a.write_text('{"b": 1, "a": 2}')
+    b = tmp_path / 'b.json'
+    b.write_text('{"b": 1, "a": 2}')
+    bad = tmp_path / 'bad.json'
+    bad.write_text('{"b": 1,')
+
+    norm_a = util.normalize_json(str(a))
+    with open(norm_a) as f:
+        assert f.read() == '{\n  "a": 2,\n  "b": 1\n}'
+    # Files with the same contents share a normalized copy.
+    assert util.normalize_json(str(b)) == norm_a
+    assert util.normalize_json(str(bad)) == str(bad)
+
+    util.remove_temp_files()
+    assert not os.path.exists(norm_a)
+    norm_a = util.normalize_json(str(a))
+    assert os.path.exists(norm_a)
+    util.remove_temp_files()
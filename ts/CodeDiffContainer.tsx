@@ -4,6 +4,7 @@ import {CodeDiff, PatchOptions} from './codediff/codediff';
 import {guessLanguageUsingContents, guessLanguageUsingFileName} from './codediff/language';
 import {GitConfig} from './options';
 import {DiffRange} from './codediff/codes';
+import {LineCharacterDiffs} from './codediff/char-diffs';
 
 interface BaseFilePair {
   idx: number;
@@ -50,6 +51,16 @@ export interface DiffBox {
 
 export interface ImageDiffData {
   diffBounds: DiffBox;
+  numDiffPixels: number;
+  numPixels: number;
+}
+
+/** Response from /pdiffinfo */
+export interface PerceptualDiffInfo {
+  are_same_pixels: boolean;
+  num_diff_pixels: number;
+  num_pixels: number;
+  bbox: DiffBox;
 }
 
 // A "no changes" sign which only appears when applicable.
@@ -68,18 +79,30 @@ export function NoChanges(props: {filePair: FilePair; isEqualAfterNormalization:
   return msg ? <div className="no-changes">{msg}</div> : null;
 }
 
+/** Stands in for the contents of a file which is too large to load in full. */
+const TOO_LARGE = {tooLarge: true} as const;
+
 // Either side can be empty (i.e. an add or a delete), in which case getOrNull resolves to null.
-async function getOrNull(side: string, path: string, normalizeJSON: boolean) {
+async function getOrNull(
+  side: string,
+  path: string,
+  normalizeJSON: boolean,
+): Promise<string | null | typeof TOO_LARGE> {
   if (!path) return null;
   const data = new URLSearchParams();
   data.set('path', path);
   if (normalizeJSON) {
     data.set('normalize_json', '1');
   }
-  const response = await fetch(`/${side}/get_contents`, {
-    method: 'post',
-    body: data,
-  });
+  const maxBytes = GIT_CONFIG.webdiff.maxContentsSize * 1024 * 1024;
+  if (maxBytes > 0) {
+    data.set('max_bytes', String(maxBytes));
+  }
+  // This is a GET so that the browser can cache it (the server sends an ETag).
+  const response = await fetch(`/${side}/get_contents?${data.toString()}`);
+  if (response.status === 413) {
+    return TOO_LARGE; // CodeDiff will fetch the lines it shows (see useWindowedLines).
+  }
   return response.text();
 }
 
@@ -93,14 +116,21 @@ export interface CodeDiffContainerProps {
 export function CodeDiffContainer(props: CodeDiffContainerProps) {
   const {filePair, diffOptions, normalizeJSON} = props;
   const [contents, setContents] = React.useState<
-    {before: string | null; after: string | null; diffOps: DiffRange[]} | undefined
+    | {
+        before: string | null;
+        after: string | null;
+        diffOps: DiffRange[];
+        charDiffs?: LineCharacterDiffs[];
+        windowed: {a: boolean; b: boolean};
+      }
+    | undefined
   >();
 
   React.useEffect(() => {
     // It would be more correct to set contents=undefined here to get a loading state,
     // but this produces an unnecessary flash for rapid transitions.
-    const getDiff = async () => {
-      const response = await fetch(`/diff/${filePair.idx}`, {
+    const postDiff = async <T,>(endpoint: string) => {
+      const response = await fetch(`/${endpoint}/${filePair.idx}`, {
         method: 'POST',
         headers: {
           Accept: 'application/json',
@@ -111,19 +141,31 @@ export function CodeDiffContainer(props: CodeDiffContainerProps) {
           normalize_json: normalizeJSON,
         }),
       });
-      return response.json() as Promise<DiffRange[]>;
+      return response.json() as Promise<T>;
     };
+    const getCharDiffs = async () =>
+      GIT_CONFIG.webdiff.charDiffEngine === 'server' && filePair.a && filePair.b
+        ? postDiff<LineCharacterDiffs[]>('chardiffs')
+        : undefined;
 
     const {a, b} = filePair;
     // Do XHRs for the contents of both sides in parallel and fill in the diff.
     // TODO: split these into three useEffects to avoid over-fetching when diff options change.
     (async () => {
-      const [before, after, diffOps] = await Promise.all([
+      const [before, after, diffOps, charDiffs] = await Promise.all([
         getOrNull('a', a, normalizeJSON),
         getOrNull('b', b, normalizeJSON),
-        getDiff(),
+        postDiff<DiffRange[]>('diff'),
+        getCharDiffs(),
       ]);
-      setContents({before, after, diffOps});
+      const windowed = {a: before === TOO_LARGE, b: after === TOO_LARGE};
+      setContents({
+        before: before === TOO_LARGE ? null : before,
+        after: after === TOO_LARGE ? null : after,
+        diffOps,
+        charDiffs,
+        windowed,
+      });
     })().catch((e: unknown) => {
       alert('Unable to get diff!');
       console.error(e);
@@ -131,7 +173,14 @@ export function CodeDiffContainer(props: CodeDiffContainerProps) {
   }, [filePair, diffOptions, normalizeJSON]);
 
   const isEqualAfterNormalization = React.useMemo(() => {
-    return !filePair.no_changes && normalizeJSON && contents && contents.before == contents.after;
+    return (
+      !filePair.no_changes &&
+      normalizeJSON &&
+      contents &&
+      !contents.windowed.a &&
+      !contents.windowed.b &&
+      contents.before == contents.after
+    );
   }, [contents, filePair.no_changes, normalizeJSON]);
 
   return (
@@ -143,6 +192,9 @@ export function CodeDiffContainer(props: CodeDiffContainerProps) {
             contentsBefore={contents.before}
             contentsAfter={contents.after}
             diffOps={contents.diffOps}
+            charDiffs={contents.charDiffs}
+            windowed={contents.windowed}
+            normalizeJSON={normalizeJSON}
             isEqualAfterNormalization={!!isEqualAfterNormalization}
           />
         ) : (
@@ -158,6 +210,9 @@ interface FileDiffProps {
   contentsBefore: string | null;
   contentsAfter: string | null;
   diffOps: DiffRange[];
+  charDiffs?: LineCharacterDiffs[];
+  windowed: {a: boolean; b: boolean};
+  normalizeJSON: boolean;
   isEqualAfterNormalization: boolean;
 }
 
@@ -173,7 +228,16 @@ function lengthOrZero(data: unknown[] | string | null | undefined) {
 }
 
 function FileDiff(props: FileDiffProps) {
-  const {filePair, contentsBefore, contentsAfter, diffOps, isEqualAfterNormalization} = props;
+  const {
+    filePair,
+    contentsBefore,
+    contentsAfter,
+    diffOps,
+    charDiffs,
+    windowed,
+    normalizeJSON,
+    isEqualAfterNormalization,
+  } = props;
   const pathBefore = filePair.a;
   const pathAfter = filePair.b;
   // build the diff view and add it to the current DOM
@@ -216,6 +280,9 @@ function FileDiff(props: FileDiffProps) {
         afterText={contentsAfter}
         filePair={filePair}
         ops={diffOps}
+        charDiffs={charDiffs}
+        windowed={windowed}
+        normalizeJSON={normalizeJSON}
         params={opts}
       />
     </div>
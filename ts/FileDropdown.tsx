@@ -4,25 +4,31 @@ import {filePairDisplayName} from './utils';
 
 export interface Props {
   filePairs: FilePair[];
+  numPairs: number;
   selectedIndex: number;
   fileChangeHandler: (newIndex: number) => void;
+  loadMoreHandler: () => void;
 }
 
+const LOAD_MORE = -1;
+
 /** A list of files in a dropdown menu. This is more compact with many files. */
 export function FileDropdown(props: Props) {
-  const {filePairs, selectedIndex, fileChangeHandler} = props;
+  const {filePairs, numPairs, selectedIndex, fileChangeHandler, loadMoreHandler} = props;
+  const byIdx = React.useMemo(() => new Map(filePairs.map(fp => [fp.idx, fp])), [filePairs]);
 
   const linkOrNone = (idx: number) => {
-    if (idx < 0 || idx >= filePairs.length) {
+    if (idx < 0 || idx >= numPairs) {
       return <i>none</i>;
     } else {
+      const filePair = byIdx.get(idx);
       return (
         <a
           href="#"
           onClick={() => {
             fileChangeHandler(idx);
           }}>
-          {filePairDisplayName(filePairs[idx])}
+          {filePair ? filePairDisplayName(filePair) : `file ${idx + 1}`}
         </a>
       );
     }
@@ -31,11 +37,19 @@ export function FileDropdown(props: Props) {
   const prevLink = linkOrNone(props.selectedIndex - 1);
   const nextLink = linkOrNone(props.selectedIndex + 1);
 
-  const options = filePairs.map((filePair, idx) => (
-    <option key={idx} value={idx}>
+  const options = filePairs.map(filePair => (
+    <option key={filePair.idx} value={filePair.idx}>
       {filePairDisplayName(filePair)} ({filePair.type})
     </option>
   ));
+  const numUnloaded = numPairs - filePairs.length;
+  if (numUnloaded > 0) {
+    options.push(
+      <option key={LOAD_MORE} value={LOAD_MORE}>
+        ({numUnloaded} more files…)
+      </option>,
+    );
+  }
 
   return (
     <div className="file-dropdown">
@@ -44,7 +58,12 @@ export function FileDropdown(props: Props) {
       <select
         value={selectedIndex}
         onChange={e => {
-          fileChangeHandler(Number(e.target.value));
+          const idx = Number(e.target.value);
+          if (idx === LOAD_MORE) {
+            loadMoreHandler();
+          } else {
+            fileChangeHandler(idx);
+          }
         }}>
         {options}
       </select>
@@ -4,8 +4,10 @@ import {filePairDisplayName} from './utils';
 
 export interface Props {
   filePairs: FilePair[];
+  numPairs: number;
   selectedIndex: number;
   fileChangeHandler: (newIndex: number) => void;
+  loadMoreHandler: () => void;
 }
 
 /**
@@ -13,14 +15,15 @@ export interface Props {
  * This view is simpler and generally preferable for short lists of files.
  */
 export function FileList(props: Props) {
-  const {filePairs, selectedIndex, fileChangeHandler} = props;
+  const {filePairs, numPairs, selectedIndex, fileChangeHandler, loadMoreHandler} = props;
 
   const anyWithDiffstats = filePairs.some(fp => fp.num_add !== null || fp.num_delete !== null);
   const maxDelta = React.useMemo(() => {
     return Math.max(1, ...filePairs.map(fp => (fp.num_add ?? 0) + (fp.num_delete ?? 0)));
   }, [filePairs]);
 
-  const lis = filePairs.map((filePair, idx) => {
+  const lis = filePairs.map(filePair => {
+    const {idx} = filePair;
     const displayName = filePairDisplayName(filePair);
     const content =
       idx !== selectedIndex ? (
@@ -48,7 +51,23 @@ export function FileList(props: Props) {
       </li>
     );
   });
-  return <ul className="file-list">{lis}</ul>;
+  const numUnloaded = numPairs - filePairs.length;
+  return (
+    <ul className="file-list">
+      {lis}
+      {numUnloaded > 0 ? (
+        <li>
+          <a
+            onClick={() => {
+              loadMoreHandler();
+            }}
+            href="#">
+            {numUnloaded} more files…
+          </a>
+        </li>
+      ) : null}
+    </ul>
+  );
 }
 
 interface SparkChartProps {
@@ -5,9 +5,13 @@ import {FileList} from './FileList';
 import {FileModeSelector} from './FileModeSelector';
 
 export interface Props {
+  /** The file pairs which have been loaded, sorted by idx. */
   filePairs: FilePair[];
+  /** Total number of file pairs, including ones which haven't been loaded. */
+  numPairs: number;
   selectedFileIndex: number;
   fileChangeHandler: (newIndex: number) => void;
+  loadMoreHandler: () => void;
   mode: FileSelectorMode;
   onChangeMode: (mode: FileSelectorMode) => void;
 }
@@ -16,10 +20,11 @@ export type FileSelectorMode = 'list' | 'dropdown';
 
 /** Shows a list of files in one of two possible modes (list or dropdown). */
 export function FileSelector(props: Props) {
-  const {filePairs, selectedFileIndex, fileChangeHandler, mode, onChangeMode} = props;
+  const {filePairs, numPairs, selectedFileIndex, fileChangeHandler, loadMoreHandler} = props;
+  const {mode, onChangeMode} = props;
 
   // For single file diffs, a file selector is a waste of space.
-  if (filePairs.length === 1) {
+  if (numPairs === 1) {
     return null;
   }
 
@@ -28,16 +33,20 @@ export function FileSelector(props: Props) {
     selector = (
       <FileList
         filePairs={filePairs}
+        numPairs={numPairs}
         selectedIndex={selectedFileIndex}
         fileChangeHandler={fileChangeHandler}
+        loadMoreHandler={loadMoreHandler}
       />
     );
   } else {
     selector = (
       <FileDropdown
         filePairs={filePairs}
+        numPairs={numPairs}
         selectedIndex={selectedFileIndex}
         fileChangeHandler={fileChangeHandler}
+        loadMoreHandler={loadMoreHandler}
       />
     );
   }
@@ -45,7 +54,7 @@ export function FileSelector(props: Props) {
   return (
     <div className="file-selector">
       {selector}
-      {filePairs.length > 3 ? <FileModeSelector mode={mode} changeHandler={onChangeMode} /> : null}
+      {numPairs > 3 ? <FileModeSelector mode={mode} changeHandler={onChangeMode} /> : null}
     </div>
   );
 }
@@ -1,6 +1,6 @@
 import React from 'react';
 
-import {DiffBox, ImageFilePair} from './CodeDiffContainer';
+import {ImageDiffData, ImageFilePair, PerceptualDiffInfo} from './CodeDiffContainer';
 import {PerceptualDiffMode} from './DiffView';
 import {ImageDiffMode, ImageDiffModeSelector} from './ImageDiffModeSelector';
 import {NoChanges} from './CodeDiffContainer';
@@ -28,6 +28,14 @@ export interface ImageDiffProps {
 
 const PDIFF_MODES: PerceptualDiffMode[] = ['off', 'bbox', 'pixels'];
 
+/** e.g. "1,234 pixels differ (0.5%)" */
+function changedPixelsText({numDiffPixels, numPixels}: ImageDiffData): string {
+  const pct = numPixels ? (100 * numDiffPixels) / numPixels : 0;
+  const pctText = pct > 0 && pct < 0.1 ? '<0.1' : pct.toFixed(1);
+  const noun = numDiffPixels === 1 ? 'pixel differs' : 'pixels differ';
+  return `${numDiffPixels.toLocaleString()} ${noun} (${pctText}%)`;
+}
+
 /** A diff between two images. */
 export function ImageDiff(props: Props) {
   const [shrinkToFit, setShrinkToFit] = React.useState(true);
@@ -48,13 +56,14 @@ export function ImageDiff(props: Props) {
     if (!isSameSizeImagePair(fp)) return;
     // TODO(danvk): restructure this, it's a mess
     (async () => {
-      const response = await fetch(`/pdiffbbox/${fp.idx}`);
-      const bbox = (await response.json()) as DiffBox;
+      const response = await fetch(`/pdiffinfo/${fp.idx}`);
+      const info = (await response.json()) as PerceptualDiffInfo;
       const {diffData} = fp;
-      // XXX are there other fields?
       fp.diffData = {
         ...diffData,
-        diffBounds: bbox,
+        diffBounds: info.bbox,
+        numDiffPixels: info.num_diff_pixels,
+        numPixels: info.num_pixels,
       };
       console.log('forcing update');
       forceUpdate(n => n + 1); // tell react about this change
@@ -167,6 +176,9 @@ export function ImageDiff(props: Props) {
               }}
             />
             <label htmlFor="pdiff-pixels"> Differing Pixels</label>
+            {pair.diffData && pdiffMode !== 'off' ? (
+              <span className="pdiff-stats">&nbsp;{changedPixelsText(pair.diffData)}</span>
+            ) : null}
           </span>
           {imageMagickCallout}
         </span>
@@ -10,8 +10,10 @@ import {DiffOptionsControl} from './DiffOptions';
 import {KeyboardShortcuts} from './codediff/KeyboardShortcuts';
 import {Options, encodeOptions, GitConfig, parseOptions, UpdateOptionsFn} from './options';
 import {NormalizeJSONOption} from './codediff/NormalizeJSONOption';
+import {usePairs} from './pairs';
 
 declare const pairs: FilePair[];
+declare const numPairs: number;
 declare const initialIdx: number;
 declare const GIT_CONFIG: GitConfig;
 
@@ -21,10 +23,16 @@ export function Root() {
   const [imageDiffMode, setImageDiffMode] = React.useState<ImageDiffMode>('side-by-side');
   const [showKeyboardHelp, setShowKeyboardHelp] = React.useState(false);
   const [showOptions, setShowOptions] = React.useState(false);
+  const {
+    pairs: pairsByIdx,
+    loadedPairs,
+    loadPage,
+    loadMore,
+  } = usePairs(pairs, numPairs, GIT_CONFIG.webdiff.filesPerPage);
 
   // An explicit list is better, unless there are a ton of files.
   const [fileSelectorMode, setFileSelectorMode] = React.useState<FileSelectorMode>(
-    pairs.length <= 6 ? 'list' : 'dropdown',
+    numPairs <= 6 ? 'list' : 'dropdown',
   );
 
   const [searchParams, setSearchParams] = useSearchParams();
@@ -40,12 +48,16 @@ export function Root() {
 
   const params = useParams();
   const idx = Number(params.index ?? initialIdx);
-  const filePair = pairs[idx];
+  const filePair = pairsByIdx.get(idx);
   React.useEffect(() => {
+    if (!filePair) {
+      loadPage(idx);
+      return;
+    }
     const fileName = filePairDisplayName(filePair);
     const diffType = filePair.type;
     document.title = `Diff: ${fileName} (${diffType})`;
-  }, [filePair]);
+  }, [filePair, idx, loadPage]);
 
   const options = React.useMemo(() => parseOptions(searchParams), [searchParams]);
   // TODO: merge defaults into options
@@ -75,7 +87,7 @@ export function Root() {
           selectIndex(idx - 1);
         }
       } else if (e.code == 'KeyJ') {
-        if (idx < pairs.length - 1) {
+        if (idx < numPairs - 1) {
           selectIndex(idx + 1);
         }
       } else if (e.code == 'KeyV') {
@@ -114,18 +126,22 @@ export function Root() {
         />
         <FileSelector
           selectedFileIndex={idx}
-          filePairs={pairs}
+          filePairs={loadedPairs}
+          numPairs={numPairs}
           fileChangeHandler={selectIndex}
+          loadMoreHandler={loadMore}
           mode={fileSelectorMode}
           onChangeMode={setFileSelectorMode}
         />
-        <NormalizeJSONOption
-          normalizeJSON={normalizeJSON}
-          setNormalizeJSON={v => {
-            updateOptions({normalizeJSON: v});
-          }}
-          filePair={filePair}
-        />
+        {filePair ? (
+          <NormalizeJSONOption
+            normalizeJSON={normalizeJSON}
+            setNormalizeJSON={v => {
+              updateOptions({normalizeJSON: v});
+            }}
+            filePair={filePair}
+          />
+        ) : null}
         {showKeyboardHelp ? (
           <KeyboardShortcuts
             onClose={() => {
@@ -133,17 +149,21 @@ export function Root() {
             }}
           />
         ) : null}
-        <DiffView
-          key={`diff-${idx}`}
-          thinFilePair={filePair}
-          imageDiffMode={imageDiffMode}
-          pdiffMode={pdiffMode}
-          diffOptions={options}
-          changeImageDiffMode={setImageDiffMode}
-          changePDiffMode={setPDiffMode}
-          changeDiffOptions={setDiffOptions}
-          normalizeJSON={normalizeJSON}
-        />
+        {filePair ? (
+          <DiffView
+            key={`diff-${idx}`}
+            thinFilePair={filePair}
+            imageDiffMode={imageDiffMode}
+            pdiffMode={pdiffMode}
+            diffOptions={options}
+            changeImageDiffMode={setImageDiffMode}
+            changePDiffMode={setPDiffMode}
+            changeDiffOptions={setDiffOptions}
+            normalizeJSON={normalizeJSON}
+          />
+        ) : (
+          <div>Loading…</div>
+        )}
       </div>
     </>
   );
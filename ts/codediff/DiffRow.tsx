@@ -1,5 +1,5 @@
 import React from 'react';
-import {addCharacterDiffs} from './char-diffs';
+import {CharacterDiff, addCharacterDiffs, applyCharacterDiffs} from './char-diffs';
 import {DiffRange} from './codes';
 import {scrollIntoViewIfNeeded} from './dom-utils';
 
@@ -13,9 +13,14 @@ interface DiffRowProps {
   afterText: string | undefined;
   afterHTML?: string;
   isSelected: boolean;
+  /**
+   * Character diffs computed by the server. If this is undefined, they're computed
+   * here; null means that this row has none.
+   */
+  charDiffs?: [CharacterDiff[], CharacterDiff[]] | null;
 }
 
-function escapeHtml(unsafe: string) {
+export function escapeHtml(unsafe: string) {
   return unsafe
     .replaceAll('&', '&amp;')
     .replaceAll('<', '&lt;')
@@ -42,7 +47,15 @@ export function DiffRow(props: DiffRowProps) {
     makeCodeTd(type, props.afterText, props.afterHTML),
   ];
   let [beforeHtml, afterHtml] = [cells[0].html, cells[1].html];
-  if (type === 'replace') {
+  if (type === 'replace' && props.charDiffs !== undefined) {
+    [beforeHtml, afterHtml] = applyCharacterDiffs(
+      props.charDiffs,
+      cells[0].text,
+      cells[0].html,
+      cells[1].text,
+      cells[1].html,
+    );
+  } else if (type === 'replace') {
     [beforeHtml, afterHtml] = addCharacterDiffs(
       cells[0].text,
       cells[0].html,
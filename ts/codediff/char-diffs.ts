@@ -87,6 +87,28 @@ export function addCharacterDiffs(
   afterHtml: string,
 ): [string, string] {
   const codes = computeCharacterDiffs(beforeText, afterText);
+  return applyCharacterDiffs(codes, beforeText, beforeHtml, afterText, afterHtml);
+}
+
+/**
+ * Character diffs for one row of a replace, as computed by the server
+ * (see webdiff/chardiff.py): [before line, after line, before codes, after codes].
+ */
+export type LineCharacterDiffs = [
+  beforeLine: number | null,
+  afterLine: number | null,
+  beforeCodes: CharacterDiff[],
+  afterCodes: CharacterDiff[],
+];
+
+/** Wrap the HTML for a pair of lines in spans for precomputed character diffs. */
+export function applyCharacterDiffs(
+  codes: [CharacterDiff[], CharacterDiff[]] | null,
+  beforeText: string,
+  beforeHtml: string,
+  afterText: string,
+  afterHtml: string,
+): [string, string] {
   if (codes == null) {
     return [beforeHtml, afterHtml];
   }
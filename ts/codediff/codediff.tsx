@@ -5,6 +5,9 @@ import {closest, copyOnlyMatching, distributeSpans} from './dom-utils';
 import {stringAsLines} from './string-utils';
 import {isLegitKeypress} from '../file_diff';
 import {DiffRow} from './DiffRow';
+import {CharacterDiff, LineCharacterDiffs} from './char-diffs';
+import {useServerHighlighting} from './server-highlight';
+import {useWindowedLines} from './windowed-lines';
 import {SkipRange, SkipRow} from './SkipRow';
 import {FilePair} from '../CodeDiffContainer';
 import {GitConfig} from '../options';
@@ -63,12 +66,24 @@ export interface Props {
   afterText: string | null;
   ops: DiffRange[];
   params: Partial<PatchOptions>;
+  /** Character diffs from the server, if webdiff.charDiffEngine=server. */
+  charDiffs?: LineCharacterDiffs[];
+  /**
+   * Sides which are too large to load in full. Their text is null; the lines
+   * shown in the diff are fetched as they're needed.
+   */
+  windowed?: {a: boolean; b: boolean};
+  normalizeJSON?: boolean;
 }
 
 declare const GIT_CONFIG: GitConfig;
 
+function rowKey(beforeIdx: number | null, afterIdx: number | null) {
+  return `${beforeIdx}-${afterIdx}`;
+}
+
 export function CodeDiff(props: Props) {
-  const {beforeText, afterText, ops, params} = props;
+  const {beforeText, afterText, ops, params, charDiffs, windowed, normalizeJSON} = props;
 
   const beforeLines = React.useMemo(
     () => (beforeText ? stringAsLines(beforeText) : []),
@@ -81,7 +96,17 @@ export function CodeDiff(props: Props) {
     [ops, fullParams],
   );
   const {language} = fullParams;
-  const numLines = Math.max(beforeLines.length, afterLines.length);
+  const lastOp = ops[ops.length - 1] as DiffRange | undefined;
+  const numLines = Math.max(
+    beforeLines.length,
+    afterLines.length,
+    lastOp?.before[1] ?? 0,
+    lastOp?.after[1] ?? 0,
+  );
+
+  // Files which are too large to highlight here can be highlighted by the server.
+  const highlightOnServer =
+    GIT_CONFIG.webdiff.highlightLargeFiles && numLines > GIT_CONFIG.webdiff.maxLinesForSyntax;
 
   const [beforeLinesHighlighted, afterLinesHighlighted] = React.useMemo(() => {
     if (!language || numLines > GIT_CONFIG.webdiff.maxLinesForSyntax) return [null, null];
@@ -110,6 +135,10 @@ export function CodeDiff(props: Props) {
       filePair={props.filePair}
       params={fullParams}
       ops={diffRanges}
+      charDiffs={charDiffs}
+      highlightOnServer={highlightOnServer}
+      windowed={windowed}
+      normalizeJSON={!!normalizeJSON}
     />
   ) : (
     <div className="diff">
@@ -174,6 +203,10 @@ interface CodeDiffViewProps {
   filePair: FilePair;
   params: PatchOptions;
   ops: readonly DiffRange[];
+  charDiffs?: LineCharacterDiffs[];
+  highlightOnServer: boolean;
+  windowed?: {a: boolean; b: boolean};
+  normalizeJSON: boolean;
 }
 
 const CodeDiffView = React.memo((props: CodeDiffViewProps) => {
@@ -181,12 +214,23 @@ const CodeDiffView = React.memo((props: CodeDiffViewProps) => {
     filePair,
     params,
     ops: initOps,
-    afterLines,
     afterLinesHighlighted,
-    beforeLines,
     beforeLinesHighlighted,
+    charDiffs,
+    highlightOnServer,
+    windowed,
+    normalizeJSON,
   } = props;
   const {expandLines} = params;
+  const charDiffsByRow = React.useMemo(() => {
+    if (!charDiffs) return null;
+    return new Map(
+      charDiffs.map(([beforeIdx, afterIdx, beforeCodes, afterCodes]) => [
+        rowKey(beforeIdx, afterIdx),
+        [beforeCodes, afterCodes] as [CharacterDiff[], CharacterDiff[]],
+      ]),
+    );
+  }, [charDiffs]);
   // Clicking a "show more lines" link can change the diffops
   const [ops, setOps] = React.useState(initOps);
   React.useEffect(() => {
@@ -231,6 +275,39 @@ const CodeDiffView = React.memo((props: CodeDiffViewProps) => {
     );
   };
 
+  const lastOp = ops[ops.length - 1] as DiffRange | undefined;
+  const beforeWindow = useWindowedLines(
+    windowed?.a ? {side: 'a', path: filePair.a, normalizeJSON} : null,
+    filePair.idx,
+    lastOp?.before[1] ?? 0,
+    ops,
+  );
+  const afterWindow = useWindowedLines(
+    windowed?.b ? {side: 'b', path: filePair.b, normalizeJSON} : null,
+    filePair.idx,
+    lastOp?.after[1] ?? 0,
+    ops,
+  );
+  const beforeLines = beforeWindow ?? props.beforeLines;
+  const afterLines = afterWindow ?? props.afterLines;
+
+  const beforeServerHtml = useServerHighlighting(
+    highlightOnServer && !!filePair.a,
+    filePair.idx,
+    'a',
+    beforeLines,
+    ops,
+    normalizeJSON,
+  );
+  const afterServerHtml = useServerHighlighting(
+    highlightOnServer && !!filePair.b,
+    filePair.idx,
+    'b',
+    afterLines,
+    ops,
+    normalizeJSON,
+  );
+
   React.useEffect(() => {
     const handleKeydown = (e: KeyboardEvent) => {
       if (!isLegitKeypress(e)) return;
@@ -275,15 +352,22 @@ const CodeDiffView = React.memo((props: CodeDiffViewProps) => {
         const afterIdx = j < numAfterRows ? afterStartLine + j : null;
         const beforeText = beforeIdx !== null ? beforeLines[beforeIdx] : undefined;
         const beforeHTML =
-          beforeIdx !== null && beforeLinesHighlighted
-            ? beforeLinesHighlighted[beforeIdx]
-            : undefined;
+          beforeIdx === null
+            ? undefined
+            : beforeLinesHighlighted
+              ? beforeLinesHighlighted[beforeIdx]
+              : beforeServerHtml(beforeIdx);
         const afterText = afterIdx !== null ? afterLines[afterIdx] : undefined;
         const afterHTML =
-          afterIdx !== null && afterLinesHighlighted ? afterLinesHighlighted[afterIdx] : undefined;
+          afterIdx === null
+            ? undefined
+            : afterLinesHighlighted
+              ? afterLinesHighlighted[afterIdx]
+              : afterServerHtml(afterIdx);
+        const key = rowKey(beforeIdx, afterIdx);
         diffRows.push(
           <DiffRow
-            key={`${beforeIdx}-${afterIdx}`}
+            key={key}
             type={type}
             beforeLineNum={beforeIdx != null ? 1 + beforeIdx : null}
             afterLineNum={afterIdx != null ? 1 + afterIdx : null}
@@ -292,6 +376,7 @@ const CodeDiffView = React.memo((props: CodeDiffViewProps) => {
             afterText={afterText}
             afterHTML={afterHTML}
             isSelected={j === 0 && isSelected}
+            charDiffs={charDiffsByRow ? (charDiffsByRow.get(key) ?? null) : undefined}
           />,
         );
       }
@@ -0,0 +1,95 @@
+import React from 'react';
+import {DiffRange} from './codes';
+import {escapeHtml} from './DiffRow';
+
+/** Highlighting is fetched from the server this many lines at a time. */
+const CHUNK_SIZE = 1000;
+
+/** A highlighted run of text on a line: offsets and highlight.js class. */
+type Run = [start: number, limit: number, className: string];
+
+/** Response from /highlight/{side}/{idx} */
+interface HighlightResponse {
+  language: string | null;
+  start: number;
+  lines: Run[][];
+}
+
+export function runsToHtml(text: string, runs: readonly Run[]): string {
+  let html = '';
+  let pos = 0;
+  for (const [start, limit, className] of runs) {
+    html += escapeHtml(text.slice(pos, start));
+    html += `<span class="${className}">${escapeHtml(text.slice(start, limit))}</span>`;
+    pos = limit;
+  }
+  return html + escapeHtml(text.slice(pos));
+}
+
+/** The chunks of lines on one side which are visible (i.e. not skipped) in the diff. */
+function visibleChunks(ops: readonly DiffRange[], side: 'a' | 'b'): number[] {
+  const chunks = new Set<number>();
+  for (const op of ops) {
+    if (op.type === 'skip') continue;
+    const [start, limit] = side === 'a' ? op.before : op.after;
+    for (let i = Math.floor(start / CHUNK_SIZE); i * CHUNK_SIZE < limit; i++) {
+      chunks.add(i * CHUNK_SIZE);
+    }
+  }
+  return [...chunks];
+}
+
+/**
+ * Syntax highlighting from the server, for files which are too large to
+ * highlight in the browser. Only the lines which are visible in the diff are
+ * fetched. Returns a function which gives the HTML for a line, if it's loaded.
+ */
+export function useServerHighlighting(
+  enabled: boolean,
+  idx: number,
+  side: 'a' | 'b',
+  lines: readonly string[],
+  ops: readonly DiffRange[],
+  normalizeJSON: boolean,
+): (line: number) => string | undefined {
+  const [chunks, setChunks] = React.useState(() => new Map<number, Run[][]>());
+  const requested = React.useRef(new Set<number>());
+
+  // Start over when the file (or how it's normalized) changes.
+  React.useEffect(() => {
+    requested.current = new Set();
+    setChunks(new Map());
+  }, [idx, side, lines, normalizeJSON]);
+
+  React.useEffect(() => {
+    if (!enabled) return;
+    const current = requested.current;
+    for (const start of visibleChunks(ops, side)) {
+      if (current.has(start)) continue;
+      current.add(start);
+      const params = new URLSearchParams({
+        start: String(start),
+        end: String(start + CHUNK_SIZE),
+      });
+      if (normalizeJSON) {
+        params.set('normalize_json', '1');
+      }
+      void (async () => {
+        const response = await fetch(`/highlight/${side}/${idx}?${params.toString()}`);
+        if (!response.ok || requested.current !== current) return;
+        const data = (await response.json()) as HighlightResponse;
+        setChunks(old => new Map(old).set(data.start, data.lines));
+      })();
+    }
+  }, [enabled, idx, side, ops, normalizeJSON]);
+
+  return React.useCallback(
+    (line: number) => {
+      const start = Math.floor(line / CHUNK_SIZE) * CHUNK_SIZE;
+      const runs = chunks.get(start)?.[line - start];
+      const text = lines[line];
+      return runs && text !== undefined ? runsToHtml(text, runs) : undefined;
+    },
+    [chunks, lines],
+  );
+}
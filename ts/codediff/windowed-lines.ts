@@ -0,0 +1,92 @@
+import React from 'react';
+import {DiffRange} from './codes';
+
+/** Lines of large files are fetched from the server this many at a time. */
+const WINDOW_SIZE = 1000;
+
+/** Response from /{side}/get_lines */
+interface LinesResponse {
+  num_lines: number;
+  start: number;
+  lines: string[];
+}
+
+export interface WindowedFile {
+  side: 'a' | 'b';
+  path: string;
+  normalizeJSON: boolean;
+}
+
+/** The windows of lines on one side which are visible (i.e. not skipped) in the diff. */
+function visibleWindows(ops: readonly DiffRange[], side: 'a' | 'b'): number[] {
+  const windows = new Set<number>();
+  for (const op of ops) {
+    if (op.type === 'skip') continue;
+    const [start, limit] = side === 'a' ? op.before : op.after;
+    for (let i = Math.floor(start / WINDOW_SIZE); i * WINDOW_SIZE < limit; i++) {
+      windows.add(i * WINDOW_SIZE);
+    }
+  }
+  return [...windows];
+}
+
+/**
+ * Lines of a file which is too large to load in full. Only the lines which are
+ * visible in the diff are fetched, including skipped lines once they're expanded.
+ * Lines which haven't loaded yet are undefined.
+ *
+ * The returned array is filled in as windows arrive, re-rendering the caller.
+ */
+export function useWindowedLines(
+  file: WindowedFile | null,
+  idx: number,
+  numLines: number,
+  ops: readonly DiffRange[],
+): string[] | null {
+  const {side, path, normalizeJSON} = file ?? {};
+  const lines = React.useMemo(
+    () => (side ? new Array<string>(numLines) : null),
+    // A new file needs a new array.
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+    [idx, side, path, normalizeJSON, numLines],
+  );
+  const requested = React.useRef<{lines: string[] | null; windows: Set<number>}>({
+    lines: null,
+    windows: new Set(),
+  });
+  const [, setVersion] = React.useState(0);
+
+  React.useEffect(() => {
+    if (!lines || !side || !path) return;
+    if (requested.current.lines !== lines) {
+      requested.current = {lines, windows: new Set()};
+    }
+    const {windows} = requested.current;
+    for (const start of visibleWindows(ops, side)) {
+      if (windows.has(start)) continue;
+      windows.add(start);
+      const params = new URLSearchParams({
+        path,
+        start: String(start),
+        end: String(start + WINDOW_SIZE),
+      });
+      if (normalizeJSON) {
+        params.set('normalize_json', '1');
+      }
+      void (async () => {
+        const response = await fetch(`/${side}/get_lines?${params.toString()}`);
+        if (!response.ok) {
+          windows.delete(start);
+          return;
+        }
+        const data = (await response.json()) as LinesResponse;
+        data.lines.forEach((line, i) => {
+          lines[data.start + i] = line;
+        });
+        setVersion(v => v + 1);
+      })();
+    }
+  }, [lines, side, path, normalizeJSON, ops]);
+
+  return lines;
+}
@@ -23,6 +23,11 @@ export interface WebdiffConfig {
   maxDiffWidth: number;
   theme: string;
   maxLinesForSyntax: number;
+  highlightLargeFiles: boolean;
+  maxContentsSize: number;
+  filesPerPage: number;
+  charDiffEngine: 'client' | 'server';
+  maxCharDiffLineLength: number;
 }
 
 export interface ColorsConfig {
@@ -0,0 +1,79 @@
+import React from 'react';
+import {FilePair} from './CodeDiffContainer';
+
+/** Response from the /pairs endpoint. */
+export interface PairsPage {
+  offset: number;
+  /** Number of files matching the filters (not just on this page). */
+  total: number;
+  pairs: FilePair[];
+}
+
+export interface PairsQuery {
+  offset?: number;
+  limit?: number;
+  /** Only include files whose path starts with this. */
+  prefix?: string;
+  /** Only include files whose path matches this glob, e.g. "*.py". */
+  glob?: string;
+}
+
+export async function fetchPairs(query: PairsQuery): Promise<PairsPage> {
+  const params = new URLSearchParams();
+  for (const [k, v] of Object.entries(query)) {
+    if (v !== undefined && v !== '') {
+      params.set(k, String(v));
+    }
+  }
+  const response = await fetch(`/pairs?${params.toString()}`);
+  return (await response.json()) as PairsPage;
+}
+
+/**
+ * The file pairs which have been loaded so far. The page only includes the
+ * first few; the rest are fetched from the server as they're needed.
+ */
+export function usePairs(initialPairs: FilePair[], numPairs: number, pageSize: number) {
+  const [pairs, setPairs] = React.useState(
+    () => new Map(initialPairs.map(fp => [fp.idx, fp])),
+  );
+  const inFlight = React.useRef(new Set<number>());
+
+  /** Load the page of pairs which contains idx, if it hasn't been loaded already. */
+  const loadPage = React.useCallback(
+    (idx: number) => {
+      const offset = Math.floor(idx / pageSize) * pageSize;
+      if (pairs.has(idx) || inFlight.current.has(offset)) return;
+      inFlight.current.add(offset);
+      void (async () => {
+        try {
+          const page = await fetchPairs({offset, limit: pageSize});
+          setPairs(old => {
+            const next = new Map(old);
+            for (const fp of page.pairs) {
+              next.set(fp.idx, fp);
+            }
+            return next;
+          });
+        } finally {
+          inFlight.current.delete(offset);
+        }
+      })();
+    },
+    [pairs, pageSize],
+  );
+
+  /** Load the first page which hasn't been loaded yet. */
+  const loadMore = React.useCallback(() => {
+    let idx = 0;
+    while (pairs.has(idx)) idx++;
+    if (idx < numPairs) loadPage(idx);
+  }, [pairs, numPairs, loadPage]);
+
+  const loadedPairs = React.useMemo(
+    () => [...pairs.values()].sort((a, b) => a.idx - b.idx),
+    [pairs],
+  );
+
+  return {pairs, loadedPairs, loadPage, loadMore};
+}
@@ -1,6 +1,7 @@
 /* eslint-disable  */
 
 const path = require('path');
+const zlib = require('zlib');
 
 const mode = process.env.NODE_ENV || 'production';
 
@@ -26,6 +27,41 @@ const options = {
   },
 };
 
+// Write pre-compressed copies of the bundle next to it. The server sends these to
+// clients which accept gzip or brotli, rather than compressing on each request.
+class PrecompressPlugin {
+  apply(compiler) {
+    compiler.hooks.thisCompilation.tap('PrecompressPlugin', compilation => {
+      compilation.hooks.processAssets.tap(
+        {
+          name: 'PrecompressPlugin',
+          stage: compiler.webpack.Compilation.PROCESS_ASSETS_STAGE_TRANSFER,
+        },
+        assets => {
+          for (const name of Object.keys(assets)) {
+            if (!name.endsWith('.js')) continue;
+            const source = compilation.getAsset(name).source.buffer();
+            const {RawSource} = compiler.webpack.sources;
+            compilation.emitAsset(name + '.gz', new RawSource(zlib.gzipSync(source, {level: 9})));
+            compilation.emitAsset(
+              name + '.br',
+              new RawSource(
+                zlib.brotliCompressSync(source, {
+                  params: {[zlib.constants.BROTLI_PARAM_QUALITY]: 11},
+                }),
+              ),
+            );
+          }
+        },
+      );
+    });
+  }
+}
+
+if (mode === 'production') {
+  options.plugins = [new PrecompressPlugin()];
+}
+
 if (mode === 'development') {
   Object.assign(options, {
     devtool: 'cheap-module-eval-source-map',
@@ -4,7 +4,9 @@
 For usage, see README.md.
 """
 
+import asyncio
 import dataclasses
+import functools
 import importlib.metadata
 import json
 import logging
@@ -18,14 +20,30 @@ import sys
 import threading
 import time
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 
 import aiohttp
 import aiohttp.web_request
 from aiohttp import web
 from binaryornot.check import is_binary
 
-from webdiff import argparser, diff, options, util
+from webdiff import (
+    argparser,
+    diff,
+    dirdiff,
+    highlight,
+    httpcache,
+    lineindex,
+    lrucache,
+    options,
+    structdiff,
+    util,
+)
 from webdiff.dirdiff import make_resolved_dir
+from webdiff.diskcache import DiskCache, default_cache_dir
+from webdiff.prefetch import Prefetcher
+
+logger = logging.getLogger(__name__)
 
 VERSION = importlib.metadata.version('webdiff')
 
@@ -45,6 +63,17 @@ def determine_path():
 
 GIT_CONFIG = {}
 DIFF = None
+THIN_LIST = None  # (DIFF, diff.get_thin_list(DIFF))
+PATH_INDEX = None  # (DIFF, diff.make_path_index(DIFF))
+INDEX_STATE = None  # (DIFF, GIT_CONFIG, static version, chunks of the index page)
+# (idx, content encoding) -> (chunks, rendered and compressed index page)
+INDEX_PAGES = lrucache.register(lrucache.LRUCache('app.index_pages', maxsize=32))
+OPS_CACHE = None
+PREFETCHER = None
+EXECUTOR = None
+IS_DIR_DIFF = False
+# idx -> (file stamps, diff ops) from dirdiff.batch_diff_ops
+BATCH_OPS = {}
 PORT = None
 HOSTNAME = 'localhost'
 DEBUG = os.environ.get('DEBUG')
@@ -67,40 +96,169 @@ if DEBUG:
     logging.getLogger('binaryornot').setLevel(logging.ERROR)
 
 
-async def handle_index(request: aiohttp.web_request.Request):
-    idx = int(request.match_info.get('idx', '0'))
-    pairs = diff.get_thin_list(DIFF)
+def thin_list():
+    """The thin dicts for every diff, computed once per DIFF."""
+    global THIN_LIST
+    if THIN_LIST is None or THIN_LIST[0] is not DIFF:
+        THIN_LIST = (DIFF, diff.get_thin_list(DIFF))
+    return THIN_LIST[1]
+
+
+def path_index():
+    """Maps file names on each side to indices in DIFF, built once per DIFF."""
+    global PATH_INDEX
+    if PATH_INDEX is None or PATH_INDEX[0] is not DIFF:
+        PATH_INDEX = (DIFF, diff.make_path_index(DIFF))
+    return PATH_INDEX[1]
+
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(',', ':'))
+
+
+def static_version() -> str:
+    """Changes whenever the JS bundle does, so that it can be cached forever."""
+    try:
+        return httpcache.file_etag(os.path.join(WEBDIFF_DIR, 'static/js/file_diff.js'))
+    except OSError:
+        return VERSION
+
+
+@functools.cache
+def index_template() -> tuple[str, str, str]:
+    """The index page, split around the {{extra_pairs}} and {{idx}} placeholders.
+
+    This is split before anything is filled in, since file names could contain
+    text that looks like a placeholder.
+    """
     with open(os.path.join(WEBDIFF_DIR, 'templates/file_diff.html'), 'r') as file:
         html = file.read()
-        html = html.replace(
-            '{{data}}',
-            json.dumps(
-                {
-                    'idx': idx,
-                    'has_magick': util.is_imagemagick_available(),
-                    'pairs': pairs,
-                    'git_config': GIT_CONFIG,
-                },
-                indent=2,
-            ),
+    before, rest = html.split('{{extra_pairs}}')
+    middle, after = rest.split('{{idx}}')
+    return before, middle, after
+
+
+def index_chunks():
+    """The index page, split around the {{idx}} and {{extra_pairs}} placeholders.
+
+    Everything else in the page is rendered once per DIFF / GIT_CONFIG.
+    """
+    global INDEX_STATE
+    version = static_version()
+    state = INDEX_STATE
+    if (
+        state is None
+        or state[0] is not DIFF
+        or state[1] is not GIT_CONFIG
+        or state[2] != version
+    ):
+        all_pairs = thin_list()
+        # Only the first page of files goes in the page; the rest come from /pairs.
+        data = {
+            'has_magick': util.is_image_diff_available(),
+            'pairs': all_pairs[: GIT_CONFIG['webdiff']['filesPerPage']],
+            'num_pairs': len(all_pairs),
+            'git_config': GIT_CONFIG,
+        }
+        chunks = tuple(
+            chunk.replace('{{static_version}}', version).replace(
+                '{{data}}', compact_json(data)
+            )
+            for chunk in index_template()
         )
-        return web.Response(body=html, content_type='text/html', charset='utf-8')
+        state = INDEX_STATE = (DIFF, GIT_CONFIG, version, chunks)
+        INDEX_PAGES.clear()
+    return state[3]
+
+
+def render_index(chunks, idx: int) -> bytes:
+    before, middle, after = chunks
+    all_pairs = thin_list()
+    # Include the selected file if it's not on the first page.
+    extra_pairs = []
+    if GIT_CONFIG['webdiff']['filesPerPage'] <= idx < len(all_pairs):
+        extra_pairs = [all_pairs[idx]]
+    return f'{before}{compact_json(extra_pairs)}{middle}{idx}{after}'.encode()
+
+
+async def handle_index(request: aiohttp.web_request.Request):
+    idx = int(request.match_info.get('idx', '0'))
+    chunks = index_chunks()
+    encoding = httpcache.choose_encoding(request)
+    page = INDEX_PAGES.get((idx, encoding), is_valid=lambda page: page[0] is chunks)
+    if page is None:
+        body = render_index(chunks, idx)
+        page = (chunks, await run_blocking(httpcache.compress, body, encoding))
+        INDEX_PAGES.put((idx, encoding), page)
+    return httpcache.make_response(page[1], encoding, 'text/html', 'utf-8')
+
+
+def int_param(request: aiohttp.web_request.Request, name: str, default: int) -> int:
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        n = int(value)
+    except ValueError:
+        n = -1
+    if n < 0:
+        raise web.HTTPBadRequest(text=f'{name} must be a non-negative integer')
+    return n
+
+
+async def handle_pairs(request: aiohttp.web_request.Request):
+    """A page of the file list, optionally filtered by path prefix or glob."""
+    offset = int_param(request, 'offset', 0)
+    limit = int_param(request, 'limit', GIT_CONFIG['webdiff']['filesPerPage'])
+    pairs = diff.filter_thin_list(
+        thin_list(), request.query.get('prefix'), request.query.get('glob')
+    )
+    data = {
+        'offset': offset,
+        'total': len(pairs),
+        'pairs': pairs[offset : offset + limit],
+    }
+    return httpcache.compressed_response(
+        request, compact_json(data).encode('utf8'), 'application/json'
+    )
+
+
+async def run_blocking(fn, *args):
+    """Run blocking work (subprocesses, file I/O) off of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(EXECUTOR, functools.partial(fn, *args))
+
+
+async def prefetched(kind: str, idx: int):
+    """Wait for a result computed by the prefetcher, or return None."""
+    if not PREFETCHER:
+        return None
+    PREFETCHER.focus(idx)
+    future = PREFETCHER.get(kind, idx)
+    if future is None:
+        return None
+    return await asyncio.wrap_future(future)
 
 
 async def handle_thick(request: aiohttp.web_request.Request):
     idx = int(request.match_info.get('idx'))
-    return web.json_response(diff.get_thick_dict(DIFF[idx]))
+    thick = await prefetched('thick', idx)
+    if thick is None:
+        thick = await run_blocking(diff.get_thick_dict, DIFF[idx])
+    return web.json_response(thick)
 
 
 async def handle_get_contents(request: aiohttp.web_request.Request):
     side = request.match_info['side']
-    form_data = await request.post()
-    path = form_data.get('path', '')
+    # GET requests can be cached by the browser; POST is supported for old clients.
+    params = request.query if request.method == 'GET' else await request.post()
+    path = params.get('path', '')
     if not path:
         return web.json_response({'error': 'incomplete'}, status=400)
-    should_normalize = form_data.get('normalize_json')
+    should_normalize = params.get('normalize_json')
+    max_bytes = int_param(request, 'max_bytes', 0)
 
-    idx = diff.find_diff_index(DIFF, side, path)
+    idx = diff.find_diff_index(DIFF, side, path, path_index())
     if idx is None:
         return web.json_response({'error': 'not found'}, status=400)
 
@@ -108,34 +266,150 @@ async def handle_get_contents(request: aiohttp.web_request.Request):
     abs_path = d.a_path if side == 'a' else d.b_path
 
     try:
-        if is_binary(abs_path):
+        if await run_blocking(is_binary, abs_path):
             size = os.path.getsize(abs_path)
             return web.Response(text=f'Binary file ({size} bytes)')
         else:
             if should_normalize:
-                abs_path = util.normalize_json(abs_path)
-            return web.FileResponse(abs_path, headers={'Content-Type': 'text/plain'})
+                abs_path = await run_blocking(util.normalize_json, abs_path)
+            size = os.path.getsize(abs_path)
+            if max_bytes and size > max_bytes:
+                # The client should fetch the lines it needs from get_lines instead.
+                return web.json_response(
+                    {'error': 'too large', 'size': size}, status=413
+                )
+            return await httpcache.file_response(
+                request, abs_path, 'text/plain; charset=utf-8'
+            )
     except Exception as e:
         return web.json_response({'error': str(e)}, status=500)
 
 
+async def handle_get_lines(request: aiohttp.web_request.Request):
+    """A range of lines from one side of the diff, for files too large to load whole.
+
+    Returns the total number of lines in the file and lines [start, end).
+    """
+    side = request.match_info['side']
+    path = request.query.get('path', '')
+    if not path:
+        return web.json_response({'error': 'incomplete'}, status=400)
+    should_normalize = request.query.get('normalize_json')
+    start = int_param(request, 'start', 0)
+    end = int_param(request, 'end', start + 1000)
+
+    idx = diff.find_diff_index(DIFF, side, path, path_index())
+    if idx is None:
+        return web.json_response({'error': 'not found'}, status=400)
+
+    d = DIFF[idx]
+    abs_path = d.a_path if side == 'a' else d.b_path
+    try:
+        etag = await run_blocking(httpcache.file_etag, abs_path)
+        if should_normalize:
+            etag += '-normalized'
+            abs_path = await run_blocking(util.normalize_json, abs_path)
+        etag += f'-{start}-{end}'
+        if httpcache.is_not_modified(request, etag):
+            return httpcache.not_modified(etag)
+        num_lines, lines = await run_blocking(
+            lineindex.read_lines, abs_path, start, end
+        )
+    except (OSError, ValueError) as e:
+        return web.json_response({'error': str(e)}, status=500)
+
+    data = {'num_lines': num_lines, 'start': start, 'lines': lines}
+    body = compact_json(data).encode('utf8')
+    encoding = httpcache.encoding_for(request, 'application/json', len(body))
+    return httpcache.make_response(
+        await run_blocking(httpcache.compress, body, encoding),
+        encoding,
+        'application/json',
+        etag=etag,
+        cache_control=httpcache.REVALIDATE,
+    )
+
+
 async def handle_diff_ops(request: aiohttp.web_request.Request):
     idx = int(request.match_info.get('idx'))
     payload = await request.json()
     options = payload.get('options') or []
     should_normalize = payload.get('normalize_json')
-    logging.debug([*payload.keys()])
-    logging.debug({**payload})
-    extra_args = GIT_CONFIG['webdiff']['extraFileDiffArgs']
-    if extra_args:
-        options += extra_args.split(' ')
-    diff_ops = [
-        dataclasses.asdict(op)
-        for op in diff.get_diff_ops(DIFF[idx], options, normalize_json=should_normalize)
-    ]
+    logger.debug([*payload.keys()])
+    logger.debug({**payload})
+    ops = None
+    if not options and not should_normalize:
+        ops = batch_diff_ops(idx)
+        if ops is None:
+            ops = await prefetched('diff_ops', idx)
+    if ops is None:
+        ops = await run_blocking(get_diff_ops, DIFF[idx], options, should_normalize)
+    diff_ops = [dataclasses.asdict(op) for op in ops]
     return web.json_response(diff_ops, status=200)
 
 
+async def handle_char_diffs(request: aiohttp.web_request.Request):
+    """Character-level diffs for the replaced lines in /diff/{idx}."""
+    idx = int(request.match_info.get('idx'))
+    payload = await request.json()
+    options = payload.get('options') or []
+    should_normalize = payload.get('normalize_json')
+    char_diffs = await run_blocking(
+        get_char_diffs, DIFF[idx], options, should_normalize
+    )
+    return httpcache.compressed_response(
+        request, compact_json(char_diffs).encode('utf8'), 'application/json'
+    )
+
+
+def file_diff_args(options=()):
+    extra_args = GIT_CONFIG['webdiff']['extraFileDiffArgs']
+    return [*options, *(extra_args.split(' ') if extra_args else [])]
+
+
+def get_diff_ops(d, options=(), should_normalize=False):
+    return diff.get_diff_ops(
+        d,
+        file_diff_args(options),
+        normalize_json=should_normalize,
+        config=GIT_CONFIG,
+        cache=OPS_CACHE,
+    )
+
+
+def get_char_diffs(d, options=(), should_normalize=False):
+    return diff.get_char_diffs(
+        d,
+        file_diff_args(options),
+        normalize_json=should_normalize,
+        config=GIT_CONFIG,
+        cache=OPS_CACHE,
+    )
+
+
+async def handle_highlight(request: aiohttp.web_request.Request):
+    """Syntax highlighting for a range of lines on one side of a diff."""
+    if not highlight.is_available():
+        return web.json_response('Pygments is not installed', status=501)
+    side = request.match_info['side']
+    idx = int(request.match_info['idx'])
+    start = int_param(request, 'start', 0)
+    end = int_param(request, 'end', start + 1000)
+    d = DIFF[idx]
+    name = d.a if side == 'a' else d.b
+    abs_path = d.a_path if side == 'a' else d.b_path
+    if not abs_path:
+        return web.json_response({'error': 'not found'}, status=400)
+    if request.query.get('normalize_json'):
+        # Highlight the lines that the UI shows. Tokens are cached by the content
+        # hash of the file they come from, so these are cached separately.
+        abs_path = await run_blocking(util.normalize_json, abs_path)
+    data = await run_blocking(highlight.highlight_lines, abs_path, name, start, end)
+    return httpcache.compressed_response(
+        request, compact_json(data).encode('utf8'), 'application/json'
+    )
+
+
 async def handle_theme(request: aiohttp.web_request.Request):
     theme = GIT_CONFIG['webdiff']['theme']
     theme_dir = os.path.dirname(theme)
@@ -157,39 +431,52 @@ async def handle_get_image(request: aiohttp.web_request.Request):
     if not mime_type or not mime_type.startswith('image/'):
         return web.json_response({'error': 'wrong type'}, status=400)
 
-    idx = diff.find_diff_index(DIFF, side, path)
+    idx = diff.find_diff_index(DIFF, side, path, path_index())
     if idx is None:
         return web.json_response({'error': 'not found'}, status=400)
 
     d = DIFF[idx]
     abs_path = d.a_path if side == 'a' else d.b_path
-    return web.FileResponse(abs_path, headers={'Content-Type': mime_type})
+    return await httpcache.file_response(request, abs_path, mime_type)
 
 
 async def handle_pdiff(request: aiohttp.web_request.Request):
     idx = int(request.match_info.get('idx'))
     d = DIFF[idx]
     try:
-        _, pdiff_image = util.generate_pdiff_image(d.a_path, d.b_path)
-        dilated_image_path = util.generate_dilated_pdiff_image(pdiff_image)
+        pdiff = await run_blocking(util.generate_pdiff_image, d.a_path, d.b_path)
+        dilated_image_path = await run_blocking(
+            util.generate_dilated_pdiff_image, pdiff.diff_path
+        )
         return web.FileResponse(dilated_image_path)
     except util.ImageMagickNotAvailableError:
         return web.Response(status=501, text='ImageMagick is not available')
-    except util.ImageMagickError as e:
-        return web.Response(status=501, text=f'ImageMagick error {e}')
+    except util.ImageDiffError as e:
+        return web.Response(status=501, text=f'Image diff error {e}')
 
 
-async def handle_pdiff_bbox(request: aiohttp.web_request.Request):
+async def handle_pdiff_info(request: aiohttp.web_request.Request):
+    """Returns the bounding box and pixel counts for a perceptual diff."""
     idx = int(request.match_info.get('idx'))
     d = DIFF[idx]
     try:
-        _, pdiff_image = util.generate_pdiff_image(d.a_path, d.b_path)
-        bbox = util.get_pdiff_bbox(pdiff_image)
-        return web.json_response(bbox, status=200)
+        pdiff = await run_blocking(util.generate_pdiff_image, d.a_path, d.b_path)
     except util.ImageMagickNotAvailableError:
         return web.json_response('ImageMagick is not available', status=501)
-    except util.ImageMagickError as e:
-        return web.json_response(f'ImageMagick error {e}', status=501)
+    except util.ImageDiffError as e:
+        return web.json_response(f'Image diff error {e}', status=501)
+    return web.json_response(
+        {
+            'are_same_pixels': pdiff.same_pixels,
+            'num_diff_pixels': pdiff.num_diff_pixels,
+            'num_pixels': pdiff.num_pixels,
+            'bbox': pdiff.bbox,
+        }
+    )
+
+
+async def handle_debug_caches(request: aiohttp.web_request.Request):
+    return web.json_response(lrucache.all_stats())
 
 
 async def websocket_handler(request: aiohttp.web_request.Request):
@@ -213,7 +500,89 @@ async def request_time_middleware(request, handler):
     return response
 
 
+async def start_executor(app):
+    global EXECUTOR
+    EXECUTOR = ThreadPoolExecutor(
+        max_workers=GIT_CONFIG['webdiff']['maxConcurrency'],
+        thread_name_prefix='webdiff',
+    )
+
+
+async def stop_executor(app):
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+async def stop_structdiff_workers(app):
+    structdiff.shutdown()
+
+
+async def remove_temp_files(app):
+    util.remove_temp_files()
+
+
+def batch_diff_ops(idx):
+    """Returns diff ops (with default options) computed in batch, if available."""
+    entry = BATCH_OPS.get(idx)
+    if entry is None:
+        return None
+    stamps, ops = entry
+    d = DIFF[idx]
+    if stamps != lrucache.file_stamps(d.a_path, d.b_path):
+        return None  # the files have changed since the batch ran
+    return ops
+
+
+def compute_batch_diff_ops():
+    try:
+        extra_args = GIT_CONFIG['webdiff']['extraFileDiffArgs']
+        stamps = [lrucache.file_stamps(d.a_path, d.b_path) for d in DIFF]
+        ops = dirdiff.batch_diff_ops(
+            DIFF, GIT_CONFIG['webdiff'], extra_args.split(' ') if extra_args else []
+        )
+        BATCH_OPS.update({idx: (stamps[idx], codes) for idx, codes in ops.items()})
+        logger.debug(f'Computed diff ops for {len(ops)} files in batch')
+    except Exception as e:
+        logger.warning(f'Unable to compute diff ops in batch: {e}', exc_info=True)
+
+
+async def prepare_diff(app):
+    await run_blocking(index_chunks)
+    await run_blocking(path_index)
+
+
+async def start_batch_diff_ops(app):
+    if IS_DIR_DIFF and GIT_CONFIG['webdiff']['batchDiffOps']:
+        asyncio.get_running_loop().run_in_executor(EXECUTOR, compute_batch_diff_ops)
+
+
+async def start_prefetch(app):
+    global PREFETCHER
+    webdiff_config = GIT_CONFIG['webdiff']
+    if not webdiff_config['prefetch']:
+        return
+    PREFETCHER = Prefetcher(
+        DIFF,
+        {'thick': diff.get_thick_dict, 'diff_ops': get_diff_ops},
+        max_workers=webdiff_config['prefetchWorkers'],
+    )
+    PREFETCHER.start()
+
+
+async def stop_prefetch(app):
+    if PREFETCHER:
+        PREFETCHER.shutdown()
+
+
 app = web.Application(middlewares=[request_time_middleware])
+app.on_startup.append(start_executor)
+app.on_startup.append(prepare_diff)
+app.on_startup.append(start_batch_diff_ops)
+app.on_startup.append(start_prefetch)
+app.on_shutdown.append(stop_prefetch)
+app.on_response_prepare.append(httpcache.set_static_cache_control)
+app.on_shutdown.append(stop_executor)
+app.on_shutdown.append(stop_structdiff_workers)
+app.on_cleanup.append(remove_temp_files)
 app.add_routes(
     [
         web.get('/', handle_index),
@@ -221,13 +590,19 @@ app.add_routes(
         web.get('/favicon.ico', handle_favicon),
         web.get('/theme.css', handle_theme),
         web.static('/static', os.path.join(WEBDIFF_DIR, 'static')),
+        web.get('/pairs', handle_pairs),
         web.get(r'/thick/{idx:\d+}', handle_thick),
+        web.get(r'/{side:a|b}/get_contents', handle_get_contents),
         web.post(r'/{side:a|b}/get_contents', handle_get_contents),
+        web.get(r'/{side:a|b}/get_lines', handle_get_lines),
         web.post(r'/diff/{idx:\d+}', handle_diff_ops),
+        web.post(r'/chardiffs/{idx:\d+}', handle_char_diffs),
+        web.get(r'/highlight/{side:a|b}/{idx:\d+}', handle_highlight),
         # Image diffs
         web.get(r'/{side:a|b}/image/{path:.*}', handle_get_image),
         web.get(r'/pdiff/{idx:\d+}', handle_pdiff),
-        web.get(r'/pdiffbbox/{idx:\d+}', handle_pdiff_bbox),
+        web.get(r'/pdiffinfo/{idx:\d+}', handle_pdiff_info),
+        web.get('/debug/caches', handle_debug_caches),
         # Websocket for detecting when the tab is closed
         web.get('/ws', websocket_handler),
     ]
@@ -278,7 +653,7 @@ def pick_a_port(args, webdiff_config):
 def run_http():
     threading.Timer(0.1, open_browser).start()
     web.run_app(app, host=HOSTNAME, port=PORT, print=print if DEBUG else None)
-    logging.debug('http server shut down')
+    logger.debug('http server shut down')
 
 
 def maybe_shutdown():
@@ -287,28 +662,47 @@ def maybe_shutdown():
 
     def shutdown():
         if LAST_REQUEST_MS <= last_ms:  # subsequent requests abort shutdown
-            logging.debug('Shutting down...')
+            logger.debug('Shutting down...')
             signal.raise_signal(signal.SIGINT)
         else:
-            logging.debug('Received subsequent request; shutdown aborted.')
+            logger.debug('Received subsequent request; shutdown aborted.')
 
-    logging.debug(
+    logger.debug(
         'Received request to shut down; waiting 500ms for subsequent requests...'
     )
     threading.Timer(0.5, shutdown).start()
 
 
 def run():
-    global DIFF, PORT, HOSTNAME, GIT_CONFIG
+    global DIFF, PORT, HOSTNAME, GIT_CONFIG, OPS_CACHE, IS_DIR_DIFF
     try:
         parsed_args = argparser.parse(sys.argv[1:], VERSION)
     except argparser.UsageError as e:
         sys.stderr.write('Error: %s\n\n' % e)
         usage_and_die()
 
+    if parsed_args.get('clear_cache'):
+        DiskCache(default_cache_dir(), 0).clear()
+        sys.stderr.write(f'Cleared {default_cache_dir()}\n')
+        if not ({'dirs', 'files', 'github'} & parsed_args.keys()):
+            sys.exit(0)
+
     GIT_CONFIG = options.get_config()
     WEBDIFF_CONFIG = GIT_CONFIG['webdiff']
-    DIFF = argparser.diff_for_args(parsed_args, WEBDIFF_CONFIG)
+    OPS_CACHE = DiskCache(
+        os.path.join(default_cache_dir(), 'ops'),
+        WEBDIFF_CONFIG['cacheSize'] * 1024 * 1024,
+    )
+    util.set_imagemagick_limits(
+        WEBDIFF_CONFIG['maxImageMagickJobs'], WEBDIFF_CONFIG['imageMagickTimeout']
+    )
+    util.set_image_diff_engine(WEBDIFF_CONFIG['imageDiffEngine'])
+    snapshot_cache = None
+    if WEBDIFF_CONFIG['incrementalDirDiff'] and WEBDIFF_CONFIG['cacheSize'] > 0:
+        # Snapshots share the diff ops cache, and so its cacheSize budget.
+        snapshot_cache = OPS_CACHE
+    DIFF = argparser.diff_for_args(parsed_args, WEBDIFF_CONFIG, snapshot_cache)
+    IS_DIR_DIFF = 'dirs' in parsed_args
 
     if DEBUG:
         sys.stderr.write('Invoked as: %s\n' % sys.argv)
@@ -357,8 +751,8 @@ Close the browser tab when you're done to terminate the process."""
             copied_dir_b = make_resolved_dir(dir_b)
             os.environ['WEBDIFF_DIR_A'] = copied_dir_a
             os.environ['WEBDIFF_DIR_B'] = copied_dir_b
-            logging.debug(f'Copied {dir_a} -> {copied_dir_a} before detaching')
-            logging.debug(f'Copied {dir_b} -> {copied_dir_b} before detaching')
+            logger.debug(f'Copied {dir_a} -> {copied_dir_a} before detaching')
+            logger.debug(f'Copied {dir_b} -> {copied_dir_b} before detaching')
         subprocess.Popen((sys.executable, *sys.argv))
 
 
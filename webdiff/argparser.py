@@ -4,7 +4,7 @@ import argparse
 import os
 import re
 
-from webdiff import dirdiff, github_fetcher, githubdiff
+from webdiff import dirdiff, dirsnapshot, github_fetcher, githubdiff
 from webdiff.localfilediff import LocalFileDiff
 
 
@@ -15,6 +15,7 @@ class UsageError(Exception):
 USAGE = """Usage: webdiff <left_dir> <right_dir>
        webdiff <left_file> <right_file>
        webdiff https://github.com/<owner>/<repo>/pull/<num>
+       webdiff --clear-cache
 
 Or run "git webdiff" from a git repository.
 """
@@ -39,10 +40,15 @@ def parse(args, version=None):
     parser.add_argument(
         '--port', '-p', type=int, help='Port to run webdiff on.', default=-1
     )
+    parser.add_argument(
+        '--clear-cache',
+        action='store_true',
+        help='Delete the on-disk cache of computed diffs.',
+    )
     parser.add_argument(
         'dirs',
         type=str,
-        nargs='+',
+        nargs='*',
         help='Directories to diff, or a github pull request URL.',
     )
     args = parser.parse_args(args=args)
@@ -53,6 +59,13 @@ def parse(args, version=None):
         out['port'] = args.port
     if args.host:
         out['host'] = args.host
+    if args.clear_cache:
+        out['clear_cache'] = True
+        if not args.dirs:
+            return out
+
+    if not args.dirs:
+        raise UsageError('You must specify two files/dirs or a pull request')
 
     if len(args.dirs) > 2:
         raise UsageError('You must specify two files/dirs (got %d)' % len(args.dirs))
@@ -116,10 +129,16 @@ def _shim_for_file_diff(a_file, b_file):
     )
 
 
-def diff_for_args(args, webdiff_config):
-    """Returns a list of Diff objects for parsed command line args."""
+def diff_for_args(args, webdiff_config, snapshot_cache=None):
+    """Returns a list of Diff objects for parsed command line args.
+
+    If a snapshot_cache is provided, directory diffs reuse the previous run's
+    results for files which haven't changed (see dirsnapshot).
+    """
     if 'dirs' in args:
         # return dirdiff.diff(*args['dirs'])
+        if snapshot_cache:
+            return dirsnapshot.gitdiff(*args['dirs'], webdiff_config, snapshot_cache)
         return dirdiff.gitdiff(*args['dirs'], webdiff_config)
 
     if 'files' in args:
@@ -0,0 +1,235 @@
+"""Character-level (intra-line) diffs for replaced lines.
+
+This is a port of computeCharacterDiffs from ts/codediff/char-diffs.ts, so that
+the browser doesn't have to diff very long lines itself. Spans are
+(class, start, limit) triples, with offsets in UTF-16 code units to match
+JavaScript strings, and class one of None, 'delete' or 'insert'.
+
+Words are diffed with a port of jsdiff's diffArrays (not linediff, which has
+git's heuristics), so that the spans match what the browser would compute.
+"""
+
+import re
+from collections.abc import Sequence
+
+from webdiff.unified_diff import Code
+
+# The UI shows tabs as four non-breaking spaces before it adds character diffs.
+TAB = '\u00a0' * 4
+# Character diffs aren't shown unless at least this much of the line is unchanged.
+MIN_EQUAL_FRAC = 0.5
+
+# Words are [A-Z][a-z]+, [A-Z]+, [a-z]+ or [0-9]+; anything else is a word by itself.
+_WORD_RE = re.compile(r'[A-Z][a-z]+|[A-Z]+|[a-z]+|[0-9]+|.', re.DOTALL)
+
+
+def split_into_words(line: str) -> list[str]:
+    """Split a line into words. ''.join(split_into_words(line)) == line."""
+    return _WORD_RE.findall(line)
+
+
+def js_len(s: str) -> int:
+    """The length of s as a JavaScript string."""
+    if s.isascii():
+        return len(s)
+    return len(s) + sum(1 for c in s if ord(c) > 0xFFFF)
+
+
+def _is_space(word: str) -> bool:
+    return word.isspace()
+
+
+def diff_arrays(old: Sequence[str], new: Sequence[str]) -> list[tuple[str, int]]:
+    """A port of jsdiff's diffArrays (as of jsdiff 6+) to match its output.
+
+    This is Myers's O(ND) algorithm, with jsdiff's tie-breaking and pruning.
+    Returns (type, count) runs, where type is 'equal', 'delete' or 'insert'.
+    """
+    old_len = len(old)
+    new_len = len(new)
+    # Runs are built up as linked lists of (type, count, previous run).
+
+    def extract_common(path: list, diagonal: int) -> int:
+        old_pos = path[0]
+        new_pos = old_pos - diagonal
+        common = 0
+        while (
+            new_pos + 1 < new_len
+            and old_pos + 1 < old_len
+            and new[new_pos + 1] == old[old_pos + 1]
+        ):
+            new_pos += 1
+            old_pos += 1
+            common += 1
+        if common:
+            path[1] = ('equal', common, path[1])
+        path[0] = old_pos
+        return new_pos
+
+    def add_to_path(path: list, op: str, old_pos_inc: int) -> list:
+        last = path[1]
+        if last and last[0] == op:
+            return [path[0] + old_pos_inc, (op, last[1] + 1, last[2])]
+        return [path[0] + old_pos_inc, (op, 1, last)]
+
+    def runs(last) -> list[tuple[str, int]]:
+        out = []
+        while last:
+            out.append(last[:2])
+            last = last[2]
+        return out[::-1]
+
+    # [old_pos, last run] for the furthest-reaching path on each diagonal.
+    best_path = {0: [-1, None]}
+    new_pos = extract_common(best_path[0], 0)
+    if best_path[0][0] + 1 >= old_len and new_pos + 1 >= new_len:
+        return [('equal', new_len)]
+
+    min_diagonal = -old_len - new_len
+    max_diagonal = old_len + new_len
+    for edit_length in range(1, old_len + new_len + 1):
+        for diagonal in range(
+            max(min_diagonal, -edit_length), min(max_diagonal, edit_length) + 1, 2
+        ):
+            remove_path = best_path.pop(diagonal - 1, None)
+            add_path = best_path.get(diagonal + 1)
+            can_add = add_path is not None and 0 <= add_path[0] - diagonal < new_len
+            can_remove = remove_path is not None and remove_path[0] + 1 < old_len
+            if not can_add and not can_remove:
+                best_path.pop(diagonal, None)
+                continue
+            if not can_remove or (can_add and remove_path[0] < add_path[0]):
+                path = add_to_path(add_path, 'insert', 0)
+            else:
+                path = add_to_path(remove_path, 'delete', 1)
+            new_pos = extract_common(path, diagonal)
+            if path[0] + 1 >= old_len and new_pos + 1 >= new_len:
+                return runs(path[1])
+            best_path[diagonal] = path
+            if path[0] + 1 >= old_len:
+                max_diagonal = min(max_diagonal, diagonal - 1)
+            if new_pos + 1 >= new_len:
+                min_diagonal = max(min_diagonal, diagonal + 1)
+    raise AssertionError('unreachable')
+
+
+def _add_span(spans: list[list], cls: str | None, start: int, limit: int):
+    # Merge consecutive runs with the same class (simplifyCodes).
+    if spans and spans[-1][0] == cls:
+        spans[-1][2] = limit
+    else:
+        spans.append([cls, start, limit])
+
+
+def compute_character_diffs(
+    before: str, after: str
+) -> tuple[list[list], list[list]] | None:
+    """Compute an intra-line diff.
+
+    Returns (before spans, after spans), or None if character differences are not
+    appropriate for this pair of lines.
+    """
+    before_words = split_into_words(before)
+    after_words = split_into_words(after)
+
+    ops = []  # (class, word) in display order
+    i = j = 0
+    for op, count in diff_arrays(before_words, after_words):
+        if op == 'delete':
+            ops += [('delete', w) for w in before_words[i : i + count]]
+            i += count
+        elif op == 'insert':
+            ops += [('insert', w) for w in after_words[j : j + count]]
+            j += count
+        else:
+            ops += [(None, w) for w in after_words[j : j + count]]
+            i += count
+            j += count
+
+    # Suppress character diffs if there's less than 50% character overlap.
+    # The one exception is pure whitespace diffs, which should always be shown.
+    equal_count = 0
+    char_count = 0
+    before_all_space = True
+    after_all_space = True
+    for cls, word in ops:
+        n = js_len(word)
+        if cls == 'insert':
+            after_all_space = after_all_space and _is_space(word)
+            char_count += n
+        elif cls == 'delete':
+            before_all_space = before_all_space and _is_space(word)
+            char_count += n
+        else:
+            equal_count += 2 * n
+            char_count += 2 * n
+            if before_all_space or after_all_space:
+                is_space = _is_space(word)
+                before_all_space = before_all_space and is_space
+                after_all_space = after_all_space and is_space
+    if equal_count < MIN_EQUAL_FRAC * char_count and not (
+        before_all_space and after_all_space
+    ):
+        return None
+
+    before_spans = []
+    after_spans = []
+    before_idx = 0
+    after_idx = 0
+    for cls, word in ops:
+        n = js_len(word)
+        if cls != 'insert':
+            _add_span(before_spans, cls, before_idx, before_idx + n)
+            before_idx += n
+        if cls != 'delete':
+            _add_span(after_spans, cls, after_idx, after_idx + n)
+            after_idx += n
+    return before_spans, after_spans
+
+
+def split_display_lines(text: str) -> list[str]:
+    """Split a file into lines like the UI does (see stringAsLines)."""
+    linebreak = '\r' if '\r' in text and '\n' not in text else '\n'
+    return [line.strip('\r\n') for line in text.split(linebreak)]
+
+
+def char_diffs_for_codes(
+    before_lines: Sequence[str],
+    after_lines: Sequence[str],
+    codes: Sequence[Code],
+    max_line_length: int,
+) -> list[list]:
+    """Character diffs for each row of the 'replace' codes.
+
+    Returns [before line, after line, before spans, after spans] for each row which
+    should have character diffs. Line numbers are 0-based; one of them is None if
+    the replace code has more lines on the other side. Lines which are longer than
+    max_line_length characters are skipped.
+    """
+    out = []
+    for code in codes:
+        if code.type != 'replace':
+            continue
+        before_start, before_limit = code.before
+        after_start, after_limit = code.after
+        num_before = before_limit - before_start
+        num_after = after_limit - after_start
+        for j in range(max(num_before, num_after)):
+            before_idx = before_start + j if j < num_before else None
+            after_idx = after_start + j if j < num_after else None
+            before = _line(before_lines, before_idx)
+            after = _line(after_lines, after_idx)
+            if len(before) > max_line_length or len(after) > max_line_length:
+                continue
+            spans = compute_character_diffs(
+                before.replace('\t', TAB), after.replace('\t', TAB)
+            )
+            if spans:
+                out.append([before_idx, after_idx, *spans])
+    return out
+
+
+def _line(lines: Sequence[str], idx: int | None) -> str:
+    if idx is None or idx >= len(lines):
+        return ''
+    return lines[idx]
@@ -6,20 +6,30 @@ Diff objects must have these properties:
     - b      (like a)
     - b_path (like a_path)
     - type   One of {'change', 'move', 'add', 'delete'}
+    - a_sha  git object id of the left file, or None if it's not known.
+    - b_sha  (like a_sha)
+    - a_stamp lrucache.file_stamp of a_path when a_sha was reported.
+    - b_stamp (like a_stamp)
 
 For concrete implementations, see githubdiff and localfilediff.
 """
 
+import dataclasses
+import fnmatch
 import logging
 import mimetypes
 import os
 import subprocess
-from typing import List
 
-from webdiff import util
+from binaryornot.check import is_binary
+
+from webdiff import chardiff, linediff, lineindex, lrucache, options, structdiff, util
+from webdiff.diskcache import DiskCache, make_key
 from webdiff.localfilediff import LocalFileDiff
 from webdiff.unified_diff import Code, diff_to_codes
 
+logger = logging.getLogger(__name__)
+
 
 def get_thin_dict(diff):
     """Returns a dict containing minimal data on the diff.
@@ -39,44 +49,133 @@ def get_thin_dict(diff):
 
 
 def fast_num_lines(path: str) -> int:
-    # See https://stackoverflow.com/q/9629179/388951 for the idea to use a Unix command.
-    # Unfortunately `wc -l` ignores the last line if there is no trailing newline. So
-    # instead, see https://stackoverflow.com/a/38870057/388951
+    """Count lines like `grep -c ''`, i.e. including an unterminated last line.
+
+    The count comes from a line index which is cached until the file changes, so
+    this is cheap to call again, e.g. when diff options change.
+    """
+    return lineindex.count_lines(path)
+
+
+def run_git_diff(a_path: str, b_path: str, git_diff_args=None):
+    """Run git diff --no-index on a file pair and convert the output to codes.
+
+    Returns None for a binary diff.
+    """
+    num_lines = fast_num_lines(b_path)
+    args = ['git', 'diff', '--no-index', *(git_diff_args or []), a_path, b_path]
+    logger.debug('Running git command: %s', args)
+    diff_output = subprocess.run(args, capture_output=True)
+    return diff_to_codes(diff_output.stdout.decode('utf8'), num_lines)
+
+
+def _normalize_key(normalize_json, config):
+    """The part of a cache key for how (and whether) files are normalized."""
+    return bool(normalize_json) and config['webdiff']['jsonDiff']
+
+
+def _is_normalized_json(path: str, norm_path: str) -> bool:
+    # .txt files are normalized by sorting their lines, and files which aren't
+    # valid JSON aren't normalized at all.
+    return norm_path != path and norm_path.endswith('.json')
+
+
+def _structural_diff_settings(git_diff_args, config) -> linediff.DiffSettings:
     try:
-        return int(subprocess.check_output(['grep', '-c', '', path]))
-    except subprocess.CalledProcessError as e:
-        if e.returncode == 1:
-            return 0  # grep -c returns an error code if there are no matches
-        raise
+        return linediff.parse_diff_args(git_diff_args, config['diff'])
+    except linediff.UnsupportedDiffArgs:
+        # Whitespace flags and such don't apply to structural diffs anyway.
+        return linediff.parse_diff_args(None, config['diff'])
+
+
+def _diff_lines(a_path: str, b_path: str, git_diff_args, config):
+    if config['webdiff']['diffEngine'] == 'python':
+        try:
+            settings = linediff.parse_diff_args(git_diff_args, config['diff'])
+            return linediff.diff_files(a_path, b_path, settings)
+        except linediff.UnsupportedDiffArgs as e:
+            logger.debug('Falling back to git diff: %s', e)
+    return run_git_diff(a_path, b_path, git_diff_args)
+
+
+# Bump this if the format of cached diff ops changes.
+DIFF_OPS_CACHE_VERSION = 2
 
 
 def get_diff_ops(
-    diff: LocalFileDiff, git_diff_args=None, normalize_json=False
-) -> List[Code]:
-    """Run git diff on the file pair and convert the results to a sequence of codes.
+    diff: LocalFileDiff,
+    git_diff_args=None,
+    normalize_json=False,
+    config=None,
+    cache: DiskCache | None = None,
+) -> list[Code]:
+    """Diff the file pair and convert the results to a sequence of codes.
 
-    git_diff_args is passed directly to git diff. It can be something like ['-w'] or
+    git_diff_args are flags for git diff. They can be something like ['-w'] or
     ['-w', '--diff-algorithm=patience'].
+
+    config is the git config (see options.get_config). Its webdiff.diffEngine
+    setting determines whether the diff is computed by running git or in-process.
+    The in-process engine falls back to git for flags that it doesn't support.
+
+    If a cache is provided, diff ops for file pairs are stored in it, keyed by the
+    contents of the files and the diff options.
     """
+    config = config or options.DEFAULTS
     # git diff --no-index doesn't follow symlinks. So we help it a bit.
     a_path = os.path.realpath(diff.a_path) if diff.a_path else ''
     b_path = os.path.realpath(diff.b_path) if diff.b_path else ''
+
+    key = None
+    if a_path and b_path and (cache or all(reported_shas(diff))):
+        a_sha, b_sha = blob_shas(diff)
+        if a_sha == b_sha:
+            # Identical files are a single equal run, as from git diff.
+            num_lines = fast_num_lines(
+                util.normalize_json(b_path) if normalize_json else b_path
+            )
+            return [Code('equal', before=(0, num_lines), after=(0, num_lines))]
+    if cache and a_path and b_path:
+        key = make_key(
+            DIFF_OPS_CACHE_VERSION,
+            a_sha,
+            b_sha,
+            git_diff_args or [],
+            _normalize_key(normalize_json, config),
+            config['diff'],
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return [
+                Code(c['type'], tuple(c['before']), tuple(c['after']), c['header'])
+                for c in cached
+            ]
+
+    structural = False
     if normalize_json:
-        a_path = a_path and util.normalize_json(a_path)
-        b_path = b_path and util.normalize_json(b_path)
+        norm_a_path = a_path and util.normalize_json(a_path)
+        norm_b_path = b_path and util.normalize_json(b_path)
+        structural = (
+            config['webdiff']['jsonDiff'] == 'structural'
+            and _is_normalized_json(a_path, norm_a_path)
+            and _is_normalized_json(b_path, norm_b_path)
+        )
+        a_path, b_path = norm_a_path, norm_b_path
 
     if a_path and b_path:
-        num_lines = fast_num_lines(b_path)
-        args = (
-            'git diff --no-index'.split(' ') + (git_diff_args or []) + [a_path, b_path]
-        )
-        logging.debug('Running git command: %s', args)
-        diff_output = subprocess.run(args, capture_output=True)
-        codes = diff_to_codes(diff_output.stdout.decode('utf8'), num_lines)
+        codes = None
+        if structural:
+            codes = structdiff.diff_files_in_worker(
+                a_path, b_path, _structural_diff_settings(git_diff_args, config)
+            )
+        if codes is None:
+            codes = _diff_lines(a_path, b_path, git_diff_args, config)
         if not codes:
             # binary diff; these are rendered as "binary file (123 bytes)"
             # so a 1-line replace is best here.
             codes = [Code(type='replace', before=(0, 1), after=(0, 1))]
+        if key:
+            cache.put(key, [dataclasses.asdict(code) for code in codes])
         return codes
     elif a_path:
         num_lines = fast_num_lines(a_path)
@@ -86,6 +185,69 @@ def get_diff_ops(
         return [Code('insert', before=(0, 0), after=(0, num_lines + 1))]
 
 
+# Bump this if the format of cached character diffs changes.
+CHAR_DIFFS_CACHE_VERSION = 1
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding='utf8', errors='replace', newline='') as f:
+        return f.read()
+
+
+def get_char_diffs(
+    diff: LocalFileDiff,
+    git_diff_args=None,
+    normalize_json=False,
+    config=None,
+    cache: DiskCache | None = None,
+) -> list[list]:
+    """Character-level diffs for the replaced lines of get_diff_ops(diff, ...).
+
+    See chardiff.char_diffs_for_codes for the format. If a cache is provided, these
+    are stored in it alongside the diff ops.
+    """
+    config = config or options.DEFAULTS
+    if not diff.a_path or not diff.b_path:
+        return []  # adds and deletes have no replaced lines
+    max_line_length = config['webdiff']['maxCharDiffLineLength']
+
+    key = None
+    if cache:
+        a_sha, b_sha = blob_shas(diff)
+        key = make_key(
+            CHAR_DIFFS_CACHE_VERSION,
+            'chars',
+            a_sha,
+            b_sha,
+            git_diff_args or [],
+            _normalize_key(normalize_json, config),
+            config['diff'],
+            max_line_length,
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    codes = get_diff_ops(diff, git_diff_args, normalize_json, config, cache)
+    a_path = os.path.realpath(diff.a_path)
+    b_path = os.path.realpath(diff.b_path)
+    if normalize_json:
+        a_path = util.normalize_json(a_path)
+        b_path = util.normalize_json(b_path)
+    if is_binary(a_path) or is_binary(b_path):
+        char_diffs = []
+    else:
+        char_diffs = chardiff.char_diffs_for_codes(
+            chardiff.split_display_lines(_read_text(a_path)),
+            chardiff.split_display_lines(_read_text(b_path)),
+            codes,
+            max_line_length,
+        )
+    if key:
+        cache.put(key, char_diffs)
+    return char_diffs
+
+
 def get_thick_dict(diff):
     """Similar to thin_dict, but includes potentially expensive fields."""
     d = get_thin_dict(diff)
@@ -97,10 +259,9 @@ def get_thick_dict(diff):
             d['image_b'] = util.image_metadata(diff.b_path)
         if d['a'] and d['b']:
             try:
-                d['are_same_pixels'], _ = util.generate_pdiff_image(
-                    diff.a_path, diff.b_path
-                )
-            except util.ImageMagickError:
+                pdiff = util.generate_pdiff_image(diff.a_path, diff.b_path)
+                d['are_same_pixels'] = pdiff.same_pixels
+            except util.ImageDiffError:
                 d['are_same_pixels'] = False
             except util.ImageMagickNotAvailableError:
                 pass
@@ -117,8 +278,49 @@ def get_thin_list(diffs, thick_idx=None):
     return ds
 
 
+def filter_thin_list(pairs, prefix=None, glob=None):
+    """Keep the thin dicts where either file name matches the filters.
+
+    prefix is a path prefix, e.g. 'src/' and glob is an fnmatch-style pattern
+    like '*.py' (note that '*' matches across directories).
+    """
+
+    def matches(name):
+        if not name:
+            return False
+        if prefix and not name.startswith(prefix):
+            return False
+        return not glob or fnmatch.fnmatchcase(name, glob)
+
+    if not prefix and not glob:
+        return pairs
+    return [p for p in pairs if matches(p['a']) or matches(p['b'])]
+
+
+def reported_shas(diff):
+    """The object ids git reported, or None for files that have changed since."""
+    a_sha = diff.a_sha
+    if a_sha and lrucache.file_stamp(diff.a_path) != diff.a_stamp:
+        a_sha = None
+    b_sha = diff.b_sha
+    if b_sha and lrucache.file_stamp(diff.b_path) != diff.b_stamp:
+        b_sha = None
+    return a_sha, b_sha
+
+
+def blob_shas(diff):
+    """Returns git object ids for both sides, hashing any that aren't known."""
+    a_sha, b_sha = reported_shas(diff)
+    a_sha = a_sha or util.git_blob_sha(os.path.realpath(diff.a_path))
+    b_sha = b_sha or util.git_blob_sha(os.path.realpath(diff.b_path))
+    return a_sha, b_sha
+
+
 def no_changes(diff):
     if diff.a_path and diff.b_path:
+        a_sha, b_sha = reported_shas(diff)
+        if a_sha and b_sha:
+            return a_sha == b_sha
         return util.are_files_identical(diff.a_path, diff.b_path)
     return False
 
@@ -147,22 +349,30 @@ def is_image_diff(diff):
     return False
 
 
-def find_diff_index(diffs, side, path):
+def _norm_path(p):
+    if p == '':
+        return ''
+    return os.path.normpath(p)
+
+
+def make_path_index(diffs):
+    """Map each side's (normalized) file names to their indices in diffs."""
+    index = {'a': {}, 'b': {}}
+    for idx, diff in enumerate(diffs):
+        # If a name appears more than once, the first diff wins.
+        index['a'].setdefault(_norm_path(diff.a), idx)
+        index['b'].setdefault(_norm_path(diff.b), idx)
+    return index
+
+
+def find_diff_index(diffs, side, path, path_index=None):
     """Given a side & path, find the index in the diff for it.
 
+    path_index is make_path_index(diffs). Pass it in to avoid rebuilding it.
+
     Returns None if there's no diff for the (side, path) pair.
     """
     assert side in ('a', 'b')
-
-    def norm(p):
-        if p == '':
-            return ''
-        return os.path.normpath(p)
-
-    path = norm(path)
-    for idx, diff in enumerate(diffs):
-        if side == 'a' and norm(diff.a) == path:
-            return idx
-        if side == 'b' and norm(diff.b) == path:
-            return idx
-    return None
+    if path_index is None:
+        path_index = make_path_index(diffs)
+    return path_index[side].get(_norm_path(path))
@@ -1,13 +1,23 @@
 """Compute the diff between two directories on local disk."""
 
+import contextlib
 import logging
 import os
 import shutil
 import subprocess
 import tempfile
+from collections.abc import Iterator
 
+from webdiff import lineindex
 from webdiff.localfilediff import LocalFileDiff
-from webdiff.unified_diff import parse_raw_diff
+from webdiff.unified_diff import (
+    Code,
+    diff_to_codes,
+    iter_nul_separated,
+    iter_raw_diff,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def contains_symlinks(dir: str):
@@ -42,32 +52,144 @@ def make_resolved_dir(dir: str, follow_symlinks=False) -> str:
     return temp_dir
 
 
-def gitdiff(a_dir: str, b_dir: str, webdiff_config):
-    extra_args = webdiff_config['extraDirDiffArgs']
-    cmd = 'git diff --raw -z --no-index --numstat'
-    if extra_args:
-        cmd += ' ' + extra_args
+@contextlib.contextmanager
+def _resolved_dirs(a_dir: str, b_dir: str):
+    """Yield copies of a_dir and b_dir with symlinks followed, if they have any."""
     a_dir_nosym = a_dir
     if contains_symlinks(a_dir):
         a_dir_nosym = make_resolved_dir(a_dir, follow_symlinks=True)
-        logging.debug(f'Inlined symlinks in left directory {a_dir} -> {a_dir_nosym}')
+        logger.debug(f'Inlined symlinks in left directory {a_dir} -> {a_dir_nosym}')
     b_dir_nosym = b_dir
     if contains_symlinks(b_dir):
         b_dir_nosym = make_resolved_dir(b_dir, follow_symlinks=True)
-        logging.debug(f'Inlined symlinks in right directory {b_dir} -> {b_dir_nosym}')
-    args = cmd.split(' ') + [a_dir_nosym, b_dir_nosym]
-    logging.debug('Running git command: %s', args)
-    diff_output = subprocess.run(args, capture_output=True)
+        logger.debug(f'Inlined symlinks in right directory {b_dir} -> {b_dir_nosym}')
+    try:
+        yield a_dir_nosym, b_dir_nosym
+    finally:
+        if a_dir != a_dir_nosym:
+            shutil.rmtree(a_dir_nosym)
+        if b_dir != b_dir_nosym:
+            shutil.rmtree(b_dir_nosym)
+
+
+def _unresolver(a_dir: str, b_dir: str, a_dir_nosym: str, b_dir_nosym: str):
+    """Make it look like the diff was between directories containing symlinks."""
+
+    def unresolve(text: str) -> str:
+        if a_dir != a_dir_nosym:
+            text = text.replace(a_dir_nosym, a_dir)
+        if b_dir != b_dir_nosym:
+            text = text.replace(b_dir_nosym, b_dir)
+        return text
+
+    return unresolve
+
+
+def _run_git_diff_dirs(args, a_dir: str, b_dir: str) -> str:
+    """Run git diff --no-index (args) a_dir b_dir, following symlinks."""
+    with _resolved_dirs(a_dir, b_dir) as (a_dir_nosym, b_dir_nosym):
+        args = [*args, a_dir_nosym, b_dir_nosym]
+        logger.debug('Running git command: %s', args)
+        diff_output = subprocess.run(args, capture_output=True)
     # git diff has an exit code of 1 on either a diff _or_ an error.
     # TODO: how to distinguish these cases?
     diff_stdout = diff_output.stdout.decode('utf8')
-    # Make it look like the diff was between directories containing symlinks.
-    # After this point, the resolved directories are no longer needed.
-    if a_dir != a_dir_nosym:
-        diff_stdout = diff_stdout.replace(a_dir_nosym, a_dir)
-        shutil.rmtree(a_dir_nosym)
-    if b_dir != b_dir_nosym:
-        diff_stdout = diff_stdout.replace(b_dir_nosym, b_dir)
-        shutil.rmtree(b_dir_nosym)
-    lines = parse_raw_diff(diff_stdout)
-    return [LocalFileDiff.from_diff_raw_line(line, a_dir, b_dir) for line in lines]
+    return _unresolver(a_dir, b_dir, a_dir_nosym, b_dir_nosym)(diff_stdout)
+
+
+def iter_gitdiff(a_dir: str, b_dir: str, webdiff_config) -> Iterator[LocalFileDiff]:
+    """Yield the diffs between two directories while git is still running."""
+    extra_args = webdiff_config['extraDirDiffArgs']
+    cmd = 'git diff --raw -z --no-index --numstat --no-abbrev'
+    if extra_args:
+        cmd += ' ' + extra_args
+    with _resolved_dirs(a_dir, b_dir) as (a_dir_nosym, b_dir_nosym):
+        unresolve = _unresolver(a_dir, b_dir, a_dir_nosym, b_dir_nosym)
+        args = [*cmd.split(' '), a_dir_nosym, b_dir_nosym]
+        logger.debug('Running git command: %s', args)
+        # git diff has an exit code of 1 on either a diff _or_ an error.
+        with subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ) as proc:
+            try:
+                parts = map(unresolve, iter_nul_separated(proc.stdout))
+                for line in iter_raw_diff(parts):
+                    yield LocalFileDiff.from_diff_raw_line(line, a_dir, b_dir)
+            finally:
+                proc.kill()  # in case the caller stopped early
+
+
+def gitdiff(a_dir: str, b_dir: str, webdiff_config) -> list[LocalFileDiff]:
+    return list(iter_gitdiff(a_dir, b_dir, webdiff_config))
+
+
+def _patch_header(diff: LocalFileDiff) -> str:
+    # git drops the leading slash from absolute paths in these headers.
+    a = (diff.a_path or diff.b_path).lstrip('/')
+    b = (diff.b_path or diff.a_path).lstrip('/')
+    return f'diff --git a/{a} b/{b}'
+
+
+def batch_diff_ops(
+    diffs: list[LocalFileDiff], webdiff_config, git_diff_args=None
+) -> dict[int, list[Code]]:
+    """Compute diff ops for many file pairs with a single git diff.
+
+    The diffs must come from gitdiff() on a single pair of directories. This runs
+    git diff --no-index on those directories and splits the patch up by file.
+
+    Returns a dict mapping diff indices to codes. Only file pairs with two sides
+    are included. Any which can't be matched to the patch, or which only changed
+    mode, are left out for get_diff_ops to handle.
+    """
+    if not diffs:
+        return {}
+    extra_args = webdiff_config['extraDirDiffArgs']
+    args = [
+        'git',
+        '-c',
+        'core.quotePath=false',
+        'diff',
+        '--no-index',
+        *(extra_args.split(' ') if extra_args else []),
+        *(git_diff_args or []),
+    ]
+    patch = _run_git_diff_dirs(args, diffs[0].a_root, diffs[0].b_root)
+
+    sections: dict[str, list[str]] = {}
+    current = None
+    for line in patch.splitlines(keepends=True):
+        if line.startswith('diff --git '):
+            current = sections.setdefault(line.rstrip('\n'), [])
+        if current is not None:
+            current.append(line)
+
+    headers = [_patch_header(d) for d in diffs]
+    # If every section in the patch belongs to a file pair, then pairs without a
+    # section are identical. Otherwise, some headers didn't match (e.g. because
+    # git quoted the path) and there's no way to tell which pairs they belong to.
+    all_matched = set(sections) <= set(headers)
+
+    ops = {}
+    for idx, (d, header) in enumerate(zip(diffs, headers)):
+        if not (d.a_path and d.b_path):
+            continue
+        section = sections.get(header)
+        if section is None and not all_matched:
+            continue
+        num_lines = lineindex.count_lines(d.b_path)
+        codes = None
+        if section:
+            codes = diff_to_codes(''.join(section), num_lines)
+            if not codes and any(line.startswith('Binary files ') for line in section):
+                # This matches what get_diff_ops does for binary files.
+                codes = [Code(type='replace', before=(0, 1), after=(0, 1))]
+            elif not codes and any(line.startswith('old mode ') for line in section):
+                # A change in mode only. Leave this to get_diff_ops, which can
+                # tell that the contents are identical (or not) for itself.
+                continue
+        if not codes:
+            # Identical contents, e.g. a pure rename (a section with no hunks).
+            codes = [Code('equal', before=(0, num_lines), after=(0, num_lines))]
+        ops[idx] = codes
+    return ops
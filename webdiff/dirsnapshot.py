@@ -0,0 +1,249 @@
+"""Reuse the previous directory diff's results when webdiff is re-run.
+
+After diffing two directories, webdiff saves a snapshot of the results: the
+file pairs with their blob SHAs and diffstats, plus the blob SHA of every file
+keyed by its identity on disk (real path, size, mtime and inode). On the next
+run, files whose identity hasn't changed aren't hashed again, and file pairs
+whose blob SHAs match the snapshot are reused as-is. Only the remaining files
+that differ are hard linked (or copied) into a scratch directory and diffed with
+git, which also avoids copying whole trees to resolve symlinks. Since git only
+sees those files, options like --find-copies-harder in extraDirDiffArgs won't
+find copies of unchanged files.
+
+The file pairs are saved per pair of directories (by real path). The blob SHAs
+of files are shared between them, since they're keyed by each file's identity.
+That still helps with git difftool, which makes new temp directories on every
+run, but fills one side with symlinks into the working tree. The SHAs in the
+returned diffs are only trusted while the files are unchanged on disk (see
+diff.reported_shas), so editing a file after the diff is still picked up.
+"""
+
+import functools
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+
+from webdiff import dirdiff, util
+from webdiff.diskcache import DiskCache, make_key
+from webdiff.localfilediff import LocalFileDiff
+
+logger = logging.getLogger(__name__)
+
+# Bump this if the format of snapshots changes.
+SNAPSHOT_VERSION = 2
+
+# Files modified this recently could change again without changing their size
+# or mtime, so their hashes aren't remembered (like git's "racy" index entries).
+RACY_SECS = 2
+
+
+@dataclass
+class FileInfo:
+    real_path: str
+    stamp: list[int]
+    """[size, mtime_ns, inode] of the real file."""
+    sha: str
+    """git blob id of the file's contents."""
+    executable: bool
+
+
+def scan_dir(root: str, known: dict[str, list]) -> dict[str, FileInfo]:
+    """Find and hash every file under root, following symlinks to files.
+
+    known maps real paths to [size, mtime_ns, inode, sha] from the last snapshot.
+    Files with a matching stamp aren't hashed again.
+    """
+    files = {}
+    # Calling realpath on every file would lstat each component of its path.
+    # Symlinks (e.g. from git difftool) tend to point into a few directories, so
+    # resolve those once. A link to a link still works, since the stat, hash and
+    # hard link all follow it; it's just not the canonical path.
+    real_dirs = functools.lru_cache(maxsize=None)(os.path.realpath)
+
+    def scan(path: str, real_dir: str, rel_dir: str):
+        with os.scandir(path) as entries:
+            for entry in entries:
+                rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if entry.is_dir():
+                    # Like os.walk, don't descend into symlinked directories.
+                    if not entry.is_symlink():
+                        scan(entry.path, os.path.join(real_dir, entry.name), rel)
+                    continue
+                if entry.is_symlink():
+                    target = os.path.join(path, os.readlink(entry.path))
+                    real_path = os.path.join(
+                        real_dirs(os.path.dirname(target)), os.path.basename(target)
+                    )
+                else:
+                    real_path = os.path.join(real_dir, entry.name)
+                st = entry.stat()
+                stamp = [st.st_size, st.st_mtime_ns, st.st_ino]
+                known_entry = known.get(real_path)
+                if known_entry and known_entry[:3] == stamp:
+                    sha = known_entry[3]
+                else:
+                    sha = util.git_blob_sha(real_path)
+                files[rel] = FileInfo(real_path, stamp, sha, bool(st.st_mode & 0o111))
+
+    scan(root, os.path.realpath(root), '')
+    return files
+
+
+def _sha(files: dict[str, FileInfo], rel: str):
+    f = files.get(rel)
+    return f.sha if f else None
+
+
+def _entry(d: LocalFileDiff, a_files, b_files) -> dict:
+    return {
+        'a': d.a,
+        'b': d.b,
+        'a_sha': _sha(a_files, d.a),
+        'b_sha': _sha(b_files, d.b),
+        'is_move': d.is_move,
+        'num_add': d.num_add,
+        'num_delete': d.num_delete,
+    }
+
+
+def _link_or_copy(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+def _diff_subset(
+    a_files: dict[str, FileInfo],
+    b_files: dict[str, FileInfo],
+    a_rels: list[str],
+    b_rels: list[str],
+    webdiff_config,
+) -> list[dict]:
+    """Run git on copies of just these files and return their snapshot entries."""
+    temp_dir = tempfile.mkdtemp(prefix='webdiff')
+    try:
+        a_dir = os.path.join(temp_dir, 'a')
+        b_dir = os.path.join(temp_dir, 'b')
+        os.mkdir(a_dir)
+        os.mkdir(b_dir)
+        for rel in a_rels:
+            _link_or_copy(a_files[rel].real_path, os.path.join(a_dir, rel))
+        for rel in b_rels:
+            _link_or_copy(b_files[rel].real_path, os.path.join(b_dir, rel))
+        diffs = dirdiff.gitdiff(a_dir, b_dir, webdiff_config)
+        return [_entry(d, a_files, b_files) for d in diffs]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _one_sided(files: dict[str, FileInfo], other: dict[str, FileInfo]):
+    return {rel: f.sha for rel, f in files.items() if rel not in other}
+
+
+def _git_order(entry: dict) -> list[bytes]:
+    """Sort key for the order that git diff --no-index reports files in.
+
+    git lists each directory's entries by name (bytewise) and recurses into
+    subdirectories as it reaches them, so 'a/b' comes before 'a-c'. Renames go
+    by their new name.
+    """
+    return os.fsencode(entry['b'] or entry['a']).split(os.fsencode(os.sep))
+
+
+def diff_dirs(
+    a_dir: str, b_dir: str, webdiff_config, snapshot: dict
+) -> tuple[list[LocalFileDiff], dict]:
+    """Diff two directories, reusing what it can from the previous snapshot.
+
+    Returns the diffs (in the same order as dirdiff.gitdiff) and a new snapshot.
+    """
+    known = snapshot.get('files', {})
+    a_files = scan_dir(a_dir, known)
+    b_files = scan_dir(b_dir, known)
+    only_a = _one_sided(a_files, b_files)
+    only_b = _one_sided(b_files, a_files)
+
+    previous = {(e['a'], e['b']): e for e in snapshot.get('diffs', [])}
+    entries = []
+    redo = []
+    for rel in a_files.keys() & b_files.keys():
+        fa, fb = a_files[rel], b_files[rel]
+        if fa.sha == fb.sha and fa.executable == fb.executable:
+            continue  # git doesn't report identical files
+        e = previous.get((rel, rel))
+        if e and (e['a_sha'], e['b_sha']) == (fa.sha, fb.sha) and fa.sha != fb.sha:
+            entries.append(e)
+        else:
+            redo.append(rel)
+    # Adds and deletes may pair up as renames, so they're only reused together.
+    one_sided = [e for e in previous.values() if e['a'] != e['b']]
+    if (only_a, only_b) == (snapshot.get('only_a'), snapshot.get('only_b')) and all(
+        (e['a_sha'], e['b_sha']) == (_sha(a_files, e['a']), _sha(b_files, e['b']))
+        for e in one_sided
+    ):
+        entries += one_sided
+        a_rels, b_rels = redo, redo
+    else:
+        a_rels, b_rels = [*redo, *only_a], [*redo, *only_b]
+
+    if a_rels or b_rels:
+        # Even on the first run, this only links the files which differ.
+        entries += _diff_subset(a_files, b_files, a_rels, b_rels, webdiff_config)
+    logger.debug(
+        f'Diffed {len(a_rels) + len(b_rels)} of {len(a_files) + len(b_files)} files'
+    )
+    entries.sort(key=_git_order)
+
+    racy = (time.time() - RACY_SECS) * 1e9
+    new_snapshot = {
+        'files': {
+            f.real_path: [*f.stamp, f.sha]
+            for files in (a_files, b_files)
+            for f in files.values()
+            if f.stamp[1] < racy
+        },
+        'diffs': entries,
+        'only_a': only_a,
+        'only_b': only_b,
+    }
+    diffs = [
+        LocalFileDiff(
+            a_dir,
+            os.path.join(a_dir, e['a']) if e['a'] else '',
+            b_dir,
+            os.path.join(b_dir, e['b']) if e['b'] else '',
+            is_move=e['is_move'],
+            num_add=e['num_add'],
+            num_delete=e['num_delete'],
+            a_sha=e['a_sha'],
+            b_sha=e['b_sha'],
+        )
+        for e in entries
+    ]
+    return diffs, new_snapshot
+
+
+def gitdiff(a_dir: str, b_dir: str, webdiff_config, cache: DiskCache):
+    """Like dirdiff.gitdiff, but reuses (and updates) the snapshot in the cache."""
+    files_key = make_key('dir-files', SNAPSHOT_VERSION)
+    diffs_key = make_key(
+        'dirs',
+        SNAPSHOT_VERSION,
+        os.path.realpath(a_dir),
+        os.path.realpath(b_dir),
+        webdiff_config['extraDirDiffArgs'],
+    )
+    snapshot = {**(cache.get(diffs_key) or {}), 'files': cache.get(files_key) or {}}
+    try:
+        diffs, snapshot = diff_dirs(a_dir, b_dir, webdiff_config, snapshot)
+    except OSError as e:
+        logger.warning(f'Unable to diff directories incrementally: {e}')
+        return dirdiff.gitdiff(a_dir, b_dir, webdiff_config)
+    cache.put(files_key, snapshot.pop('files'))
+    cache.put(diffs_key, snapshot)
+    return diffs
@@ -0,0 +1,109 @@
+"""A size-bounded, persistent cache of JSON values.
+
+This is used to remember diff ops across webdiff sessions. Each entry is stored
+in its own file, so concurrent webdiff processes can share a cache directory.
+Reading an entry bumps its mtime, and the least-recently used entries are evicted
+when the cache grows beyond its size limit.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    return os.path.join(base, 'webdiff')
+
+
+def make_key(*parts) -> str:
+    """Hash a JSON-serializable key down to a file name."""
+    return hashlib.sha256(json.dumps(parts).encode('utf8')).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._size = None  # total bytes on disk; computed lazily
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key + '.json')
+
+    def _entries(self):
+        """Returns (mtime, size, path) for every entry in the cache."""
+        out = []
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return out
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # evicted by another process
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def get(self, key: str) -> Any | None:
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key: str, value: Any):
+        if self.max_bytes <= 0:
+            return
+        data = json.dumps(value, separators=(',', ':')).encode('utf8')
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # Write to a temp file and rename so that readers never see a partial entry.
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError as e:
+            logger.debug(f'Unable to write to cache {self.path}: {e}')
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Delete least-recently used entries until the cache is under 90% full."""
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        logger.debug(f'Evicted cache entries; {self.path} is now {size} bytes')
+        self._size = size
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._size = 0
@@ -6,6 +6,7 @@ This will create symlinks or clone git repos as needed.
 # Use this PR for testing to see all four types of change at once:
 # https://github.com/danvk/test-repo/pull/2/
 
+import functools
 import os
 import re
 import subprocess
@@ -14,10 +15,8 @@ from collections import OrderedDict
 
 from github import Github, UnknownObjectException
 
-from webdiff.util import memoize
 
-
-@memoize
+@functools.cache
 def github():
     """Returns a GitHub API object with auth, if it's available."""
 
@@ -9,8 +9,8 @@ import os
 import tempfile
 import sys
 
-from webdiff.util import memoize
 from webdiff.github_fetcher import github
+from webdiff.lrucache import lru_cache
 
 
 class GitHubDiff(object):
@@ -28,6 +28,10 @@ class GitHubDiff(object):
         }[github_file.status]
         self._a_path = ''
         self._b_path = ''
+        self.a_sha = None
+        self.b_sha = None
+        self.a_stamp = None
+        self.b_stamp = None
 
     @property
     def a(self):
@@ -45,7 +49,7 @@ class GitHubDiff(object):
         else:
             return self._file.filename
 
-    # NB: these are @memoize'd via fetch()
+    # NB: these are cached via fetch()
     @property
     def a_path(self):
         return fetch(self._pr.base.repo, self.a, self._pr.base.sha)
@@ -76,7 +80,9 @@ def fetch_pull_request(owner, repo, num):
     return [GitHubDiff(pr, f) for f in files]
 
 
-@memoize
+@lru_cache(
+    maxsize=4096, key=lambda repo, filename, sha: (repo.full_name, filename, sha)
+)
 def fetch(repo, filename, sha):
     if filename == '':
         return ''
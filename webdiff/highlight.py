@@ -0,0 +1,143 @@
+"""Server-side syntax highlighting for files which are too large for the browser.
+
+Files are tokenized with Pygments, if it's installed. The token runs for each
+line are cached by the file's content hash, so each side is only tokenized once
+and the UI can fetch them a range of lines at a time. Pygments token types are
+mapped to highlight.js classes so that the UI's themes apply to them.
+"""
+
+from binaryornot.check import is_binary
+
+from webdiff import util
+from webdiff.chardiff import js_len
+from webdiff.lrucache import lru_cache
+
+try:
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.token import Token
+    from pygments.util import ClassNotFound
+except ImportError:
+    Token = None
+
+if Token is not None:
+    # More specific token types take precedence over their parents.
+    HLJS_CLASSES = {
+        Token.Comment: 'hljs-comment',
+        Token.Comment.Preproc: 'hljs-meta',
+        Token.Comment.PreprocFile: 'hljs-string',
+        Token.Keyword: 'hljs-keyword',
+        Token.Keyword.Constant: 'hljs-literal',
+        Token.Keyword.Type: 'hljs-type',
+        Token.Name.Attribute: 'hljs-attr',
+        Token.Name.Builtin: 'hljs-built_in',
+        Token.Name.Builtin.Pseudo: 'hljs-variable language_',
+        Token.Name.Class: 'hljs-title class_',
+        Token.Name.Decorator: 'hljs-meta',
+        Token.Name.Exception: 'hljs-title class_',
+        Token.Name.Function: 'hljs-title function_',
+        Token.Name.Tag: 'hljs-name',
+        Token.Name.Variable: 'hljs-variable',
+        Token.Literal.Number: 'hljs-number',
+        Token.Literal.String: 'hljs-string',
+        Token.Literal.String.Escape: 'hljs-char escape_',
+        Token.Literal.String.Regex: 'hljs-regexp',
+        Token.Literal.String.Symbol: 'hljs-symbol',
+        Token.Generic.Deleted: 'hljs-deletion',
+        Token.Generic.Emph: 'hljs-emphasis',
+        Token.Generic.Heading: 'hljs-section',
+        Token.Generic.Inserted: 'hljs-addition',
+        Token.Generic.Strong: 'hljs-strong',
+        Token.Generic.Subheading: 'hljs-section',
+    }
+else:
+    HLJS_CLASSES = {}
+
+# Memoized HLJS_CLASSES lookups, including inherited classes.
+_class_for_type: dict[object, str | None] = {}
+
+
+def is_available() -> bool:
+    return Token is not None
+
+
+def css_class(ttype) -> str | None:
+    """The highlight.js class for a Pygments token type, if it has one."""
+    cls = _class_for_type.get(ttype, False)
+    if cls is False:
+        t = ttype
+        while t is not None and t not in HLJS_CLASSES:
+            t = t.parent
+        cls = _class_for_type[ttype] = HLJS_CLASSES.get(t)
+    return cls
+
+
+def get_lexer(name: str):
+    """A Pygments lexer for the file name, or None if it's not a known language."""
+    try:
+        # Offsets have to line up with the file as the UI shows it.
+        return get_lexer_for_filename(name, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+def tokenize_text(text: str, lexer) -> list[list[list]]:
+    """Split text into lines and return the highlighted runs on each of them.
+
+    Each run is [start, limit, class], with offsets in UTF-16 code units like
+    JavaScript strings. Unhighlighted text isn't included.
+    """
+    lines = [[]]
+    col = 0
+    for ttype, value in lexer.get_tokens(text):
+        cls = css_class(ttype)
+        for i, part in enumerate(value.split('\n')):
+            if i:
+                lines.append([])
+                col = 0
+            if not part:
+                continue
+            n = js_len(part)
+            runs = lines[-1]
+            if cls and runs and runs[-1][2] == cls and runs[-1][1] == col:
+                runs[-1][1] = col + n
+            elif cls:
+                runs.append([col, col + n, cls])
+            col += n
+    return lines
+
+
+def _tokens_size(tokens) -> int:
+    # A rough estimate of the memory used by the runs.
+    if tokens is None:
+        return 0
+    lines = tokens[1]
+    return 64 * len(lines) + 120 * sum(len(runs) for runs in lines)
+
+
+@lru_cache(
+    maxsize=16,
+    max_bytes=256 * 1024 * 1024,
+    sizeof=_tokens_size,
+    key=lambda path, name: (util.contentHash(path), name),
+)
+def tokenize_file(path: str, name: str) -> tuple[str, list[list[list]]] | None:
+    """The language and highlighted runs for each line of the file at path.
+
+    name is the file's name in the diff, which determines its language. Returns
+    None if the language isn't known or the file is binary.
+    """
+    lexer = get_lexer(name)
+    if lexer is None or is_binary(path):
+        return None
+    with open(path, encoding='utf8', errors='replace', newline='') as f:
+        text = f.read()
+    return lexer.name, tokenize_text(text, lexer)
+
+
+def highlight_lines(path: str, name: str, start: int, end: int):
+    """The highlighted runs for lines [start, end) of the file, for the UI."""
+    tokens = tokenize_file(path, name)
+    if tokens is None:
+        return {'language': None, 'start': start, 'lines': []}
+    language, lines = tokens
+    return {'language': language, 'start': start, 'lines': lines[start:end]}
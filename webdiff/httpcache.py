@@ -0,0 +1,190 @@
+"""HTTP validators and compression for webdiff's responses.
+
+File contents and images are streamed from disk with ETags from their size and
+mtime, so that revisiting a file costs a 304 rather than a full download.
+Compressible files are gzipped as they're streamed. Other text responses are built
+in memory and compressed with brotli (if it's installed) or gzip.
+"""
+
+import asyncio
+import gzip
+import os
+import zlib
+
+import aiohttp.web_request
+from aiohttp import hdrs, web
+
+from webdiff import util
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compressing tiny responses isn't worth the overhead.
+MIN_COMPRESS_BYTES = 1024
+# Files are read (and compressed) this much at a time.
+_FILE_CHUNK_SIZE = 256 * 1024
+# For URLs which change whenever their content does.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Clients may cache these, but need to check that they're still current.
+REVALIDATE = 'no-cache'
+
+_COMPRESSIBLE_TYPES = {
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+}
+
+
+def file_etag(path: str) -> str:
+    """An ETag for the file, which changes whenever its contents do."""
+    return util.contentHash(path).hex()[:32]
+
+
+def is_not_modified(request: aiohttp.web_request.Request, etag: str) -> bool:
+    """Does the client already have the version of the resource with this ETag?"""
+    etags = request.if_none_match
+    if not etags:
+        return False
+    return any(e.value in (etag, '*') for e in etags)
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE) -> web.Response:
+    response = web.Response(status=304, headers={'Cache-Control': cache_control})
+    response.etag = etag
+    return response
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith('text/') or content_type in _COMPRESSIBLE_TYPES
+
+
+def _accepted_codings(request: aiohttp.web_request.Request) -> set[str]:
+    accept = request.headers.get(hdrs.ACCEPT_ENCODING, '').lower()
+    return {c.split(';')[0].strip() for c in accept.split(',')}
+
+
+def choose_encoding(request: aiohttp.web_request.Request) -> str | None:
+    """Pick the best content coding that the client accepts, if any."""
+    codings = _accepted_codings(request)
+    if brotli and 'br' in codings:
+        return 'br'
+    if 'gzip' in codings:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str | None) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def encoding_for(
+    request: aiohttp.web_request.Request, content_type: str, size: int
+) -> str | None:
+    if size < MIN_COMPRESS_BYTES or not is_compressible(content_type):
+        return None
+    return choose_encoding(request)
+
+
+def make_response(
+    body: bytes,
+    encoding: str | None,
+    content_type: str,
+    charset: str | None = None,
+    etag: str | None = None,
+    cache_control: str | None = None,
+) -> web.Response:
+    """A response with an already-compressed body."""
+    response = web.Response(body=body, content_type=content_type, charset=charset)
+    response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    if encoding:
+        response.headers[hdrs.CONTENT_ENCODING] = encoding
+    if etag:
+        response.etag = etag
+    if cache_control:
+        response.headers[hdrs.CACHE_CONTROL] = cache_control
+    return response
+
+
+def compressed_response(
+    request: aiohttp.web_request.Request,
+    body: bytes,
+    content_type: str,
+    charset: str | None = None,
+) -> web.Response:
+    """Compress a (small) in-memory body for the client."""
+    encoding = encoding_for(request, content_type, len(body))
+    return make_response(compress(body, encoding), encoding, content_type, charset)
+
+
+def _stamp_etag(st: os.stat_result) -> str:
+    """An ETag from a file's mtime and size, like aiohttp's FileResponse uses."""
+    return f'{st.st_mtime_ns:x}-{st.st_size:x}'
+
+
+def _next_gzip_chunk(f, compressor) -> tuple[bytes, bool]:
+    """Read and compress the next chunk of a file. Returns (data, at_eof)."""
+    chunk = f.read(_FILE_CHUNK_SIZE)
+    if chunk:
+        return compressor.compress(chunk), False
+    return compressor.flush(), True
+
+
+async def file_response(
+    request: aiohttp.web_request.Request,
+    path: str,
+    content_type: str,
+    cache_control: str = REVALIDATE,
+) -> web.StreamResponse:
+    """Stream a file from disk, without ever reading all of it into memory.
+
+    The ETag comes from the file's size and mtime. Compressible files are gzipped
+    as they're streamed (there's no streaming brotli). Others are sent with
+    FileResponse, which handles ETags and If-None-Match itself.
+    """
+    headers = {
+        hdrs.CONTENT_TYPE: content_type,
+        hdrs.CACHE_CONTROL: cache_control,
+        hdrs.VARY: hdrs.ACCEPT_ENCODING,
+    }
+    st = os.stat(path)
+    if (
+        st.st_size < MIN_COMPRESS_BYTES
+        or not is_compressible(content_type.split(';')[0])
+        or 'gzip' not in _accepted_codings(request)
+    ):
+        return web.FileResponse(path, headers=headers)
+
+    etag = _stamp_etag(st)
+    if is_not_modified(request, etag):
+        return not_modified(etag, cache_control)
+    response = web.StreamResponse(headers={**headers, hdrs.CONTENT_ENCODING: 'gzip'})
+    response.etag = etag
+    # wbits=31 writes a gzip header and trailer around the deflate stream.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await response.prepare(request)
+        at_eof = False
+        while not at_eof:
+            data, at_eof = await asyncio.to_thread(_next_gzip_chunk, f, compressor)
+            if data:
+                await response.write(data)
+    finally:
+        f.close()
+    await response.write_eof()
+    return response
+
+
+async def set_static_cache_control(
+    request: aiohttp.web_request.Request, response: web.StreamResponse
+):
+    """on_response_prepare hook: versioned static assets never change."""
+    if request.path.startswith('/static/') and response.status in (200, 304):
+        versioned = 'v' in request.query
+        response.headers[hdrs.CACHE_CONTROL] = IMMUTABLE if versioned else REVALIDATE
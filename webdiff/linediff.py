@@ -0,0 +1,1102 @@
+"""In-process line diff engine.
+
+This is a port of the parts of git's xdiff library that `git diff --no-index`
+uses for a single pair of files: the Myers, patience and histogram algorithms,
+the "compaction" pass (including the indent heuristic) and hunk emission. It
+produces the same hunks as git for the options that webdiff passes (-w, -b, -U
+and --diff-algorithm) without forking git or re-parsing a unified diff.
+
+Options that it doesn't understand raise UnsupportedDiffArgs; callers should
+fall back to running git in that case.
+"""
+
+import bisect
+import os
+import re
+import stat
+import sys
+from collections import Counter
+from dataclasses import dataclass
+
+from webdiff.unified_diff import Code, Hunk, finish_codes, hunks_to_codes
+
+
+class UnsupportedDiffArgs(Exception):
+    pass
+
+
+ALGORITHMS = ('myers', 'minimal', 'patience', 'histogram')
+
+# git treats files larger than core.bigFileThreshold as binary.
+BIG_FILE_THRESHOLD = 512 * 1024 * 1024
+# git only looks for NUL bytes in the first few bytes of a file.
+FIRST_FEW_BYTES = 8000
+
+# Whitespace, according to git's (locale-independent) isspace.
+_WHITESPACE = b' \t\n\r'
+_WHITESPACE_RE = re.compile(rb'[ \t\n\r]+')
+
+# Tuning constants from xdiff/xdiffi.c and xdiff/xprepare.c
+_MAX_COST_MIN = 256
+_HEUR_MIN_COST = 256
+_SNAKE_CNT = 20
+_K_HEUR = 4
+_MAX_EQLIMIT = 1024
+_SIMSCAN_WINDOW = 100
+_KPDIS_RUN = 4
+_LINE_MAX = sys.maxsize
+_MAX_CHAIN_LENGTH = 64
+_NON_UNIQUE = -1
+
+
+@dataclass
+class DiffSettings:
+    """The subset of `git diff` options that this engine implements."""
+
+    algorithm: str = 'myers'
+    context: int = 3
+    inter_hunk_context: int = 0
+    ignore_all_space: bool = False
+    ignore_space_change: bool = False
+    indent_heuristic: bool = True
+
+
+def _parse_int_arg(arg: str, value: str) -> int:
+    try:
+        n = int(value)
+    except ValueError:
+        raise UnsupportedDiffArgs(f'Unable to parse {arg}') from None
+    if n < 0:
+        raise UnsupportedDiffArgs(f'Unable to parse {arg}')
+    return n
+
+
+def _parse_algorithm(name: str) -> str:
+    name = name.lower()
+    if name == 'default':
+        return 'myers'
+    if name not in ALGORITHMS:
+        raise UnsupportedDiffArgs(f'Unknown diff algorithm {name}')
+    return name
+
+
+def parse_diff_args(git_diff_args=None, diff_config=None) -> DiffSettings:
+    """Convert git diff flags (and the [diff] git config section) to settings.
+
+    Raises UnsupportedDiffArgs for anything that this engine can't reproduce.
+    """
+    settings = DiffSettings()
+    if diff_config:
+        if diff_config.get('algorithm'):
+            settings.algorithm = _parse_algorithm(diff_config['algorithm'])
+        if diff_config.get('context') is not None:
+            settings.context = diff_config['context']
+        if diff_config.get('interHunkContext') is not None:
+            settings.inter_hunk_context = diff_config['interHunkContext']
+        if diff_config.get('indentHeuristic') is not None:
+            settings.indent_heuristic = diff_config['indentHeuristic']
+
+    args = [arg for arg in (git_diff_args or []) if arg]
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ('-w', '--ignore-all-space'):
+            settings.ignore_all_space = True
+        elif arg in ('-b', '--ignore-space-change'):
+            settings.ignore_space_change = True
+        elif arg == '--diff-algorithm' and i + 1 < len(args):
+            i += 1
+            settings.algorithm = _parse_algorithm(args[i])
+        elif arg.startswith('--diff-algorithm='):
+            settings.algorithm = _parse_algorithm(arg.split('=', 1)[1])
+        elif arg in ('--minimal', '--patience', '--histogram'):
+            settings.algorithm = arg[2:]
+        elif arg.startswith('-U') and len(arg) > 2:
+            settings.context = _parse_int_arg(arg, arg[2:])
+        elif arg.startswith('--unified='):
+            settings.context = _parse_int_arg(arg, arg.split('=', 1)[1])
+        elif arg.startswith('--inter-hunk-context='):
+            settings.inter_hunk_context = _parse_int_arg(arg, arg.split('=', 1)[1])
+        elif arg == '--indent-heuristic':
+            settings.indent_heuristic = True
+        elif arg == '--no-indent-heuristic':
+            settings.indent_heuristic = False
+        elif arg.startswith(('--find-renames', '--find-copies', '-M', '-C')):
+            pass  # rename detection has no effect on a single pair of files.
+        else:
+            raise UnsupportedDiffArgs(f'Unsupported git diff option: {arg}')
+        i += 1
+    return settings
+
+
+def split_lines(data: bytes) -> list[bytes]:
+    """Split a file into lines, keeping the trailing newlines like git does."""
+    lines = data.split(b'\n')
+    last = lines.pop()
+    lines = [line + b'\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def is_binary(data: bytes) -> bool:
+    return len(data) > BIG_FILE_THRESHOLD or b'\0' in data[:FIRST_FEW_BYTES]
+
+
+def _line_key(line: bytes, settings: DiffSettings) -> bytes:
+    if settings.ignore_all_space:
+        return _WHITESPACE_RE.sub(b'', line)
+    if settings.ignore_space_change:
+        return _WHITESPACE_RE.sub(b' ', line.rstrip(_WHITESPACE))
+    return line
+
+
+def _classify(
+    lines1: list[bytes], lines2: list[bytes], settings: DiffSettings
+) -> tuple[list[int], list[int]]:
+    """Map each line to an equivalence class id (xdl_classify_record)."""
+    classes = {}
+    ha1 = [classes.setdefault(_line_key(x, settings), len(classes)) for x in lines1]
+    ha2 = [classes.setdefault(_line_key(x, settings), len(classes)) for x in lines2]
+    return ha1, ha2
+
+
+# --- Myers ---------------------------------------------------------------------
+
+
+def _bogosqrt(n: int) -> int:
+    i = 1
+    while n > 0:
+        n >>= 2
+        i <<= 1
+    return i
+
+
+def _clean_mmatch(dis: list[int], i: int, s: int, e: int) -> bool:
+    """Should a line with many matches be discarded? (xdl_clean_mmatch)"""
+    if i - s > _SIMSCAN_WINDOW:
+        s = i - _SIMSCAN_WINDOW
+    if e - i > _SIMSCAN_WINDOW:
+        e = i + _SIMSCAN_WINDOW
+
+    rdis0 = 0
+    rpdis0 = 1
+    r = 1
+    while i - r >= s:
+        if not dis[i - r]:
+            rdis0 += 1
+        elif dis[i - r] == 2:
+            rpdis0 += 1
+        else:
+            break
+        r += 1
+    if rdis0 == 0:
+        return False
+
+    rdis1 = 0
+    rpdis1 = 1
+    r = 1
+    while i + r <= e:
+        if not dis[i + r]:
+            rdis1 += 1
+        elif dis[i + r] == 2:
+            rpdis1 += 1
+        else:
+            break
+        r += 1
+    if rdis1 == 0:
+        return False
+
+    rdis1 += rdis0
+    rpdis1 += rpdis0
+    return rpdis1 * _KPDIS_RUN < rpdis1 + rdis1
+
+
+def _cleanup_records(ha, rchg, dstart, dend, other_counts):
+    """Drop lines that can't (or are unlikely to) match (xdl_cleanup_records).
+
+    Returns the class ids of the remaining lines and their original indices.
+    """
+    mlim = min(_bogosqrt(len(ha)), _MAX_EQLIMIT)
+    dis = [0] * len(ha)
+    for i in range(dstart, dend + 1):
+        nm = other_counts.get(ha[i], 0)
+        dis[i] = 0 if nm == 0 else 2 if nm >= mlim else 1
+
+    reduced = []
+    rindex = []
+    for i in range(dstart, dend + 1):
+        if dis[i] == 1 or (dis[i] == 2 and not _clean_mmatch(dis, i, dstart, dend)):
+            rindex.append(i)
+            reduced.append(ha[i])
+        else:
+            rchg[i] = 1
+    return reduced, rindex
+
+
+def _split(ha1, off1, lim1, ha2, off2, lim2, kvdf, kvdb, kvo, need_min, mxcost):
+    """Find the middle snake of the box (xdl_split).
+
+    Returns (i1, i2, min_lo, min_hi).
+    """
+    dmin = off1 - lim2
+    dmax = lim1 - off2
+    fmid = off1 - off2
+    bmid = lim1 - lim2
+    odd = (fmid - bmid) & 1
+    fmin = fmax = fmid
+    bmin = bmax = bmid
+
+    kvdf[kvo + fmid] = off1
+    kvdb[kvo + bmid] = lim1
+
+    ec = 0
+    while True:
+        ec += 1
+        got_snake = False
+
+        if fmin > dmin:
+            fmin -= 1
+            kvdf[kvo + fmin - 1] = -1
+        else:
+            fmin += 1
+        if fmax < dmax:
+            fmax += 1
+            kvdf[kvo + fmax + 1] = -1
+        else:
+            fmax -= 1
+
+        for d in range(fmax, fmin - 1, -2):
+            if kvdf[kvo + d - 1] >= kvdf[kvo + d + 1]:
+                i1 = kvdf[kvo + d - 1] + 1
+            else:
+                i1 = kvdf[kvo + d + 1]
+            prev1 = i1
+            i2 = i1 - d
+            while i1 < lim1 and i2 < lim2 and ha1[i1] == ha2[i2]:
+                i1 += 1
+                i2 += 1
+            if i1 - prev1 > _SNAKE_CNT:
+                got_snake = True
+            kvdf[kvo + d] = i1
+            if odd and bmin <= d <= bmax and kvdb[kvo + d] <= i1:
+                return i1, i2, True, True
+
+        if bmin > dmin:
+            bmin -= 1
+            kvdb[kvo + bmin - 1] = _LINE_MAX
+        else:
+            bmin += 1
+        if bmax < dmax:
+            bmax += 1
+            kvdb[kvo + bmax + 1] = _LINE_MAX
+        else:
+            bmax -= 1
+
+        for d in range(bmax, bmin - 1, -2):
+            if kvdb[kvo + d - 1] < kvdb[kvo + d + 1]:
+                i1 = kvdb[kvo + d - 1]
+            else:
+                i1 = kvdb[kvo + d + 1] - 1
+            prev1 = i1
+            i2 = i1 - d
+            while i1 > off1 and i2 > off2 and ha1[i1 - 1] == ha2[i2 - 1]:
+                i1 -= 1
+                i2 -= 1
+            if prev1 - i1 > _SNAKE_CNT:
+                got_snake = True
+            kvdb[kvo + d] = i1
+            if not odd and fmin <= d <= fmax and i1 <= kvdf[kvo + d]:
+                return i1, i2, True, True
+
+        if need_min:
+            continue
+
+        # If the edit cost is above the heuristic trigger and we got a good
+        # snake, look for a diagonal that has reached an "interesting" path.
+        if got_snake and ec > _HEUR_MIN_COST:
+            best = 0
+            for d in range(fmax, fmin - 1, -2):
+                dd = d - fmid if d > fmid else fmid - d
+                i1 = kvdf[kvo + d]
+                i2 = i1 - d
+                v = (i1 - off1) + (i2 - off2) - dd
+                if (
+                    v > _K_HEUR * ec
+                    and v > best
+                    and off1 + _SNAKE_CNT <= i1 < lim1
+                    and off2 + _SNAKE_CNT <= i2 < lim2
+                ):
+                    k = 1
+                    while ha1[i1 - k] == ha2[i2 - k]:
+                        if k == _SNAKE_CNT:
+                            best = v
+                            spl = (i1, i2)
+                            break
+                        k += 1
+            if best > 0:
+                return spl[0], spl[1], True, False
+
+            best = 0
+            for d in range(bmax, bmin - 1, -2):
+                dd = d - bmid if d > bmid else bmid - d
+                i1 = kvdb[kvo + d]
+                i2 = i1 - d
+                v = (lim1 - i1) + (lim2 - i2) - dd
+                if (
+                    v > _K_HEUR * ec
+                    and v > best
+                    and off1 < i1 <= lim1 - _SNAKE_CNT
+                    and off2 < i2 <= lim2 - _SNAKE_CNT
+                ):
+                    k = 0
+                    while ha1[i1 + k] == ha2[i2 + k]:
+                        if k == _SNAKE_CNT - 1:
+                            best = v
+                            spl = (i1, i2)
+                            break
+                        k += 1
+            if best > 0:
+                return spl[0], spl[1], False, True
+
+        # Enough is enough. Collect the furthest reaching path.
+        if ec >= mxcost:
+            fbest = fbest1 = -1
+            for d in range(fmax, fmin - 1, -2):
+                i1 = min(kvdf[kvo + d], lim1)
+                i2 = i1 - d
+                if lim2 < i2:
+                    i1 = lim2 + d
+                    i2 = lim2
+                if fbest < i1 + i2:
+                    fbest = i1 + i2
+                    fbest1 = i1
+
+            bbest = bbest1 = _LINE_MAX
+            for d in range(bmax, bmin - 1, -2):
+                i1 = max(off1, kvdb[kvo + d])
+                i2 = i1 - d
+                if i2 < off2:
+                    i1 = off2 + d
+                    i2 = off2
+                if i1 + i2 < bbest:
+                    bbest = i1 + i2
+                    bbest1 = i1
+
+            if (lim1 + lim2) - bbest < fbest - (off1 + off2):
+                return fbest1, fbest - fbest1, True, False
+            return bbest1, bbest - bbest1, False, True
+
+
+def _classic_diff(
+    ha1: list[int], ha2: list[int], need_min=False
+) -> tuple[list[int], list[int]]:
+    """git's Myers diff (xdl_do_diff). Returns changed-line flags for each side."""
+    n1 = len(ha1)
+    n2 = len(ha2)
+    rchg1 = [0] * n1
+    rchg2 = [0] * n2
+
+    # xdl_trim_ends
+    lim = min(n1, n2)
+    dstart = 0
+    while dstart < lim and ha1[dstart] == ha2[dstart]:
+        dstart += 1
+    lim -= dstart
+    tail = 0
+    while tail < lim and ha1[n1 - 1 - tail] == ha2[n2 - 1 - tail]:
+        tail += 1
+
+    counts1 = Counter(ha1)
+    counts2 = Counter(ha2)
+    rha1, rindex1 = _cleanup_records(ha1, rchg1, dstart, n1 - tail - 1, counts2)
+    rha2, rindex2 = _cleanup_records(ha2, rchg2, dstart, n2 - tail - 1, counts1)
+
+    nreff1 = len(rha1)
+    nreff2 = len(rha2)
+    ndiags = nreff1 + nreff2 + 3
+    kvdf = [0] * ndiags
+    kvdb = [0] * ndiags
+    kvo = nreff2 + 1
+    mxcost = max(_bogosqrt(ndiags), _MAX_COST_MIN)
+
+    # xdl_recs_cmp, with an explicit stack instead of recursion.
+    stack = [(0, nreff1, 0, nreff2, need_min)]
+    while stack:
+        off1, lim1, off2, lim2, need_min = stack.pop()
+        while off1 < lim1 and off2 < lim2 and rha1[off1] == rha2[off2]:
+            off1 += 1
+            off2 += 1
+        while off1 < lim1 and off2 < lim2 and rha1[lim1 - 1] == rha2[lim2 - 1]:
+            lim1 -= 1
+            lim2 -= 1
+
+        if off1 == lim1:
+            for i in range(off2, lim2):
+                rchg2[rindex2[i]] = 1
+        elif off2 == lim2:
+            for i in range(off1, lim1):
+                rchg1[rindex1[i]] = 1
+        else:
+            i1, i2, min_lo, min_hi = _split(
+                rha1, off1, lim1, rha2, off2, lim2, kvdf, kvdb, kvo, need_min, mxcost
+            )
+            stack.append((i1, lim1, i2, lim2, min_hi))
+            stack.append((off1, i1, off2, i2, min_lo))
+
+    return rchg1, rchg2
+
+
+def diff_sequences(seq1, seq2) -> tuple[list[int], list[int]]:
+    """Myers diff of two sequences of hashable items, e.g. the words on a line.
+
+    Returns changed-item flags for each side.
+    """
+    classes = {}
+    ha1 = [classes.setdefault(x, len(classes)) for x in seq1]
+    ha2 = [classes.setdefault(x, len(classes)) for x in seq2]
+    return _classic_diff(ha1, ha2)
+
+
+def _fall_back_diff(ha1, ha2, rchg1, rchg2, line1, count1, line2, count2):
+    """Run a Myers diff on a sub-range of the files (xdl_fall_back_diff)."""
+    sub1, sub2 = _classic_diff(ha1[line1 : line1 + count1], ha2[line2 : line2 + count2])
+    rchg1[line1 : line1 + count1] = sub1
+    rchg2[line2 : line2 + count2] = sub2
+
+
+# --- Patience ------------------------------------------------------------------
+
+
+def _patience_diff(ha1, ha2, rchg1, rchg2):
+    """git's patience diff (xpatience.c). Line numbers here are zero-based."""
+    stack = [(0, len(ha1), 0, len(ha2))]
+    while stack:
+        line1, count1, line2, count2 = stack.pop()
+        if not count1:
+            rchg2[line2 : line2 + count2] = [1] * count2
+            continue
+        if not count2:
+            rchg1[line1 : line1 + count1] = [1] * count1
+            continue
+
+        # fill_hashmap: class -> [line1, line2]; line2 is None when there's no
+        # match in the second file, _NON_UNIQUE if either side has duplicates.
+        entries = {}
+        for i in range(line1, line1 + count1):
+            entry = entries.get(ha1[i])
+            if entry:
+                entry[1] = _NON_UNIQUE
+            else:
+                entries[ha1[i]] = [i, None]
+        has_matches = False
+        for i in range(line2, line2 + count2):
+            entry = entries.get(ha2[i])
+            if entry:
+                has_matches = True
+                entry[1] = i if entry[1] is None else _NON_UNIQUE
+
+        if not has_matches:
+            rchg1[line1 : line1 + count1] = [1] * count1
+            rchg2[line2 : line2 + count2] = [1] * count2
+            continue
+
+        # find_longest_common_sequence, via patience sorting.
+        tails = []  # line2 of the last entry in each pile
+        piles = []
+        previous = {}
+        for entry in entries.values():
+            if entry[1] is None or entry[1] == _NON_UNIQUE:
+                continue
+            i = bisect.bisect_left(tails, entry[1])
+            previous[id(entry)] = piles[i - 1] if i > 0 else None
+            if i == len(piles):
+                piles.append(entry)
+                tails.append(entry[1])
+            else:
+                piles[i] = entry
+                tails[i] = entry[1]
+
+        if not piles:
+            _fall_back_diff(ha1, ha2, rchg1, rchg2, line1, count1, line2, count2)
+            continue
+
+        sequence = []
+        entry = piles[-1]
+        while entry:
+            sequence.append(entry)
+            entry = previous[id(entry)]
+        sequence.reverse()
+
+        # walk_common_sequence
+        end1 = line1 + count1
+        end2 = line2 + count2
+        k = 0
+        while True:
+            if k < len(sequence):
+                next1, next2 = sequence[k]
+                while (
+                    next1 > line1 and next2 > line2 and ha1[next1 - 1] == ha2[next2 - 1]
+                ):
+                    next1 -= 1
+                    next2 -= 1
+            else:
+                next1 = end1
+                next2 = end2
+            while line1 < next1 and line2 < next2 and ha1[line1] == ha2[line2]:
+                line1 += 1
+                line2 += 1
+
+            if next1 > line1 or next2 > line2:
+                stack.append((line1, next1 - line1, line2, next2 - line2))
+
+            if k == len(sequence):
+                break
+
+            while (
+                k + 1 < len(sequence)
+                and sequence[k + 1][0] == sequence[k][0] + 1
+                and sequence[k + 1][1] == sequence[k][1] + 1
+            ):
+                k += 1
+            line1 = sequence[k][0] + 1
+            line2 = sequence[k][1] + 1
+            k += 1
+
+
+# --- Histogram -----------------------------------------------------------------
+
+
+def _find_lcs(ha1, ha2, line1, count1, line2, count2):
+    """Find the longest common run of low-occurrence lines (xhistogram.c).
+
+    Returns (fall_back, lcs) where lcs is (begin1, begin2, end1, end2), inclusive.
+    """
+    end1 = line1 + count1 - 1
+    end2 = line2 + count2 - 1
+
+    # scanA: for each class, its first line, its number of occurrences and a
+    # chain to the next occurrence of each line.
+    records = {}
+    next_ptr = {}
+    for ptr in range(end1, line1 - 1, -1):
+        rec = records.get(ha1[ptr])
+        if rec:
+            next_ptr[ptr] = rec[0]
+            rec[0] = ptr
+            rec[1] += 1
+        else:
+            records[ha1[ptr]] = [ptr, 1]
+            next_ptr[ptr] = None
+
+    lcs = None
+    lcs_len = 0
+    cnt = _MAX_CHAIN_LENGTH + 1
+    has_common = False
+
+    b_ptr = line2
+    while b_ptr <= end2:
+        # try_lcs
+        b_next = b_ptr + 1
+        rec = records.get(ha2[b_ptr])
+        if rec and rec[1] > cnt:
+            has_common = True
+        elif rec:
+            has_common = True
+            as_ = rec[0]
+            while True:
+                np = next_ptr[as_]
+                bs = b_ptr
+                ae = as_
+                be = bs
+                rc = rec[1]
+
+                while line1 < as_ and line2 < bs and ha1[as_ - 1] == ha2[bs - 1]:
+                    as_ -= 1
+                    bs -= 1
+                    if 1 < rc:
+                        rc = min(rc, records[ha1[as_]][1])
+                while ae < end1 and be < end2 and ha1[ae + 1] == ha2[be + 1]:
+                    ae += 1
+                    be += 1
+                    if 1 < rc:
+                        rc = min(rc, records[ha1[ae]][1])
+
+                if b_next <= be:
+                    b_next = be + 1
+                if lcs_len < ae - as_ or rc < cnt:
+                    lcs = (as_, bs, ae, be)
+                    lcs_len = ae - as_
+                    cnt = rc
+
+                if np is None:
+                    break
+                while np is not None and np <= ae:
+                    np = next_ptr[np]
+                if np is None:
+                    break
+                as_ = np
+        b_ptr = b_next
+
+    return has_common and _MAX_CHAIN_LENGTH < cnt, lcs
+
+
+def _histogram_diff(ha1, ha2, rchg1, rchg2):
+    """git's histogram diff (xhistogram.c). Line numbers here are zero-based."""
+    stack = [(0, len(ha1), 0, len(ha2))]
+    while stack:
+        line1, count1, line2, count2 = stack.pop()
+        while True:
+            if count1 <= 0 and count2 <= 0:
+                break
+            if not count1:
+                rchg2[line2 : line2 + count2] = [1] * count2
+                break
+            if not count2:
+                rchg1[line1 : line1 + count1] = [1] * count1
+                break
+
+            fall_back, lcs = _find_lcs(ha1, ha2, line1, count1, line2, count2)
+            if fall_back:
+                _fall_back_diff(ha1, ha2, rchg1, rchg2, line1, count1, line2, count2)
+                break
+            if lcs is None:
+                rchg1[line1 : line1 + count1] = [1] * count1
+                rchg2[line2 : line2 + count2] = [1] * count2
+                break
+
+            begin1, begin2, lcs_end1, lcs_end2 = lcs
+            stack.append((line1, begin1 - line1, line2, begin2 - line2))
+            count1 = line1 + count1 - 1 - lcs_end1
+            line1 = lcs_end1 + 1
+            count2 = line2 + count2 - 1 - lcs_end2
+            line2 = lcs_end2 + 1
+
+
+# --- Compaction ----------------------------------------------------------------
+
+_INDENT_HEURISTIC_MAX_SLIDING = 100
+_MAX_INDENT = 200
+_MAX_BLANKS = 20
+_START_OF_FILE_PENALTY = 1
+_END_OF_FILE_PENALTY = 21
+_TOTAL_BLANK_WEIGHT = -30
+_POST_BLANK_WEIGHT = 6
+_RELATIVE_INDENT_PENALTY = -4
+_RELATIVE_INDENT_WITH_BLANK_PENALTY = 10
+_RELATIVE_OUTDENT_PENALTY = 24
+_RELATIVE_OUTDENT_WITH_BLANK_PENALTY = 17
+_RELATIVE_DEDENT_PENALTY = 23
+_RELATIVE_DEDENT_WITH_BLANK_PENALTY = 17
+_INDENT_WEIGHT = 60
+
+
+def _get_indent(line: bytes) -> int:
+    """Indentation of a line, or -1 if it's blank."""
+    ret = 0
+    for c in line:
+        if c not in _WHITESPACE:
+            return ret
+        if c == 0x20:
+            ret += 1
+        elif c == 0x09:
+            ret += 8 - ret % 8
+        if ret >= _MAX_INDENT:
+            return _MAX_INDENT
+    return -1
+
+
+class _File:
+    """One side of the diff: lines, their class ids and changed-line flags.
+
+    rchg is padded with an unchanged sentinel line at each end, so line i is
+    rchg[i + 1].
+    """
+
+    def __init__(self, lines, ha, rchg):
+        self.lines = lines
+        self.ha = ha
+        self.nrec = len(ha)
+        self.rchg = [0, *rchg, 0]
+        self._indents = {}
+
+    def indent(self, i):
+        indent = self._indents.get(i)
+        if indent is None:
+            indent = self._indents[i] = _get_indent(self.lines[i])
+        return indent
+
+
+class _Group:
+    """A run of changed lines [start, end) in one file (struct xdlgroup)."""
+
+    def __init__(self, xdf: _File):
+        self.xdf = xdf
+        self.start = self.end = 0
+        while xdf.rchg[self.end + 1]:
+            self.end += 1
+
+    def next(self) -> bool:
+        xdf = self.xdf
+        if self.end == xdf.nrec:
+            return False
+        self.start = self.end + 1
+        self.end = self.start
+        while xdf.rchg[self.end + 1]:
+            self.end += 1
+        return True
+
+    def previous(self) -> bool:
+        xdf = self.xdf
+        if self.start == 0:
+            return False
+        self.end = self.start - 1
+        self.start = self.end
+        while xdf.rchg[self.start]:
+            self.start -= 1
+        return True
+
+    def slide_down(self) -> bool:
+        xdf = self.xdf
+        if self.end < xdf.nrec and xdf.ha[self.start] == xdf.ha[self.end]:
+            xdf.rchg[self.start + 1] = 0
+            self.start += 1
+            xdf.rchg[self.end + 1] = 1
+            self.end += 1
+            while xdf.rchg[self.end + 1]:
+                self.end += 1
+            return True
+        return False
+
+    def slide_up(self) -> bool:
+        xdf = self.xdf
+        if self.start > 0 and xdf.ha[self.start - 1] == xdf.ha[self.end - 1]:
+            self.start -= 1
+            xdf.rchg[self.start + 1] = 1
+            self.end -= 1
+            xdf.rchg[self.end + 1] = 0
+            while xdf.rchg[self.start]:
+                self.start -= 1
+            return True
+        return False
+
+
+def _measure_split(xdf: _File, split: int):
+    """Returns (end_of_file, indent, pre_blank, pre_indent, post_blank, post_indent)."""
+    if split >= xdf.nrec:
+        end_of_file = True
+        indent = -1
+    else:
+        end_of_file = False
+        indent = xdf.indent(split)
+
+    pre_blank = 0
+    pre_indent = -1
+    for i in range(split - 1, -1, -1):
+        pre_indent = xdf.indent(i)
+        if pre_indent != -1:
+            break
+        pre_blank += 1
+        if pre_blank == _MAX_BLANKS:
+            pre_indent = 0
+            break
+
+    post_blank = 0
+    post_indent = -1
+    for i in range(split + 1, xdf.nrec):
+        post_indent = xdf.indent(i)
+        if post_indent != -1:
+            break
+        post_blank += 1
+        if post_blank == _MAX_BLANKS:
+            post_indent = 0
+            break
+
+    return end_of_file, indent, pre_blank, pre_indent, post_blank, post_indent
+
+
+def _score_split(m, score: list[int]):
+    """Add the badness of a split to score, an [effective_indent, penalty] pair."""
+    end_of_file, indent, pre_blank, pre_indent, post_blank, post_indent = m
+    penalty = 0
+    if pre_indent == -1 and pre_blank == 0:
+        penalty += _START_OF_FILE_PENALTY
+    if end_of_file:
+        penalty += _END_OF_FILE_PENALTY
+
+    post_blank = 1 + post_blank if indent == -1 else 0
+    total_blank = pre_blank + post_blank
+    penalty += _TOTAL_BLANK_WEIGHT * total_blank
+    penalty += _POST_BLANK_WEIGHT * post_blank
+
+    if indent == -1:
+        indent = post_indent
+    any_blanks = total_blank != 0
+
+    score[0] += indent
+    if indent == -1 or pre_indent == -1:
+        pass
+    elif indent > pre_indent:
+        penalty += (
+            _RELATIVE_INDENT_WITH_BLANK_PENALTY
+            if any_blanks
+            else _RELATIVE_INDENT_PENALTY
+        )
+    elif indent == pre_indent:
+        pass
+    elif post_indent != -1 and post_indent > indent:
+        penalty += (
+            _RELATIVE_OUTDENT_WITH_BLANK_PENALTY
+            if any_blanks
+            else _RELATIVE_OUTDENT_PENALTY
+        )
+    else:
+        penalty += (
+            _RELATIVE_DEDENT_WITH_BLANK_PENALTY
+            if any_blanks
+            else _RELATIVE_DEDENT_PENALTY
+        )
+    score[1] += penalty
+
+
+def _score_cmp(s1, s2) -> int:
+    cmp_indents = (s1[0] > s2[0]) - (s1[0] < s2[0])
+    return _INDENT_WEIGHT * cmp_indents + (s1[1] - s2[1])
+
+
+def _change_compact(xdf: _File, xdfo: _File, indent_heuristic: bool):
+    """Slide groups of changes to line up with each other (xdl_change_compact)."""
+    g = _Group(xdf)
+    go = _Group(xdfo)
+
+    while True:
+        if g.end != g.start:
+            while True:
+                groupsize = g.end - g.start
+                end_matching_other = -1
+
+                while g.slide_up():
+                    go.previous()
+                earliest_end = g.end
+                if go.end > go.start:
+                    end_matching_other = g.end
+
+                while g.slide_down():
+                    go.next()
+                    if go.end > go.start:
+                        end_matching_other = g.end
+
+                if groupsize == g.end - g.start:
+                    break
+
+            if g.end == earliest_end:
+                pass  # no shifting was possible
+            elif end_matching_other != -1:
+                while go.end == go.start:
+                    g.slide_up()
+                    go.previous()
+            elif indent_heuristic:
+                shift = max(
+                    earliest_end,
+                    g.end - groupsize - 1,
+                    g.end - _INDENT_HEURISTIC_MAX_SLIDING,
+                )
+                best_shift = -1
+                best_score = None
+                while shift <= g.end:
+                    score = [0, 0]
+                    _score_split(_measure_split(xdf, shift), score)
+                    _score_split(_measure_split(xdf, shift - groupsize), score)
+                    if best_shift == -1 or _score_cmp(score, best_score) <= 0:
+                        best_score = score
+                        best_shift = shift
+                    shift += 1
+
+                while g.end > best_shift:
+                    g.slide_up()
+                    go.previous()
+
+        if not g.next():
+            break
+        go.next()
+
+
+# --- Output --------------------------------------------------------------------
+
+
+@dataclass
+class _Change:
+    i1: int
+    i2: int
+    chg1: int
+    chg2: int
+
+
+def _build_script(xdf1: _File, xdf2: _File) -> list[_Change]:
+    """Collect runs of changed lines into a list of changes (xdl_build_script)."""
+    rchg1 = xdf1.rchg
+    rchg2 = xdf2.rchg
+    changes = []
+    i1 = i2 = 0
+    while i1 < xdf1.nrec or i2 < xdf2.nrec:
+        if rchg1[i1 + 1] or rchg2[i2 + 1]:
+            l1 = i1
+            l2 = i2
+            while rchg1[i1 + 1]:
+                i1 += 1
+            while rchg2[i2 + 1]:
+                i2 += 1
+            changes.append(_Change(l1, l2, i1 - l1, i2 - l2))
+        else:
+            i1 += 1
+            i2 += 1
+    return changes
+
+
+def _func_name(line: bytes) -> bytes | None:
+    """git's default function name matcher (def_ff in xemit.c)."""
+    if line and (line[:1].isalpha() or line[0] in b'_$'):
+        return line[:80].rstrip(_WHITESPACE)
+    return None
+
+
+def _add_run(runs: list, type: str, count: int):
+    """Append count lines of type to the hunk's runs, merging with the last run."""
+    if count <= 0:
+        return
+    if runs and runs[-1][0] == type:
+        runs[-1] = (type, runs[-1][1] + count)
+    else:
+        runs.append((type, count))
+
+
+def _emit_hunks(
+    changes: list[_Change], xdf1: _File, xdf2: _File, settings: DiffSettings
+) -> list[Hunk]:
+    """Group changes into hunks with context lines (xdl_emit_diff)."""
+    ctx = settings.context
+    max_common = 2 * ctx + settings.inter_hunk_context
+    hunks = []
+    func_line = b''
+    funclineprev = -1
+
+    first = 0
+    while first < len(changes):
+        # xdl_get_hunk
+        last = first
+        while last + 1 < len(changes):
+            prev, nxt = changes[last], changes[last + 1]
+            if nxt.i1 - (prev.i1 + prev.chg1) > max_common:
+                break
+            last += 1
+        xch = changes[first]
+        xche = changes[last]
+
+        s1 = max(xch.i1 - ctx, 0)
+        s2 = max(xch.i2 - ctx, 0)
+        lctx = min(
+            ctx, xdf1.nrec - (xche.i1 + xche.chg1), xdf2.nrec - (xche.i2 + xche.chg2)
+        )
+        e1 = xche.i1 + xche.chg1 + lctx
+        e2 = xche.i2 + xche.chg2 + lctx
+
+        # get_func_line: if no function line is found, the last one is reused.
+        limit = funclineprev
+        step = -1 if s1 - 1 > limit else 1
+        line = s1 - 1
+        while line != limit and 0 <= line < xdf1.nrec:
+            name = _func_name(xdf1.lines[line])
+            if name is not None:
+                func_line = name
+                break
+            line += step
+        funclineprev = s1 - 1
+
+        runs = []
+        _add_run(runs, ' ', xch.i2 - s2)
+        prev = None
+        for change in changes[first : last + 1]:
+            if prev:
+                _add_run(runs, ' ', change.i1 - (prev.i1 + prev.chg1))
+            _add_run(runs, '-', change.chg1)
+            _add_run(runs, '+', change.chg2)
+            prev = change
+        _add_run(runs, ' ', e2 - (xche.i2 + xche.chg2))
+
+        hunks.append(
+            Hunk(
+                s1 + 1 if e1 - s1 else s1,
+                s2 + 1 if e2 - s2 else s2,
+                func_line.decode('utf8', errors='replace') or None,
+                runs,
+            )
+        )
+        first = last + 1
+
+    return hunks
+
+
+def diff_lines(
+    lines1: list[bytes], lines2: list[bytes], settings: DiffSettings
+) -> list[Hunk]:
+    """Diff two lists of lines (including trailing newlines) into hunks."""
+    ha1, ha2 = _classify(lines1, lines2, settings)
+    if settings.algorithm == 'patience':
+        rchg1 = [0] * len(ha1)
+        rchg2 = [0] * len(ha2)
+        _patience_diff(ha1, ha2, rchg1, rchg2)
+    elif settings.algorithm == 'histogram':
+        rchg1 = [0] * len(ha1)
+        rchg2 = [0] * len(ha2)
+        _histogram_diff(ha1, ha2, rchg1, rchg2)
+    else:
+        rchg1, rchg2 = _classic_diff(ha1, ha2, settings.algorithm == 'minimal')
+
+    xdf1 = _File(lines1, ha1, rchg1)
+    xdf2 = _File(lines2, ha2, rchg2)
+    _change_compact(xdf1, xdf2, settings.indent_heuristic)
+    _change_compact(xdf2, xdf1, settings.indent_heuristic)
+    return _emit_hunks(_build_script(xdf1, xdf2), xdf1, xdf2, settings)
+
+
+def hunks_for_changed_lines(
+    lines1: list[bytes], rchg1: list[int], rchg2: list[int], settings: DiffSettings
+) -> list[Hunk]:
+    """Group changed-line flags from some other diff into hunks, like diff_lines.
+
+    The unchanged lines on each side must correspond one-to-one, in order.
+    """
+    xdf1 = _File(lines1, [0] * len(rchg1), rchg1)
+    xdf2 = _File(None, [0] * len(rchg2), rchg2)
+    return _emit_hunks(_build_script(xdf1, xdf2), xdf1, xdf2, settings)
+
+
+def _is_executable(path: str) -> bool:
+    return bool(os.stat(path).st_mode & stat.S_IXUSR)
+
+
+def diff_files(a_path: str, b_path: str, settings: DiffSettings) -> list[Code] | None:
+    """Diff two files on disk, with the same output as diff.get_diff_ops' git path.
+
+    Returns None for a binary diff.
+    """
+    with open(a_path, 'rb') as f:
+        a_data = f.read()
+    with open(b_path, 'rb') as f:
+        b_data = f.read()
+    lines2 = split_lines(b_data)
+    num_lines = len(lines2)
+
+    if a_data == b_data:
+        hunks = []
+    elif is_binary(a_data) or is_binary(b_data):
+        return None
+    else:
+        hunks = diff_lines(split_lines(a_data), lines2, settings)
+
+    if not hunks:
+        if _is_executable(a_path) != _is_executable(b_path):
+            # git reports a mode change, but there are no hunks.
+            return None
+        return [Code('equal', (0, num_lines), (0, num_lines))]
+    return finish_codes(hunks_to_codes(hunks), num_lines)
@@ -0,0 +1,106 @@
+"""Line counts and random access to the lines of (possibly huge) files.
+
+A LineIndex records how many newlines come before each block of the file. It's
+built with one pass over a memory map of the file and cached per (path, mtime,
+size), so counting lines is free after the first time and finding any line only
+means scanning within one block. The index takes 8 bytes per 64 KB of file.
+"""
+
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+from webdiff.lrucache import lru_cache
+
+BLOCK_SIZE = 1 << 16
+
+
+@dataclass(frozen=True)
+class LineIndex:
+    size: int
+    num_newlines: int
+    ends_with_newline: bool
+    block_size: int
+    # newlines_before[i] is the number of newlines before byte i * block_size.
+    newlines_before: array
+
+    @property
+    def num_lines(self) -> int:
+        """The number of lines, like `grep -c ''` (including an unterminated one)."""
+        if self.size == 0 or self.ends_with_newline:
+            return self.num_newlines
+        return self.num_newlines + 1
+
+    def line_start(self, mm, line: int) -> int:
+        """Byte offset of the start of a line (0-based, <= num_newlines)."""
+        if line == 0:
+            return 0
+        # Find the block with the line'th newline, then the newline within it.
+        block = bisect_left(self.newlines_before, line) - 1
+        start = block * self.block_size
+        data = mm[start : start + self.block_size]
+        rest = data.split(b'\n', line - self.newlines_before[block])[-1]
+        return start + len(data) - len(rest)
+
+
+def _open_map(f):
+    if os.fstat(f.fileno()).st_size == 0:
+        return nullcontext(b'')  # empty files can't be mapped
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_line_index(path: str, block_size: int = 0) -> LineIndex:
+    block_size = block_size or BLOCK_SIZE
+    newlines_before = array('q')
+    num_newlines = 0
+    with open(path, 'rb') as f, _open_map(f) as mm:
+        size = len(mm)
+        for start in range(0, size, block_size):
+            newlines_before.append(num_newlines)
+            num_newlines += mm[start : start + block_size].count(b'\n')
+        ends_with_newline = size > 0 and mm[size - 1] == ord('\n')
+    return LineIndex(size, num_newlines, ends_with_newline, block_size, newlines_before)
+
+
+@lru_cache(
+    maxsize=1024,
+    max_bytes=64 * 1024 * 1024,
+    sizeof=lambda index: (
+        64 + index.newlines_before.itemsize * len(index.newlines_before)
+    ),
+    file_args=(0,),
+)
+def line_index(path: str) -> LineIndex:
+    return build_line_index(path)
+
+
+def count_lines(path: str) -> int:
+    """Count lines like `grep -c ''`, i.e. including an unterminated last line."""
+    return line_index(path).num_lines
+
+
+def read_lines(path: str, start: int, end: int) -> tuple[int, list[str]]:
+    """Read lines [start, end) of a file, without their line endings.
+
+    Lines are split on '\n' and stripped of '\r's at either end, like the UI does
+    for the contents of smaller files (see stringAsLines). So a file with N
+    newlines has N + 1 lines. Returns that number and the lines in the range.
+    """
+    index = line_index(path)
+    n = index.num_newlines + 1
+    start = min(start, n)
+    end = min(end, n)
+    if start >= end:
+        return n, []
+    with open(path, 'rb') as f, _open_map(f) as mm:
+        begin = index.line_start(mm, start)
+        if end < n:
+            stop = index.line_start(mm, end) - 1  # drop the last '\n'
+        else:
+            stop = index.size
+        data = mm[begin:stop]
+    lines = data.decode('utf8', errors='replace').split('\n')
+    return n, [line.strip('\r') for line in lines]
@@ -1,13 +1,13 @@
 """This class represents the diff between two files on local disk."""
 
 import os
-from dataclasses import dataclass
-from typing import Union
+from dataclasses import dataclass, field
 
+from webdiff.lrucache import file_stamp
 from webdiff.unified_diff import RawDiffLine
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LocalFileDiff:
     """A before/after file pair on local disk"""
 
@@ -21,40 +21,125 @@ class LocalFileDiff:
     """Full path to the right file on disk (may be empty if a_path != '')."""
     is_move: bool
     """Is this a move between the two files?"""
-    num_add: Union[int, None] = None
-    num_delete: Union[int, None] = None
+    num_add: int | None = None
+    num_delete: int | None = None
+    a_sha: str | None = None
+    """git object id of the left file, if git reported one."""
+    b_sha: str | None = None
+    """git object id of the right file, if git reported one."""
 
-    @property
-    def a(self):
-        if self.a_path == '':
-            return ''
-        return os.path.relpath(self.a_path, self.a_root)
-
-    @property
-    def b(self):
-        if self.b_path == '':
-            return ''
-        return os.path.relpath(self.b_path, self.b_root)
+    # These are read constantly (e.g. for every file in the file list), so they're
+    # computed once when the diff is created.
+    a: str = field(init=False, repr=False, compare=False)
+    """Name of the left file, relative to a_root ('' for an add)."""
+    b: str = field(init=False, repr=False, compare=False)
+    """Name of the right file, relative to b_root ('' for a delete)."""
+    type: str = field(init=False, repr=False, compare=False)
+    """One of 'add', 'delete', 'move' or 'change'."""
+    a_stamp: tuple | None = field(init=False, repr=False, compare=False)
+    """Stamp of the left file when a_sha was reported (see diff.reported_shas)."""
+    b_stamp: tuple | None = field(init=False, repr=False, compare=False)
+    """Stamp of the right file when b_sha was reported."""
 
-    @property
-    def type(self):
+    def __post_init__(self):
+        a = _relpath(self.a_path, self.a_root) if self.a_path else ''
+        b = _relpath(self.b_path, self.b_root) if self.b_path else ''
         if self.a_path == '':
-            return 'add'
+            type = 'add'
         elif self.b_path == '':
-            return 'delete'
+            type = 'delete'
         elif self.is_move:
-            return 'move'
-        return 'change'
+            type = 'move'
+        else:
+            type = 'change'
+        object.__setattr__(self, 'a', a)
+        object.__setattr__(self, 'b', b)
+        object.__setattr__(self, 'type', type)
+        # The files may be edited while webdiff is running, which makes the
+        # reported ids stale. Remember what the files looked like when they were
+        # reported so that this can be detected.
+        a_stamp = file_stamp(self.a_path) if self.a_sha else None
+        b_stamp = file_stamp(self.b_path) if self.b_sha else None
+        object.__setattr__(self, 'a_stamp', a_stamp)
+        object.__setattr__(self, 'b_stamp', b_stamp)
 
     @staticmethod
     def from_diff_raw_line(line: RawDiffLine, a_dir: str, b_dir: str):
         status = line.status
+        a_sha = _object_id(line.src_sha)
+        b_sha = _object_id(line.dst_sha)
         # A, C (copy), D, M, R, T (change in type), U (unmerged), X (bug)
         if status == 'A':
-            return LocalFileDiff(a_dir, '', b_dir, line.path, is_move=False, num_add=line.num_add, num_delete=line.num_delete)
+            return LocalFileDiff(
+                a_dir,
+                '',
+                b_dir,
+                line.path,
+                is_move=False,
+                num_add=line.num_add,
+                num_delete=line.num_delete,
+                a_sha=a_sha,
+                b_sha=b_sha,
+            )
         if status == 'D':
-            return LocalFileDiff(a_dir, line.path, b_dir, '', is_move=False, num_add=line.num_add, num_delete=line.num_delete)
+            return LocalFileDiff(
+                a_dir,
+                line.path,
+                b_dir,
+                '',
+                is_move=False,
+                num_add=line.num_add,
+                num_delete=line.num_delete,
+                a_sha=a_sha,
+                b_sha=b_sha,
+            )
         if line.dst_path:
-            return LocalFileDiff(a_dir, line.path, b_dir, line.dst_path, is_move=True, num_add=line.num_add, num_delete=line.num_delete)
-        dst_path = os.path.join(b_dir, os.path.relpath(line.path, a_dir))
-        return LocalFileDiff(a_dir, line.path, b_dir, dst_path, is_move=False, num_add=line.num_add, num_delete=line.num_delete)
+            return LocalFileDiff(
+                a_dir,
+                line.path,
+                b_dir,
+                line.dst_path,
+                is_move=True,
+                num_add=line.num_add,
+                num_delete=line.num_delete,
+                a_sha=a_sha,
+                b_sha=b_sha,
+            )
+        dst_path = os.path.join(b_dir, _relpath(line.path, a_dir))
+        return LocalFileDiff(
+            a_dir,
+            line.path,
+            b_dir,
+            dst_path,
+            is_move=False,
+            num_add=line.num_add,
+            num_delete=line.num_delete,
+            a_sha=a_sha,
+            b_sha=b_sha,
+        )
+
+
+def _relpath(path: str, root: str) -> str:
+    """os.path.relpath, without its calls to abspath in the common case."""
+    if root.endswith(os.sep):
+        root = root[:-1]
+    if path.startswith(root) and path[len(root) : len(root) + 1] == os.sep:
+        rest = path[len(root) + 1 :]
+        # Is rest already normalized? If so, relpath would return it unchanged.
+        parts = f'{os.sep}{rest}{os.sep}'
+        if rest and not any(p in parts for p in _UNNORMALIZED):
+            return rest
+    return os.path.relpath(path, root)
+
+
+_UNNORMALIZED = (os.sep * 2, f'{os.sep}.{os.sep}', f'{os.sep}..{os.sep}')
+
+
+def _object_id(sha: str) -> str | None:
+    # git diff --no-index reports all-zero ids for files it hasn't hashed, and
+    # real ids only for the ones it hashed to detect renames. Those are
+    # abbreviated unless --no-abbrev is passed, and a prefix can't be compared
+    # with a full id, so treat it as unknown.
+    if not sha or sha.strip('0') == '' or len(sha) < 40:
+        return None
+    return sha
@@ -0,0 +1,190 @@
+"""Bounded, in-memory LRU caches with hit/miss statistics.
+
+Every cache created via the lru_cache decorator is registered by name so that
+its statistics can be reported at /debug/caches.
+"""
+
+import functools
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from typing import Any, Generic, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+_MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+    """A thread-safe LRU cache bounded by entry count and (optionally) bytes.
+
+    If max_bytes is set, sizeof(value) is used to estimate the size of each entry.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        max_bytes: int | None = None,
+        sizeof: Callable[[V], int] | None = None,
+    ):
+        assert max_bytes is None or sizeof is not None
+        self.name = name
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: K, default=None, is_valid: Callable[[V], bool] | None = None):
+        """Look up key. Entries which fail is_valid are dropped and count as misses."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and is_valid and not is_valid(entry[0]):
+                del self._data[key]
+                self.num_bytes -= entry[1]
+                self.invalidations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V):
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.num_bytes -= old[1]
+            self._data[key] = (value, size)
+            self.num_bytes += size
+            while len(self._data) > self.maxsize or (
+                self.max_bytes is not None
+                and self.num_bytes > self.max_bytes
+                and len(self._data) > 1
+            ):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.num_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.num_bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'bytes': self.num_bytes if self.sizeof else None,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+CACHES: dict[str, LRUCache] = {}
+
+
+def register(cache: LRUCache) -> LRUCache:
+    assert cache.name not in CACHES, f'Duplicate cache name {cache.name}'
+    CACHES[cache.name] = cache
+    return cache
+
+
+def all_stats() -> dict[str, dict[str, Any]]:
+    return {name: cache.stats() for name, cache in sorted(CACHES.items())}
+
+
+def file_stamp(path: str):
+    """Changes whenever the file at path is modified (or disappears)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def file_stamps(*paths: str):
+    """Stamps for several paths; empty paths (e.g. one side of an add) are None."""
+    return tuple(file_stamp(path) if path else None for path in paths)
+
+
+def lru_cache(
+    maxsize=128,
+    max_bytes=None,
+    sizeof=None,
+    key: Callable[..., Hashable] | None = None,
+    file_args: tuple[int, ...] = (),
+    name: str | None = None,
+):
+    """Decorator to cache a function's results in a registered LRUCache.
+
+    key: maps the function's arguments to a cache key. By default this is the
+        tuple of positional and keyword arguments, which must be hashable.
+    file_args: indices of positional arguments which are file paths. If any of
+        these files changes (by mtime or size), cached results are recomputed.
+
+    Concurrent calls with the same key share a single call to the function.
+    """
+
+    def decorator(fn):
+        cache = register(
+            LRUCache(
+                name or f'{fn.__module__}.{fn.__qualname__}',
+                maxsize,
+                max_bytes=max_bytes,
+                sizeof=(lambda entry: sizeof(entry[1])) if sizeof else None,
+            )
+        )
+
+        in_flight: dict[Hashable, Future] = {}
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            stamps = tuple(file_stamp(args[i]) for i in file_args)
+            entry = cache.get(k, _MISSING, lambda entry: entry[0] == stamps)
+            if entry is not _MISSING:
+                return entry[1]
+
+            with lock:
+                future = in_flight.get(k)
+                is_owner = future is None
+                if is_owner:
+                    future = in_flight[k] = Future()
+            if not is_owner:
+                return future.result()
+
+            try:
+                value = fn(*args, **kwargs)
+                cache.put(k, (stamps, value))
+                future.set_result(value)
+                return value
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with lock:
+                    del in_flight[k]
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
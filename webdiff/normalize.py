@@ -0,0 +1,252 @@
+"""Normalize JSON and text files for diffing, in bounded memory.
+
+normalize_json_file writes the same output as json.dump(..., indent=2,
+sort_keys=True), but without loading the whole document. Values smaller than
+MAX_VALUE_SIZE are decoded and re-encoded with the json module. Larger arrays
+and objects are streamed element by element. The members of a large object are
+written to a temp file and then copied out in sorted order, so only their keys
+are held in memory.
+
+normalize_yaml_file converts YAML to the same normalized JSON, if PyYAML is
+installed. YAML documents are loaded in full.
+
+sort_lines sorts the lines of a text file with an external merge sort.
+"""
+
+import contextlib
+import heapq
+import json
+import os
+import re
+import tempfile
+from typing import BinaryIO
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Files are read this many characters at a time.
+CHUNK_SIZE = 1 << 20
+# Larger arrays and objects are streamed rather than decoded in one go.
+MAX_VALUE_SIZE = 4 << 20
+# Runs of this many characters of lines are sorted in memory.
+SORT_RUN_SIZE = 16 << 20
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters which could continue a number, e.g. the 'e+20' after '-3'.
+_NUMBER_TAIL = re.compile(r'[0-9eE.+-]*')
+_decoder = json.JSONDecoder()
+_TOO_LARGE = object()
+
+
+class _Reader:
+    """A buffered window onto a text file, from which JSON values are decoded."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def error(self, msg: str):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def fill(self, n: int):
+        """Buffer at least n characters past pos, if the file has that many."""
+        self.buf = self.buf[self.pos :]
+        self.pos = 0
+        while len(self.buf) < n and not self.eof:
+            chunk = self.f.read(max(CHUNK_SIZE, n - len(self.buf)))
+            self.eof = not chunk
+            self.buf += chunk
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or '' at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self.fill(CHUNK_SIZE)
+
+    def take(self) -> str:
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def expect(self, c: str):
+        if self.peek() != c:
+            raise self.error(f'Expecting {c!r}')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, or return _TOO_LARGE for a large array/object."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the file.
+                # raw_decode accepts a prefix of one, e.g. -3 from '-3e'.
+                if self.eof or (
+                    end < len(self.buf)
+                    and (
+                        not isinstance(value, (int, float))
+                        or _NUMBER_TAIL.match(self.buf, end).end() < len(self.buf)
+                    )
+                ):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                if len(self.buf) - self.pos >= MAX_VALUE_SIZE:
+                    c = self.buf[self.pos]
+                    if c in '[{':
+                        return _TOO_LARGE
+                    elif c != '"':  # only strings can be this long
+                        raise
+            self.fill(max(CHUNK_SIZE, 2 * (len(self.buf) - self.pos)))
+
+
+def _dumps(value, depth: int) -> bytes:
+    text = json.dumps(value, indent=2, sort_keys=True)
+    if depth:
+        text = text.replace('\n', '\n' + '  ' * depth)
+    return text.encode('ascii')  # json.dumps escapes non-ASCII characters
+
+
+def _write_value(reader: _Reader, out: BinaryIO, depth: int):
+    value = reader.value()
+    if value is not _TOO_LARGE:
+        out.write(_dumps(value, depth))
+    elif reader.peek() == '[':
+        _write_array(reader, out, depth)
+    else:
+        _write_object(reader, out, depth)
+
+
+def _write_array(reader: _Reader, out: BinaryIO, depth: int):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        out.write(b'[]')
+        return
+    indent = b'\n' + b'  ' * (depth + 1)
+    sep = b'['
+    while True:
+        out.write(sep + indent)
+        _write_value(reader, out, depth + 1)
+        c = reader.take()
+        if c == ']':
+            break
+        elif c != ',':
+            raise reader.error("Expecting ',' delimiter")
+        sep = b','
+    out.write(b'\n' + b'  ' * depth + b']')
+
+
+def _write_object(reader: _Reader, out: BinaryIO, depth: int):
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        out.write(b'{}')
+        return
+    # key -> (offset, length) of its value in the spill file. Like json.load,
+    # later values for duplicate keys replace earlier ones.
+    members = {}
+    with tempfile.TemporaryFile() as spill:
+        while True:
+            if reader.peek() != '"':
+                raise reader.error('Expecting property name enclosed in double quotes')
+            key = reader.value()
+            reader.expect(':')
+            start = spill.tell()
+            _write_value(reader, spill, depth + 1)
+            members[key] = (start, spill.tell() - start)
+            c = reader.take()
+            if c == '}':
+                break
+            elif c != ',':
+                raise reader.error("Expecting ',' delimiter")
+
+        indent = b'\n' + b'  ' * (depth + 1)
+        sep = b'{'
+        for key in sorted(members):
+            start, length = members[key]
+            out.write(sep + indent + _dumps(key, 0) + b': ')
+            spill.seek(start)
+            while length > 0:
+                chunk = spill.read(min(length, CHUNK_SIZE))
+                out.write(chunk)
+                length -= len(chunk)
+            sep = b','
+    out.write(b'\n' + b'  ' * depth + b'}')
+
+
+def normalize_json_file(in_path: str, out_path: str):
+    """Pretty-print the JSON in in_path to out_path, with sorted keys.
+
+    Raises ValueError if in_path isn't valid JSON.
+    """
+    with open(in_path, encoding='utf8') as f, open(out_path, 'wb') as out:
+        reader = _Reader(f)
+        _write_value(reader, out, 0)
+        if reader.peek():
+            raise reader.error('Extra data')
+
+
+def _string_keys(value):
+    """JSON only has string keys; YAML's can be numbers, dates, etc."""
+    if isinstance(value, dict):
+        return {str(k): _string_keys(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_string_keys(v) for v in value]
+    return value
+
+
+def normalize_yaml_file(in_path: str, out_path: str):
+    """Write the data in a YAML file to out_path as normalized JSON.
+
+    Raises ValueError if in_path isn't valid YAML, or if PyYAML isn't installed.
+    """
+    if yaml is None:
+        raise ValueError('PyYAML is not installed')
+    with open(in_path, encoding='utf8') as f:
+        try:
+            data = yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise ValueError(str(e)) from e
+    with open(out_path, 'w') as out:
+        # Values like dates have no JSON equivalent, so they become strings.
+        json.dump(_string_keys(data), out, indent=2, sort_keys=True, default=str)
+
+
+def sort_lines(in_path: str, out_path: str):
+    """Write the lines of in_path to out_path in sorted order.
+
+    The output is the same as sorting all the lines in memory. Runs of lines
+    are sorted and written to temp files, which are then merged.
+    """
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open(in_path))
+        # Small files are sorted in memory; larger ones a run at a time.
+        spill = os.fstat(f.fileno()).st_size > SORT_RUN_SIZE
+        runs = []
+        # An unterminated last line can't be written to a run on its own line.
+        last = []
+        while lines := f.readlines(SORT_RUN_SIZE):
+            if not lines[-1].endswith('\n'):
+                last = [lines.pop()]
+            lines.sort()
+            if spill:
+                run = stack.enter_context(tempfile.TemporaryFile('w+', encoding='utf8'))
+                run.writelines(lines)
+                run.seek(0)
+                runs.append(run)
+            else:
+                runs.append(lines)
+            del lines
+        with open(out_path, 'w') as out:
+            out.writelines(heapq.merge(*runs, last))
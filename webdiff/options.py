@@ -15,6 +15,22 @@ DEFAULTS = {
         'maxDiffWidth': 100,
         'theme': 'googlecode',
         'maxLinesForSyntax': 10_000,
+        'highlightLargeFiles': False,
+        'maxContentsSize': 10,  # megabytes
+        'filesPerPage': 500,
+        'diffEngine': 'git',
+        'jsonDiff': 'lines',
+        'charDiffEngine': 'client',
+        'maxCharDiffLineLength': 10_000,
+        'cacheSize': 100,  # megabytes; 0 to disable
+        'prefetch': False,
+        'batchDiffOps': False,
+        'incrementalDirDiff': False,
+        'prefetchWorkers': 2,
+        'maxConcurrency': 4,
+        'imageDiffEngine': 'auto',
+        'maxImageMagickJobs': 2,
+        'imageMagickTimeout': 30,  # seconds
     },
     'webdiff.colors': {
         'insert': '#efe',
@@ -24,7 +40,10 @@ DEFAULTS = {
     },
     'diff': {
         'algorithm': None,  # aka 'myers'
-    }
+        'context': 3,
+        'interHunkContext': 0,
+        'indentHeuristic': True,
+    },
 }
 
 
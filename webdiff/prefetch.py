@@ -0,0 +1,148 @@
+"""Compute expensive per-file results in the background before they're requested.
+
+Jobs are run in a small pool of threads, nearest to the file being viewed first.
+"""
+
+import heapq
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+from webdiff.lrucache import file_stamps
+
+logger = logging.getLogger(__name__)
+
+
+def _stamps(diff):
+    return file_stamps(diff.a_path, diff.b_path)
+
+
+class Prefetcher:
+    """Runs tasks[kind](diff) for every diff and kind, in order of distance from focus.
+
+    Results are only returned from get() if neither file has changed since the job
+    started. Each result is handed out once, and at most max_results finished jobs
+    are kept waiting for get(); beyond that, the ones farthest from the focus are
+    dropped, and left for callers to compute.
+    """
+
+    def __init__(
+        self,
+        diffs: list[Any],
+        tasks: dict[str, Callable[[Any], Any]],
+        max_workers: int = 2,
+        max_results: int = 200,
+    ):
+        self.diffs = diffs
+        self.tasks = tasks
+        self.max_workers = max_workers
+        self.max_results = max_results
+        self._focus = 0
+        self._heap: list[tuple[int, bool, int, int, str]] = []
+        # (kind, idx) -> (stamps, future) for jobs which have started in the
+        # background, or None for jobs which were claimed by get() (or dropped).
+        self._started: dict[tuple[str, int], Any] = {}
+        # Jobs which have finished, but haven't been claimed by get() yet.
+        self._finished: set[tuple[str, int]] = set()
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._stopped = False
+
+    def start(self):
+        with self._lock:
+            self._rebuild_heap()
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._work, name=f'prefetch-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _rebuild_heap(self):
+        kinds = list(self.tasks)
+        self._heap = [
+            (abs(idx - self._focus), idx < self._focus, kinds.index(kind), idx, kind)
+            for idx in range(len(self.diffs))
+            for kind in kinds
+            if (kind, idx) not in self._started
+        ]
+        heapq.heapify(self._heap)
+
+    def focus(self, idx: int):
+        """Prioritize jobs for idx and its neighbors (the next file, then previous)."""
+        with self._lock:
+            if idx == self._focus:
+                return
+            self._focus = idx
+            self._rebuild_heap()
+
+    def get(self, kind: str, idx: int) -> Future | None:
+        """Returns a future for a started job, or None if the caller should compute it.
+
+        Each job is only returned once; later calls for it return None. If the job
+        hasn't started yet, it won't be run in the background. If the job fails, the
+        future's result is None, so callers fall back to computing it themselves
+        rather than seeing the background thread's exception.
+        """
+        with self._lock:
+            job = self._started.get((kind, idx))
+            # Either way, the job is now the caller's.
+            self._started[(kind, idx)] = None
+            self._finished.discard((kind, idx))
+            if job is None:
+                return None
+        stamps, future = job
+        if stamps is not None and stamps != _stamps(self.diffs[idx]):
+            return None  # the files have changed since the job started
+        return future
+
+    def _next_job(self):
+        with self._lock:
+            while self._heap and not self._stopped:
+                _, _, _, idx, kind = heapq.heappop(self._heap)
+                if (kind, idx) in self._started:
+                    continue
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._started[(kind, idx)] = (None, future)
+                return kind, idx, future
+        return None
+
+    def _work(self):
+        while job := self._next_job():
+            kind, idx, future = job
+            d = self.diffs[idx]
+            try:
+                stamps = _stamps(d)
+                with self._lock:
+                    # get() may have claimed the job already.
+                    if self._started.get((kind, idx)) is not None:
+                        self._started[(kind, idx)] = (stamps, future)
+                result = self.tasks[kind](d)
+            except Exception:
+                logger.debug(f'Prefetching {kind} for {idx} failed', exc_info=True)
+                with self._lock:
+                    self._started[(kind, idx)] = None  # let get() callers retry
+                future.set_result(None)
+                continue
+            future.set_result(result)
+            with self._lock:
+                if self._started.get((kind, idx)) is not None:
+                    self._finished.add((kind, idx))
+                    self._drop_extra_results()
+
+    def _drop_extra_results(self):
+        while len(self._finished) > self.max_results:
+            # This is the job that would have been scheduled last.
+            farthest = max(
+                self._finished,
+                key=lambda job: (abs(job[1] - self._focus), job[1] < self._focus),
+            )
+            self._finished.remove(farthest)
+            self._started[farthest] = None
+
+    def shutdown(self):
+        """Stop scheduling jobs. Jobs which are already running are abandoned."""
+        with self._lock:
+            self._stopped = True
+            self._heap = []
@@ -0,0 +1,217 @@
+"""Structural diffs of normalized JSON files.
+
+Instead of diffing the lines of two pretty-printed files, this parses them and
+compares the trees: object members are matched by key and array elements by
+their hashes, so a change deep inside a document is reported as just the lines
+of the values which changed. Array elements which moved (i.e. whose hash appears
+on the other side, but not in the same place) are reported as a delete and an
+insert, rather than being diffed against whatever element replaced them.
+
+The results are changed-line flags for the normalized files, which become hunks
+and codes just like the in-process line diff's. Lines which only differ by a
+trailing comma are treated as unchanged.
+
+Parsing large documents is CPU-bound, so diffs run in a pool of worker processes
+to keep the server responsive.
+"""
+
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from webdiff import linediff
+from webdiff.unified_diff import Code, finish_codes, hunks_to_codes
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 2
+
+_DICT = 'dict'
+_LIST = 'list'
+_LEAF = 'leaf'
+
+
+class _Node:
+    """A parsed JSON value with the number of lines it's pretty-printed on."""
+
+    __slots__ = ('children', 'digest', 'kind', 'num_lines')
+
+    def __init__(self, value):
+        if isinstance(value, dict) and value:
+            self.kind = _DICT
+            self.children = {k: _Node(v) for k, v in value.items()}
+            items = tuple((k, self.children[k].digest) for k in sorted(self.children))
+            self.digest = hash((_DICT, items))
+        elif isinstance(value, list) and value:
+            self.kind = _LIST
+            self.children = [_Node(v) for v in value]
+            self.digest = hash((_LIST, tuple(c.digest for c in self.children)))
+        else:
+            # Scalars and empty containers are printed on a single line.
+            self.kind = _LEAF
+            self.children = None
+            self.digest = hash((_LEAF, type(value), str(value)))
+        if self.kind == _LEAF:
+            self.num_lines = 1
+        else:
+            children = self.children.values() if self.kind == _DICT else self.children
+            self.num_lines = 2 + sum(c.num_lines for c in children)
+
+
+def _mark(rchg: list[int], start: int, node: _Node):
+    rchg[start : start + node.num_lines] = [1] * node.num_lines
+
+
+def _diff_nodes(a: _Node, b: _Node, i1: int, i2: int, rchg1, rchg2):
+    """Flag the changed lines between a (at line i1) and b (at line i2)."""
+    if a.digest == b.digest:
+        return
+    if a.kind != b.kind or a.kind == _LEAF:
+        _mark(rchg1, i1, a)
+        _mark(rchg2, i2, b)
+        return
+
+    # The opening and closing lines ('"key": {' and '}') are unchanged.
+    i1 += 1
+    i2 += 1
+    if a.kind == _DICT:
+        # Members are printed in sorted order, so this is a merge.
+        for key in sorted(a.children.keys() | b.children.keys()):
+            ca = a.children.get(key)
+            cb = b.children.get(key)
+            if ca and cb:
+                _diff_nodes(ca, cb, i1, i2, rchg1, rchg2)
+            elif ca:
+                _mark(rchg1, i1, ca)
+            else:
+                _mark(rchg2, i2, cb)
+            i1 += ca.num_lines if ca else 0
+            i2 += cb.num_lines if cb else 0
+    else:
+        _diff_lists(a.children, b.children, i1, i2, rchg1, rchg2)
+
+
+def _diff_lists(a: list[_Node], b: list[_Node], i1: int, i2: int, rchg1, rchg2):
+    changed1, changed2 = linediff.diff_sequences(
+        [c.digest for c in a], [c.digest for c in b]
+    )
+    digests1 = {c.digest for c in a}
+    digests2 = {c.digest for c in b}
+    j1 = j2 = 0
+    while j1 < len(a) or j2 < len(b):
+        if j1 < len(a) and j2 < len(b) and not changed1[j1] and not changed2[j2]:
+            i1 += a[j1].num_lines
+            i2 += b[j2].num_lines
+            j1 += 1
+            j2 += 1
+            continue
+
+        # A run of replaced elements. Moved elements are deleted and inserted;
+        # the rest are paired up in order and diffed.
+        pending1 = []
+        while j1 < len(a) and changed1[j1]:
+            if a[j1].digest in digests2:
+                _mark(rchg1, i1, a[j1])
+            else:
+                pending1.append((a[j1], i1))
+            i1 += a[j1].num_lines
+            j1 += 1
+        pending2 = []
+        while j2 < len(b) and changed2[j2]:
+            if b[j2].digest in digests1:
+                _mark(rchg2, i2, b[j2])
+            else:
+                pending2.append((b[j2], i2))
+            i2 += b[j2].num_lines
+            j2 += 1
+        for k in range(max(len(pending1), len(pending2))):
+            if k < len(pending1) and k < len(pending2):
+                (ca, s1), (cb, s2) = pending1[k], pending2[k]
+                _diff_nodes(ca, cb, s1, s2, rchg1, rchg2)
+            elif k < len(pending1):
+                _mark(rchg1, pending1[k][1], pending1[k][0])
+            else:
+                _mark(rchg2, pending2[k][1], pending2[k][0])
+
+
+def diff_values(a, b):
+    """Changed-line flags for json.dumps(a/b, indent=2, sort_keys=True)."""
+    root_a = _Node(a)
+    root_b = _Node(b)
+    rchg1 = [0] * root_a.num_lines
+    rchg2 = [0] * root_b.num_lines
+    _diff_nodes(root_a, root_b, 0, 0, rchg1, rchg2)
+    return rchg1, rchg2
+
+
+def diff_files(a_path: str, b_path: str, settings: linediff.DiffSettings) -> list[Code]:
+    """Structurally diff two normalized JSON files (see util.normalize_json).
+
+    Raises ValueError if either file isn't normalized JSON.
+    """
+    with open(a_path, 'rb') as f:
+        a_data = f.read()
+    with open(b_path, 'rb') as f:
+        b_data = f.read()
+    lines1 = linediff.split_lines(a_data)
+    lines2 = linediff.split_lines(b_data)
+    rchg1, rchg2 = diff_values(json.loads(a_data), json.loads(b_data))
+    if len(rchg1) != len(lines1) or len(rchg2) != len(lines2):
+        raise ValueError('File is not normalized JSON')
+
+    hunks = linediff.hunks_for_changed_lines(lines1, rchg1, rchg2, settings)
+    if not hunks:
+        return [Code('equal', (0, len(lines2)), (0, len(lines2)))]
+    return finish_codes(hunks_to_codes(hunks), len(lines2))
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a server with running threads isn't safe.
+            _pool = ProcessPoolExecutor(
+                MAX_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def diff_files_in_worker(
+    a_path: str, b_path: str, settings: linediff.DiffSettings
+) -> list[Code] | None:
+    """Run diff_files in a worker process.
+
+    Returns None if the files can't be diffed structurally, the worker died (e.g.
+    it ran out of memory) or anything else went wrong, in which case callers
+    should diff the lines.
+    """
+    global _pool
+    pool = _get_pool()
+    try:
+        return pool.submit(diff_files, a_path, b_path, settings).result()
+    except ValueError as e:
+        logger.debug('Unable to diff %s and %s structurally: %s', a_path, b_path, e)
+    except BrokenProcessPool:
+        logger.warning('Structural diff worker died diffing %s and %s', a_path, b_path)
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+    except Exception:
+        # e.g. a RecursionError from deeply nested JSON, or a file that's gone.
+        logger.exception('Unable to diff %s and %s structurally', a_path, b_path)
+    return None
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,8 @@
-from dataclasses import dataclass
-from itertools import groupby
-from typing import List, Optional, Tuple, Union
 import re
-
-from unidiff import PatchSet
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
 
 
 @dataclass
@@ -12,24 +11,35 @@ class Code:
 
     type: str
     """One of "replace" | "delete" | "insert" | "equal" | "skip"."""
-    before: Tuple[int, int]
+    before: tuple[int, int]
     """Line range on left side; zero-based, half-open interval."""
-    after: Tuple[int, int]
+    after: tuple[int, int]
     """Line range on right side; zero-based, half-open interval."""
-    header: Optional[str] = None
+    header: str | None = None
+
 
+@dataclass
+class Hunk:
+    """One hunk of a unified diff, reduced to runs of line types."""
+
+    source_start: int
+    """Start line on the left side, as it appears in the @@ header (one-based)."""
+    target_start: int
+    """Start line on the right side, as it appears in the @@ header (one-based)."""
+    header: str | None
+    """Section header (function name) following the @@ header, if any."""
+    runs: list[tuple[str, int]]
+    """(line type, count) pairs, where the line type is one of ' ', '-' or '+'."""
 
-def read_codes(p: PatchSet) -> Union[List[Code], None]:
-    pf = p[0]  # PatchedFile
+
+def hunks_to_codes(hunks: list[Hunk]) -> list[Code]:
+    """Convert hunks to codes. This doesn't pair up deletes and inserts."""
     out = []
     last_source = 0
     last_target = 0
 
-    if pf.is_binary_file:
-        return None
-
-    for hunk in pf:
-        header = hunk.section_header or None
+    for hunk in hunks:
+        header = hunk.header or None
         if hunk.source_start != last_source + 1:
             out.append(
                 Code(
@@ -43,49 +53,132 @@ def read_codes(p: PatchSet) -> Union[List[Code], None]:
             last_target = hunk.target_start
             header = None
 
-        for type, chunk in groupby(hunk, lambda line: line.line_type):
-            lines = [*chunk]
-            first = lines[0]
-            last = lines[-1]
+        # One-based line numbers of the next line on each side.
+        source = hunk.source_start
+        target = hunk.target_start
+        for type, count in hunk.runs:
             if type == ' ':
                 out.append(
                     Code(
                         'equal',
-                        (first.source_line_no - 1, last.source_line_no),
-                        (first.target_line_no - 1, last.target_line_no),
+                        (source - 1, source - 1 + count),
+                        (target - 1, target - 1 + count),
                         header,
                     )
                 )
-                header = None
+                source += count
+                target += count
+                last_source = source - 1
+                last_target = target - 1
             elif type == '-':
                 out.append(
                     Code(
                         'delete',
-                        (first.source_line_no - 1, last.source_line_no),
+                        (source - 1, source - 1 + count),
                         (last_target, last_target),
                         header,
                     )
                 )
-                header = None
+                source += count
+                last_source = source - 1
             elif type == '+':
                 out.append(
                     Code(
                         'insert',
                         (last_source, last_source),
-                        (first.target_line_no - 1, last.target_line_no),
+                        (target - 1, target - 1 + count),
                         header,
                     )
                 )
-                header = None
-            last_source = last.source_line_no or last_source
-            last_target = last.target_line_no or last_target
+                target += count
+                last_target = target - 1
+            header = None
 
     # We don't have enough context to know whether there's a skip at the end
     # (missing the number of lines in the file).
     return out
 
 
-def add_replaces(codes: List[Code]) -> List[Code]:
+@dataclass
+class PatchedFile:
+    """The first file in a unified diff."""
+
+    is_binary: bool
+    hunks: list[Hunk]
+
+
+_HUNK_HEADER = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@[ ]?(.*)')
+
+
+def parse_patch(diff: str) -> PatchedFile | None:
+    """Read the hunks of the first file in a unified diff, or None if there isn't one.
+
+    Only the @@ headers are parsed. Hunk bodies are reduced to runs of line types
+    without creating an object per line.
+    """
+    lines = diff.split('\n')
+    num_lines = len(lines)
+    patched_file = None
+    i = 0
+    while i < num_lines:
+        line = lines[i]
+        i += 1
+        if line.startswith('diff --git ') or (
+            patched_file is None and line.startswith('--- ')
+        ):
+            if patched_file is not None:
+                break  # only the first file is read
+            patched_file = PatchedFile(is_binary=False, hunks=[])
+        elif line.startswith('--- ') and patched_file.hunks:
+            break  # a second file without a "diff --git" header
+        elif line.startswith('Binary files ') or line == 'GIT binary patch':
+            if patched_file is None:
+                patched_file = PatchedFile(is_binary=True, hunks=[])
+            patched_file.is_binary = True
+        elif line.startswith('@@ ') and patched_file is not None:
+            m = _HUNK_HEADER.match(line)
+            if not m:
+                continue
+            source_start, source_len, target_start, target_len, header = m.groups()
+            source_left = 1 if source_len is None else int(source_len)
+            target_left = 1 if target_len is None else int(target_len)
+            runs = []
+            run_type = None
+            run_len = 0
+            while (source_left > 0 or target_left > 0) and i < num_lines:
+                line = lines[i]
+                i += 1
+                type = line[0] if line and line[0] != '\r' else ' '
+                if type == ' ':
+                    source_left -= 1
+                    target_left -= 1
+                elif type == '-':
+                    source_left -= 1
+                elif type == '+':
+                    target_left -= 1
+                elif type != '\\':
+                    raise ValueError(f'Hunk diff line expected: {line}')
+                if type != run_type:
+                    if run_type and run_type != '\\':
+                        runs.append((run_type, run_len))
+                    run_type = type
+                    run_len = 0
+                run_len += 1
+            if run_type and run_type != '\\':
+                runs.append((run_type, run_len))
+            patched_file.hunks.append(
+                Hunk(int(source_start), int(target_start), header, runs)
+            )
+    return patched_file
+
+
+def read_codes(patched_file: PatchedFile) -> list[Code] | None:
+    if patched_file.is_binary:
+        return None
+    return hunks_to_codes(patched_file.hunks)
+
+
+def add_replaces(codes: list[Code]) -> list[Code]:
     """Replace paired delete + insert codes with replace."""
     out = []
     i = 0
@@ -110,22 +203,8 @@ def add_replaces(codes: List[Code]) -> List[Code]:
     return out
 
 
-def diff_to_codes(diff: str, after_num_lines=None) -> Union[List[Code], None]:
-    """Convert a unified diff to a list of codes for codediff.js.
-
-    This only considers the first file in the diff.
-    If it's a binary diff, returns None.
-    """
-    p = PatchSet.from_string(diff)
-    if len(p) == 0:
-        if after_num_lines is None:
-            return None
-        return [Code('equal', (0, after_num_lines), (0, after_num_lines))]
-    codes = read_codes(p)
-    if not codes:
-        return None  # binary file
-
-    # Go through and combine sequential delete/insert into "replace"
+def finish_codes(codes: list[Code], after_num_lines=None) -> list[Code]:
+    """Combine delete/insert pairs into replaces and add a skip at the end."""
     codes = add_replaces(codes)
 
     if after_num_lines:
@@ -145,8 +224,27 @@ def diff_to_codes(diff: str, after_num_lines=None) -> Union[List[Code], None]:
     return codes
 
 
+def diff_to_codes(diff: str, after_num_lines=None) -> list[Code] | None:
+    """Convert a unified diff to a list of codes for codediff.js.
+
+    This only considers the first file in the diff.
+    If it's a binary diff, returns None.
+    """
+    patched_file = parse_patch(diff)
+    if patched_file is None:
+        if after_num_lines is None:
+            return None
+        return [Code('equal', (0, after_num_lines), (0, after_num_lines))]
+    codes = read_codes(patched_file)
+    if not codes:
+        return None  # binary file
+
+    # Go through and combine sequential delete/insert into "replace"
+    return finish_codes(codes, after_num_lines)
+
+
 # See https://git-scm.com/docs/git-diff#_raw_output_format
-@dataclass
+@dataclass(frozen=True, slots=True)
 class RawDiffLine:
     src_mode: str
     """e.g. 100644; 000000 for creation/unmerged"""
@@ -157,62 +255,66 @@ class RawDiffLine:
     status: str
     """A, C (copy), D, M, R, T (change in type), U (unmerged), X (bug)"""
     path: str
-    score: Union[int, None] = None
+    score: int | None = None
     """Only for R or C"""
-    dst_path: Union[str, None] = None
+    dst_path: str | None = None
     """Only set when status=C or R."""
-    num_add: Union[int, None] = None
+    num_add: int | None = None
     """Num added lines from diffstat. None for binary files."""
-    num_delete: Union[int, None] = None
+    num_delete: int | None = None
     """Num removed lines from diffstat. None for binary files."""
 
 
-def parse_raw_diff_line(parts: list[str]) -> RawDiffLine:
-    meta = parts[0]
-    path = parts[1]
-    dst_path = parts[2] if len(parts) > 2 else None
-
-    m = meta[1:].split(' ')
-    src_mode, dst_mode, src_sha, dst_sha, status = m
-    score = None
-    if len(status) > 1:
-        score = int(status[1:])
-        status = status[0]
-
-    return RawDiffLine(
-        src_mode=src_mode,
-        dst_mode=dst_mode,
-        src_sha=src_sha,
-        dst_sha=dst_sha,
-        status=status,
-        path=path,
-        score=score,
-        dst_path=dst_path,
-    )
-
-
-def parse_raw_diff(diff: str) -> List[RawDiffLine]:
-    # each diff line can be two or three parts. The parts and lines are both null-delimited.
-    # The "lines" start with ":".
-    parts = diff.strip('\0').split('\0')
-    lines = []
-    numstats = []
-    curline = None
+def iter_nul_separated(stream: BinaryIO, chunk_size=1 << 16) -> Iterator[str]:
+    """Yield the NUL-separated parts of a byte stream as they're read."""
+    read = getattr(stream, 'read1', stream.read)  # don't wait for a full chunk
+    rest = b''
+    while chunk := read(chunk_size):
+        *parts, rest = (rest + chunk).split(b'\0')
+        for part in parts:
+            yield part.decode('utf8')
+    if rest:
+        yield rest.decode('utf8')
+
+
+def iter_raw_diff(parts: Iterable[str]) -> Iterator[RawDiffLine]:
+    """Parse the NUL-separated parts of `git diff --raw -z --numstat` output.
+
+    git writes a raw record for every file, then a numstat record for every file.
+    Each RawDiffLine is yielded as soon as its numstat record has been read.
+    """
+    parts = iter(parts)
+    # Raw records which are waiting for their numstats.
+    pending = deque()
     for part in parts:
-        if part.startswith(':'):
-            curline = [part]
-            lines.append(curline)
-        elif m := re.match(r'(\d+|-)\t(\d+|-)\t', part):
-            # numstat line
-            add, drop = m.group(1), m.group(2)
-            curline = [int(add) if add != '-' else None, int(drop) if drop != '-' else None]
-            numstats.append(curline)
+        if not part:
+            continue
+        if part[0] == ':':
+            # :src_mode dst_mode src_sha dst_sha status, then one or two paths.
+            src_mode, dst_mode, src_sha, dst_sha, status = part[1:].split(' ')
+            score = None
+            if len(status) > 1:
+                score = int(status[1:])
+                status = status[0]
+            path = next(parts)
+            dst_path = next(parts) if status in ('C', 'R') else None
+            pending.append(
+                (src_mode, dst_mode, src_sha, dst_sha, status, path, score, dst_path)
+            )
         else:
-            curline.append(part)
-    diff_lines = []
-    for line, stats in zip(lines, numstats):
-        diff = parse_raw_diff_line(line)
-        diff.num_add = stats[0]
-        diff.num_delete = stats[1]
-        diff_lines.append(diff)
-    return diff_lines
+            # added\tdeleted\tpath, or added\tdeleted\t then two paths for C/R.
+            add, delete, path = part.split('\t', 2)
+            if not path:
+                next(parts)
+                next(parts)
+            yield RawDiffLine(
+                *pending.popleft(),
+                num_add=int(add) if add != '-' else None,
+                num_delete=int(delete) if delete != '-' else None,
+            )
+
+
+def parse_raw_diff(diff: str) -> list[RawDiffLine]:
+    # each diff line can be two or three parts. The parts and lines are both
+    # null-delimited. The "lines" start with ":".
+    return list(iter_raw_diff(diff.split('\0')))
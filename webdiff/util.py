@@ -2,51 +2,106 @@
 
 import functools
 import hashlib
-import json
 import logging
 import os
-import re
+import shutil
 import subprocess
 import tempfile
+import threading
 import xml.etree.ElementTree as ET
+from dataclasses import dataclass
 
 from PIL import Image
 
+from webdiff import imagediff, normalize
+from webdiff.lrucache import lru_cache
+
+logger = logging.getLogger(__name__)
+
 
 class ImageMagickNotAvailableError(Exception):
     pass
 
 
-class ImageMagickError(Exception):
+class ImageDiffError(Exception):
     pass
 
 
-# TODO: replace with functools.lru_cache
-# via https://wiki.python.org/moin/PythonDecoratorLibrary#Memoize
-def memoize(obj):
-    """Decorator to memoize a function."""
-    cache = obj.cache = {}
+class ImageMagickError(ImageDiffError):
+    pass
+
+
+# Temp files for this process (normalized files, image diffs) are created here.
+_temp_dir = None
+_temp_dir_lock = threading.Lock()
+
+
+def make_temp_file(suffix: str) -> str:
+    """Create an empty temp file which will be deleted by remove_temp_files."""
+    global _temp_dir
+    with _temp_dir_lock:
+        if _temp_dir is None:
+            _temp_dir = tempfile.mkdtemp(prefix='webdiff')
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=_temp_dir)
+    os.close(fd)
+    return path
 
-    @functools.wraps(obj)
-    def memoizer(*args, **kwargs):
-        key = str(args) + str(kwargs)
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-        return cache[key]
 
-    return memoizer
+def remove_temp_files():
+    """Delete the files from make_temp_file, and the cached results that use them."""
+    global _temp_dir
+    with _temp_dir_lock:
+        temp_dir, _temp_dir = _temp_dir, None
+    for fn in (_normalized_copy, generate_pdiff_image, generate_dilated_pdiff_image):
+        fn.cache.clear()
+    if temp_dir:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-@memoize
+# Files which match in their first and last blocks are hashed in full.
+_PROBE_BLOCK_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=4096, file_args=(0,))
 def contentHash(path):
-    return hashlib.sha512(open(path, mode='rb').read()).digest()
+    """A digest of the file's contents. The file is hashed in chunks."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'blake2b').digest()
+
+
+@lru_cache(maxsize=4096, file_args=(0,))
+def git_blob_sha(path):
+    """Returns the id that git would assign to the file's contents (hex SHA-1)."""
+    h = hashlib.sha1(b'blob %d\0' % os.path.getsize(path))
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _probe_blocks(path, size):
+    """Read the first and last blocks of a file."""
+    with open(path, 'rb') as f:
+        head = f.read(_PROBE_BLOCK_SIZE)
+        if size <= 2 * _PROBE_BLOCK_SIZE:
+            return head + f.read()
+        f.seek(-_PROBE_BLOCK_SIZE, os.SEEK_END)
+        return head + f.read()
 
 
 def are_files_identical(path1, path2):
     # Check if anything has changed.
-    # Compare lengths & then checksums.
-    if os.path.getsize(path1) != os.path.getsize(path2):
+    # Compare lengths, then the first and last blocks, then checksums.
+    st1 = os.stat(path1)
+    st2 = os.stat(path2)
+    if st1.st_size != st2.st_size:
         return False
+    if (st1.st_dev, st1.st_ino) == (st2.st_dev, st2.st_ino):
+        return True
+    if _probe_blocks(path1, st1.st_size) != _probe_blocks(path2, st2.st_size):
+        return False
+    if st1.st_size <= 2 * _PROBE_BLOCK_SIZE:
+        return True  # the probe covered the whole file
     return contentHash(path1) == contentHash(path2)
 
 
@@ -74,7 +129,66 @@ def image_metadata(path):
     return md
 
 
-@memoize
+# One of 'auto', 'imagemagick' or 'pillow'; see set_image_diff_engine.
+_image_diff_engine = 'auto'
+# Limits on ImageMagick subprocesses; see set_imagemagick_limits.
+_magick_slots = threading.BoundedSemaphore(2)
+_magick_timeout_secs = 30
+
+
+def set_imagemagick_limits(max_jobs: int, timeout_secs: float):
+    """Set how many ImageMagick commands may run at once, and for how long."""
+    global _magick_slots, _magick_timeout_secs
+    _magick_slots = threading.BoundedSemaphore(max_jobs)
+    _magick_timeout_secs = timeout_secs
+
+
+def set_image_diff_engine(engine: str):
+    """'auto' uses ImageMagick if it's installed and Pillow otherwise."""
+    global _image_diff_engine
+    assert engine in ('auto', 'imagemagick', 'pillow'), engine
+    _image_diff_engine = engine
+
+
+def _use_imagemagick() -> bool:
+    if _image_diff_engine == 'pillow':
+        return False
+    if is_imagemagick_available():
+        return True
+    if _image_diff_engine == 'imagemagick':
+        raise ImageMagickNotAvailableError()
+    return False
+
+
+def is_image_diff_available() -> bool:
+    return _image_diff_engine != 'imagemagick' or is_imagemagick_available()
+
+
+def _save_temp_png(im: Image.Image) -> str:
+    path = make_temp_file('.png')
+    with open(path, 'wb') as f:
+        im.save(f, format='PNG', compress_level=1)
+    return path
+
+
+def _run_imagemagick(args) -> subprocess.CompletedProcess:
+    """Run an ImageMagick command, waiting for a free slot and enforcing the timeout."""
+    with _magick_slots:
+        try:
+            return subprocess.run(
+                args,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                timeout=_magick_timeout_secs,
+                check=False,
+            )
+        except subprocess.TimeoutExpired:
+            raise ImageMagickError(
+                f'{args[0]} timed out after {_magick_timeout_secs} seconds'
+            ) from None
+
+
+@functools.cache
 def is_imagemagick_available():
     try:
         # this swallows stdout/stderr
@@ -84,25 +198,45 @@ def is_imagemagick_available():
     return True
 
 
-@memoize
-def generate_pdiff_image(before_path, after_path):
-    """Generate a perceptual diff between the before/after images.
+@dataclass
+class PerceptualDiff:
+    same_pixels: bool
+    diff_path: str
+    """Path to an image with the differing pixels in red."""
+    num_diff_pixels: int
+    num_pixels: int
+    bbox: dict
+    """{top,left,width,height,bottom,right} of the differing pixels."""
 
-    This runs the ImageMagick compare command.
 
-    Returns: (are_images_identical, path_to_pdiff_png)
-    """
-    if not is_imagemagick_available():
-        raise ImageMagickNotAvailableError()
+@lru_cache(maxsize=64, file_args=(0, 1))
+def generate_pdiff_image(before_path, after_path) -> PerceptualDiff:
+    """Generate a perceptual diff between the before/after images.
 
-    _, diff_path = tempfile.mkstemp(suffix='.png')
+    This runs the ImageMagick compare command, or the equivalent with Pillow.
+    Either way, the bounding box and pixel counts come from the same diff mask.
+    """
+    if not _use_imagemagick():
+        try:
+            pdiff = imagediff.diff_images(before_path, after_path)
+        except imagediff.ImageSizeMismatch as e:
+            raise ImageDiffError(str(e)) from e
+        return PerceptualDiff(
+            same_pixels=pdiff.same_pixels,
+            diff_path=_save_temp_png(imagediff.highlight_image(pdiff.mask)),
+            num_diff_pixels=pdiff.num_diff_pixels,
+            num_pixels=pdiff.num_pixels,
+            bbox=pdiff.bbox or imagediff.EMPTY_BBOX,
+        )
+
+    diff_path = make_temp_file('.png')
 
     # The compare command returns:
     #   0 on success & similar images
     #   1 on success & dissimilar images
     #   2 on failure
-    PIPE = subprocess.PIPE
-    p = subprocess.Popen(
+    # `compare` is noisy; this swallows its output.
+    result = _run_imagemagick(
         [
             'compare',
             '-metric',
@@ -114,30 +248,32 @@ def generate_pdiff_image(before_path, after_path):
             before_path,
             after_path,
             diff_path,
-        ],
-        stdin=PIPE,
-        stdout=PIPE,
-        stderr=PIPE,
-    )
-    output, err = p.communicate()  # `compare` is noisy; this swallows its output
-    result = p.returncode
+        ]
+    ).returncode
 
     if result == 2:
         raise ImageMagickError('compare failed. Perhaps image dimensions differ.')
-    if result == 0:
-        return True, diff_path
-    return False, diff_path
+    mask = imagediff.mask_from_highlight(diff_path)
+    num_diff_pixels, bbox = imagediff.mask_stats(mask)
+    return PerceptualDiff(
+        same_pixels=result == 0,
+        diff_path=diff_path,
+        num_diff_pixels=num_diff_pixels,
+        num_pixels=mask.width * mask.height,
+        bbox=bbox or imagediff.EMPTY_BBOX,
+    )
 
 
-@memoize
+@lru_cache(maxsize=64)
 def generate_dilated_pdiff_image(diff_path):
     """Given a pdiff image, dilate it to highlight small differences."""
-    if not is_imagemagick_available():
-        raise ImageMagickNotAvailableError()
+    if not _use_imagemagick():
+        mask = imagediff.mask_from_highlight(diff_path)
+        return _save_temp_png(imagediff.highlight_image(imagediff.dilate(mask)))
 
     # Dilate the diff image (to highlight small differences) and make it red.
-    _, diff_dilate_path = tempfile.mkstemp(suffix='.png')
-    subprocess.check_call(
+    diff_dilate_path = make_temp_file('.png')
+    result = _run_imagemagick(
         [
             'convert',
             diff_path,
@@ -154,56 +290,48 @@ def generate_dilated_pdiff_image(diff_path):
             diff_dilate_path,
         ]
     )
+    if result.returncode != 0:
+        raise ImageMagickError(f'convert failed: {result.stderr.decode("utf8")}')
     return diff_dilate_path
 
 
-@memoize
-def get_pdiff_bbox(diff_path):
-    """Returns {top,left,width,height} for the content of a pdiff."""
-    if not is_imagemagick_available():
-        raise ImageMagickNotAvailableError()
-
-    out = subprocess.check_output(['identify', '-format', '%@', diff_path])
-    # This looks like "26x94+0+830"
-    m = re.match(r'^(\d+)x(\d+)\+(\d+)\+(\d+)', out.decode('utf8'))
-    if not m:
-        raise ImageMagickError('Unexpected identify output: %s' % out)
-    width, height, left, top = [int(x) for x in m.groups()]
-    return {
-        'width': width,
-        'height': height,
-        'left': left,
-        'top': top,
-        'bottom': top + height,
-        'right': left + width,
-    }
-
-
 def normalize_text(in_path: str):
-    data = [*open(in_path)]
-    data.sort()
-    _, norm_path = tempfile.mkstemp(suffix='.txt')
-    with open(norm_path, 'w') as out:
-        out.writelines(data)
-    logging.debug(f'Normalized text file {in_path} -> {norm_path}')
+    norm_path = make_temp_file('.txt')
+    normalize.sort_lines(in_path, norm_path)
+    logger.debug(f'Normalized text file {in_path} -> {norm_path}')
     return norm_path
 
 
-@memoize
-def normalize_json(in_path: str):
+@lru_cache(
+    maxsize=256,
+    key=lambda in_path: (contentHash(in_path), os.path.splitext(in_path.lower())[1]),
+)
+def _normalized_copy(in_path: str):
     if in_path.lower().endswith('.txt'):
         return normalize_text(in_path)
 
-    with open(in_path) as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            # This would be a good place to try parsing as JSON5/JSONC.
-            logging.debug(f'Unable to parse {in_path} as JSON')
-            return in_path
-
-    _, norm_path = tempfile.mkstemp(suffix='.json')
-    with open(norm_path, 'w') as out:
-        json.dump(data, out, indent=2, sort_keys=True)
-    logging.debug(f'Normalized JSON {in_path} -> {norm_path}')
+    is_yaml = in_path.lower().endswith(('.yaml', '.yml'))
+    norm_path = make_temp_file('.json')
+    try:
+        if is_yaml:
+            normalize.normalize_yaml_file(in_path, norm_path)
+        else:
+            normalize.normalize_json_file(in_path, norm_path)
+    except ValueError:
+        # This would be a good place to try parsing as JSON5/JSONC.
+        logger.debug(f'Unable to parse {in_path} as {"YAML" if is_yaml else "JSON"}')
+        os.unlink(norm_path)
+        return None
+    logger.debug(f'Normalized JSON {in_path} -> {norm_path}')
     return norm_path
+
+
+def normalize_json(in_path: str):
+    """Path to a pretty-printed copy of a JSON file, with its keys sorted.
+
+    YAML files are converted to JSON, if PyYAML is installed, and .txt files
+    have their lines sorted instead. Files which aren't valid JSON
+    are returned as-is. Normalized copies are cached by content hash, so files
+    with the same contents share one.
+    """
+    return _normalized_copy(in_path) or in_path